@@ -0,0 +1,43 @@
+"""添加热点查询复合索引
+
+Revision ID: 5e7a9c2d4b81
+Revises: 3b9e1c7a5f20
+Create Date: 2026-10-17 09:30:41.205117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7a9c2d4b81'
+down_revision: Union[str, None] = '3b9e1c7a5f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (索引名, 表名, 列)
+INDEXES = [
+    ('idx_chapters_project_number', 'chapters', ['project_id', 'chapter_number']),
+    ('idx_chapters_outline_sub', 'chapters', ['outline_id', 'sub_index']),
+    ('idx_memories_project_chapter_type', 'story_memories', ['project_id', 'chapter_id', 'memory_type']),
+    ('idx_memories_project_type_timeline', 'story_memories', ['project_id', 'memory_type', 'story_timeline']),
+    ('idx_foreshadows_project_status_target', 'foreshadows', ['project_id', 'status', 'target_resolve_chapter_number']),
+    ('idx_foreshadows_project_plant', 'foreshadows', ['project_id', 'plant_chapter_number']),
+    ('idx_outlines_project_order', 'outlines', ['project_id', 'order_index']),
+]
+
+
+def upgrade() -> None:
+    # 在线创建索引（CONCURRENTLY 不能在事务中执行），不阻塞已有数据的读写
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
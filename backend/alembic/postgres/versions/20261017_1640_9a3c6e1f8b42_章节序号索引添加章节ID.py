@@ -0,0 +1,32 @@
+"""章节序号索引添加章节ID
+
+Revision ID: 9a3c6e1f8b42
+Revises: 7f2d5b9e3a16
+Create Date: 2026-10-17 16:40:27.318450
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a3c6e1f8b42'
+down_revision: Union[str, None] = '7f2d5b9e3a16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (章节序号, 章节ID) 游标分页按索引顺序读取，不再对章节ID额外排序；
+    # 先在线创建新索引再删除旧索引，期间章节查询始终有索引可用
+    with op.get_context().autocommit_block():
+        op.create_index('idx_chapters_project_number_id', 'chapters', ['project_id', 'chapter_number', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('idx_chapters_project_number', table_name='chapters', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('idx_chapters_project_number', 'chapters', ['project_id', 'chapter_number'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('idx_chapters_project_number_id', table_name='chapters', postgresql_concurrently=True, if_exists=True)
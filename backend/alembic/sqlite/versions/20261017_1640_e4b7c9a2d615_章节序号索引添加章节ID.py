@@ -0,0 +1,31 @@
+"""章节序号索引添加章节ID
+
+Revision ID: e4b7c9a2d615
+Revises: c3e8a1f7d294
+Create Date: 2026-10-17 16:40:27.318450
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7c9a2d615'
+down_revision: Union[str, None] = 'c3e8a1f7d294'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (章节序号, 章节ID) 游标分页按索引顺序读取，不再对章节ID额外排序
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.create_index('idx_chapters_project_number_id', ['project_id', 'chapter_number', 'id'], unique=False)
+        batch_op.drop_index('idx_chapters_project_number')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('chapters', schema=None) as batch_op:
+        batch_op.create_index('idx_chapters_project_number', ['project_id', 'chapter_number'], unique=False)
+        batch_op.drop_index('idx_chapters_project_number_id')
@@ -151,6 +151,7 @@ async def create_user(
                 if db_user:
                     db_user.is_admin = True
                     await session.commit()
+                    user_manager.invalidate_user(user_id)
                     new_user.is_admin = True
         
         # 设置密码
@@ -220,6 +221,7 @@ async def update_user(
             
             await session.commit()
             await session.refresh(db_user)
+        user_manager.invalidate_user(user_id)
         
         logger.info(f"管理员 {admin.user_id} 更新了用户 {user_id} 的信息")
         
@@ -276,6 +278,8 @@ async def toggle_user_status(
                 db_user.trust_level = -1
             
             await session.commit()
+        # 立即失效身份缓存，禁用在下一个请求生效
+        user_manager.invalidate_user(user_id)
         
         status_text = "启用" if data.is_active else "禁用"
         logger.info(f"管理员 {admin.user_id} {status_text}了用户 {user_id}")
@@ -373,6 +377,7 @@ async def delete_user(
                 await session.delete(pwd_record)
             
             await session.commit()
+        user_manager.invalidate_user(user_id)
         
         logger.warning(f"管理员 {admin.user_id} 删除了用户 {user_id}")
         
@@ -305,7 +305,7 @@ async def generate_career_system(
                     ai_response += chunk
                     
                     # 发送内容块
-                    yield await SSEResponse.send_chunk(chunk)
+                    yield await tracker.generating_chunk(chunk)
                     
                     # 平滑更新进度（避免过于频繁）
                     if chunk_count % 10 == 0:
@@ -1,14 +1,18 @@
 """章节管理API"""
-from fastapi import APIRouter, Depends, HTTPException, Request, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, tuple_, case
 from sqlalchemy.orm import selectinload
 import json
 import asyncio
-from typing import Optional
+import hashlib
+import time
+from typing import Any, Deque, Dict, Optional, Tuple
+from collections import deque
 from datetime import datetime
-from asyncio import Queue, Lock
+from asyncio import Queue
 
+from app.config import settings as app_settings
 from app.database import get_db
 from app.api.common import verify_project_access
 from app.services.chapter_context_service import (
@@ -27,11 +31,13 @@ from app.models.analysis_task import AnalysisTask
 from app.models.memory import PlotAnalysis, StoryMemory
 from app.models.batch_generation_task import BatchGenerationTask
 from app.models.regeneration_task import RegenerationTask
+from app.models.job import Job
 from app.schemas.chapter import (
     ChapterCreate,
     ChapterUpdate,
     ChapterResponse,
     ChapterListResponse,
+    ChapterPageResponse,
     ChapterGenerateRequest,
     BatchGenerateRequest,
     BatchGenerateResponse,
@@ -51,24 +57,21 @@ from app.services.memory_service import memory_service
 from app.services.foreshadow_service import foreshadow_service
 from app.services.chapter_regenerator import ChapterRegenerator
 from app.logger import get_logger
-from app.api.settings import get_user_ai_service
+from app.api.settings import get_user_ai_service, build_user_ai_service
+from app.services.job_runner import enqueue_job, get_job_session, register_job_handler
+from app.services.task_events import TaskCancelled, task_event_bus, task_snapshot
+from app.services.write_coordinator import WriteGuard, write_coordinator
 from app.utils.sse_response import SSEResponse, create_sse_response
+from app.services.generation_journal import (
+    GenerationInProgressError,
+    create_journal,
+    get_journal,
+    get_running_journal,
+)
 
 router = APIRouter(prefix="/chapters", tags=["章节管理"])
 logger = get_logger(__name__)
 
-# 全局数据库写入锁（每个用户一个锁，用于保护SQLite写入操作）
-db_write_locks: dict[str, Lock] = {}
-
-
-async def get_db_write_lock(user_id: str) -> Lock:
-    """获取或创建用户的数据库写入锁"""
-    if user_id not in db_write_locks:
-        db_write_locks[user_id] = Lock()
-        logger.debug(f"🔒 为用户 {user_id} 创建数据库写入锁")
-    return db_write_locks[user_id]
-
-
 @router.post("", response_model=ChapterResponse, summary="创建章节")
 async def create_chapter(
     chapter: ChapterCreate,
@@ -90,7 +93,7 @@ async def create_chapter(
     db.add(db_chapter)
     
     # 更新项目的当前字数
-    project.current_words = project.current_words + word_count
+    project.current_words = Project.current_words + word_count
     
     await db.commit()
     await db.refresh(db_chapter)
@@ -164,6 +167,89 @@ async def get_project_chapters(
     return ChapterListResponse(total=total, items=chapters_with_outline)
 
 
+@router.get("/project/{project_id}/list", response_model=ChapterPageResponse, summary="分页获取项目章节元数据")
+async def get_project_chapters_page(
+    project_id: str,
+    request: Request,
+    response: Response,
+    after: Optional[str] = Query(
+        None,
+        description="游标（上一页的 next_cursor，格式为 章节序号:章节ID；只传章节序号时返回序号大于该值的章节），不提供则从第一章开始"
+    ),
+    limit: int = Query(100, ge=1, le=500, description="每页数量"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    轻量章节列表：只查询元数据列（不含正文、展开规划），按 (章节序号, 章节ID) 游标分页
+    
+    章节序号没有唯一约束，游标带上章节ID才能保证序号相同的章节翻页时不丢失、不重复。
+    
+    响应带 ETag（由本页每行元数据的摘要及项目章节总数计算；SQLite 的 updated_at 只精确到秒，
+    同一秒内改标题、改状态时 max(updated_at) 不会变化，因此逐行摘要而不是取最大更新时间），
+    客户端携带 If-None-Match 请求时，本页未变化直接返回 304，不再组装、传输章节数据。
+    """
+    user_id = getattr(request.state, 'user_id', None)
+    await verify_project_access(project_id, user_id, db)
+    
+    page_filter = [Chapter.project_id == project_id]
+    if after is not None:
+        after_number, _, after_id = after.partition(":")
+        try:
+            after_number = int(after_number)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+        if after_id:
+            page_filter.append(tuple_(Chapter.chapter_number, Chapter.id) > tuple_(after_number, after_id))
+        else:
+            page_filter.append(Chapter.chapter_number > after_number)
+    
+    # 只查询元数据列，同时联查大纲标题（多取一条用于判断是否还有下一页）
+    result = await db.execute(
+        select(
+            Chapter.id,
+            Chapter.project_id,
+            Chapter.title,
+            Chapter.chapter_number,
+            Chapter.word_count,
+            Chapter.status,
+            Chapter.outline_id,
+            Chapter.sub_index,
+            Chapter.created_at,
+            Chapter.updated_at,
+            Outline.title.label("outline_title"),
+            Outline.order_index.label("outline_order")
+        )
+        .outerjoin(Outline, Outline.id == Chapter.outline_id)
+        .where(*page_filter)
+        .order_by(Chapter.chapter_number, Chapter.id)
+        .limit(limit + 1)
+    )
+    rows = result.mappings().all()
+    total = (await db.execute(
+        select(func.count(Chapter.id)).where(Chapter.project_id == project_id)
+    )).scalar_one()
+    
+    digest = hashlib.sha1(f"{project_id}|{after}|{limit}|{total}".encode())
+    for row in rows:
+        digest.update(("\x1f".join(str(v) for v in row.values()) + "\x1e").encode())
+    etag = f'W/"{digest.hexdigest()[:20]}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    has_more = len(rows) > limit
+    items = [dict(row) for row in rows[:limit]]
+    for item in items:
+        item["word_count"] = item["word_count"] or 0
+    
+    return ChapterPageResponse(
+        total=total,
+        items=items,
+        next_cursor=f"{items[-1]['chapter_number']}:{items[-1]['id']}" if has_more else None,
+        has_more=has_more
+    )
+
+
 @router.get("/{chapter_id}", response_model=ChapterResponse, summary="获取章节详情")
 async def get_chapter(
     chapter_id: str,
@@ -287,7 +373,7 @@ async def update_chapter(
         )
         project = result.scalar_one_or_none()
         if project:
-            project.current_words = project.current_words - old_word_count + new_word_count
+            project.current_words = Project.current_words - old_word_count + new_word_count
         
         # 如果内容被清空，清理相关数据
             if not chapter.content or chapter.content.strip() == "":
@@ -404,7 +490,12 @@ async def delete_chapter(
     if project:
         # 处理 word_count 和 current_words 可能为 None 的情况
         chapter_word_count = chapter.word_count or 0
-        project.current_words = max(0, (project.current_words or 0) - chapter_word_count)
+        # 在SQL中扣减并截断到0，避免并发删除时基于过期值计算
+        current_words = func.coalesce(Project.current_words, 0)
+        project.current_words = case(
+            (current_words > chapter_word_count, current_words - chapter_word_count),
+            else_=0,
+        )
     
     # 🗑️ 清理向量数据库中的记忆数据
     try:
@@ -807,22 +898,17 @@ async def analyze_chapter_background(
         bool: True表示分析成功，False表示分析失败
     """
     db_session = None
-    write_lock = await get_db_write_lock(user_id)
     
     try:
         logger.info(f"🔍 开始分析章节: {chapter_id}, 任务ID: {task_id}")
         
         # 创建独立数据库会话
-        from app.database import get_engine
-        from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
-        
-        engine = await get_engine(user_id)
-        AsyncSessionLocal = async_sessionmaker(
-            engine,
-            class_=AsyncSession,
-            expire_on_commit=False
-        )
+        from app.database import get_session_factory
+        
+        AsyncSessionLocal = await get_session_factory(user_id)
         db_session = AsyncSessionLocal()
+        # 同一章节的分析结果、伏笔、记忆写入互斥
+        write_lock = write_coordinator.guard(db_session, scope=f"chapter:{chapter_id}")
         
         # 1. 获取任务（读操作）
         task_result = await db_session.execute(
@@ -1311,6 +1397,16 @@ async def analyze_chapter_background(
             await db_session.close()
 
 
+async def _mark_generation_interrupted(db_session: AsyncSession, history: GenerationHistory, content: str):
+    """生成未完成时保存已生成的正文，并把检查点历史记录标记为中断"""
+    try:
+        history.generated_content = content
+        history.status = "interrupted"
+        await db_session.commit()
+    except Exception as e:
+        logger.warning(f"⚠️ 标记生成中断失败: {str(e)}")
+
+
 @router.post("/{chapter_id}/generate-stream", summary="AI创作章节内容（流式）")
 async def generate_chapter_content_stream(
     chapter_id: str,
@@ -1330,7 +1426,23 @@ async def generate_chapter_content_stream(
     
     注意：此函数不使用依赖注入的db，而是在生成器内部创建独立的数据库会话
     以避免流式响应期间的连接泄漏问题
+    
+    断线续传：生成在后台任务中运行，与HTTP连接解耦。客户端断开后携带
+    Last-Event-ID 请求头重新调用本接口（或 GET 同一路径）即可从断点继续接收；
+    同一章节正在生成时再次调用会直接接入正在进行的生成，不会重复生成；
+    正在进行的生成属于其他用户时返回409。Last-Event-ID 属于已结束的旧一次生成时重新生成。
     """
+    current_user_id = getattr(request.state, "user_id", "system")
+    last_event_id = request.headers.get("last-event-id")
+    journal = get_journal(chapter_id)
+    if journal and journal.user_id == current_user_id and (
+        not journal.finished or journal.owns_event_id(last_event_id)
+    ):
+        logger.info(f"🔁 接入章节生成: {chapter_id} (Last-Event-ID: {last_event_id or '无'})")
+        return create_sse_response(journal.subscribe(last_event_id))
+    if get_running_journal(chapter_id):
+        raise HTTPException(status_code=409, detail="该章节正在生成中，请稍后再试")
+    
     style_id = generate_request.style_id
     target_word_count = generate_request.target_word_count or 3000
     custom_model = generate_request.model if hasattr(generate_request, 'model') else None
@@ -1368,8 +1480,8 @@ async def generate_chapter_content_stream(
         # 在生成器内部创建独立的数据库会话
         db_session = None
         db_committed = False
-        # 获取当前用户ID（在生成器外部就需要）
-        current_user_id = getattr(request.state, "user_id", "system")
+        history = None
+        full_content = ""
         
         # 初始化标准进度追踪器
         from app.utils.sse_response import WizardProgressTracker
@@ -1646,6 +1758,21 @@ async def generate_chapter_content_stream(
                 full_content = ""
                 chunk_count = 0
                 
+                # 生成历史记录兼作检查点：生成过程中定期写入已生成正文（status=generating），
+                # 生成失败或被中断时标记为 interrupted，进程异常退出时保持 generating
+                history = GenerationHistory(
+                    project_id=current_chapter.project_id,
+                    chapter_id=current_chapter.id,
+                    prompt=f"创作章节: 第{current_chapter.chapter_number}章 {current_chapter.title}",
+                    generated_content="",
+                    model="default",
+                    status="generating"
+                )
+                db_session.add(history)
+                await db_session.commit()
+                checkpoint_interval = app_settings.generation_checkpoint_interval
+                last_checkpoint = time.monotonic()
+                
                 yield await tracker.generating(
                     current_chars=0,
                     estimated_total=target_word_count
@@ -1654,6 +1781,12 @@ async def generate_chapter_content_stream(
                 async for chunk in user_ai_service.generate_text_stream(**generate_kwargs):
                     full_content += chunk
                     chunk_count += 1
+                    journal.record_content(chunk)
+                    
+                    if checkpoint_interval > 0 and time.monotonic() - last_checkpoint >= checkpoint_interval:
+                        history.generated_content = full_content
+                        await db_session.commit()
+                        last_checkpoint = time.monotonic()
                     
                     # 发送内容块
                     yield await tracker.generating_chunk(chunk)
@@ -1683,17 +1816,11 @@ async def generate_chapter_content_stream(
                 current_chapter.status = "completed"
                 
                 # 更新项目字数
-                project.current_words = project.current_words - old_word_count + new_word_count
+                project.current_words = Project.current_words - old_word_count + new_word_count
                 
-                # 记录生成历史
-                history = GenerationHistory(
-                    project_id=current_chapter.project_id,
-                    chapter_id=current_chapter.id,
-                    prompt=f"创作章节: 第{current_chapter.chapter_number}章 {current_chapter.title}",
-                    generated_content=full_content[:500] if len(full_content) > 500 else full_content,
-                    model="default"
-                )
-                db_session.add(history)
+                # 记录生成历史（检查点转为最终记录）
+                history.generated_content = full_content
+                history.status = "completed"
                 
                 await db_session.commit()
                 db_committed = True
@@ -1733,14 +1860,13 @@ async def generate_chapter_content_stream(
                 # 短暂延迟确保SQLite WAL完成写入
                 await asyncio.sleep(0.05)
                 
-                # 直接启动后台分析（并发执行）
-                background_tasks.add_task(
-                    analyze_chapter_background,
-                    chapter_id=chapter_id,
+                # 提交后台分析作业（由作业执行器认领执行，进程重启后可恢复）
+                await enqueue_job(
+                    db_session,
+                    kind=JOB_CHAPTER_ANALYSIS,
                     user_id=current_user_id,
-                    project_id=project.id,
-                    task_id=task_id,
-                    ai_service=user_ai_service
+                    ref_id=task_id,
+                    payload={'chapter_id': chapter_id, 'project_id': project.id}
                 )
                 
                 yield await tracker.saving("章节保存完成", 0.8)
@@ -1797,6 +1923,9 @@ async def generate_chapter_content_stream(
                         await db_session.rollback()
                         logger.warning("在finally中发现未提交事务，已回滚")
                     
+                    if history is not None and not db_committed:
+                        await _mark_generation_interrupted(db_session, history, full_content)
+                    
                     await db_session.close()
                     logger.info("数据库会话已关闭")
                 except Exception as close_error:
@@ -1807,7 +1936,35 @@ async def generate_chapter_content_stream(
                     except:
                         pass
     
-    return create_sse_response(event_generator())
+    # 生成在后台任务中运行，HTTP连接只是日志的订阅者
+    try:
+        journal = create_journal(chapter_id, current_user_id)
+    except GenerationInProgressError:
+        # 前置检查期间其他请求已开始生成该章节
+        raise HTTPException(status_code=409, detail="该章节正在生成中，请稍后再试")
+    journal.start(event_generator())
+    return create_sse_response(journal.subscribe())
+
+
+@router.get("/{chapter_id}/generate-stream", summary="重连章节流式生成")
+async def resume_chapter_content_stream(
+    chapter_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Query(None, description="断点事件ID（优先使用Last-Event-ID请求头）")
+):
+    """
+    重新接入进行中（或刚结束）的章节流式生成，从 Last-Event-ID 之后继续推送
+    
+    断点已超出服务端缓冲范围时，先推送一条 snapshot 消息（type=snapshot，content为当前完整正文），
+    客户端应以其替换已接收的内容。
+    """
+    current_user_id = getattr(request.state, "user_id", "system")
+    journal = get_journal(chapter_id)
+    if not journal or journal.user_id != current_user_id:
+        raise HTTPException(status_code=404, detail="没有可恢复的章节生成")
+    
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    return create_sse_response(journal.subscribe(resume_from))
 
 
 @router.get("/{chapter_id}/analysis/status", summary="查询章节分析任务状态")
@@ -2033,6 +2190,15 @@ async def get_chapter_annotations(
     )
     memories = memories_result.scalars().all()
     
+    def locate(item: Dict[str, Any]) -> Tuple[int, int]:
+        """分段分析的条目带有全文偏移，优先使用；否则在正文中查找关键词"""
+        stored = item.get('text_position')
+        if isinstance(stored, int) and 0 <= stored < len(chapter.content):
+            return stored, item.get('text_length') or len(item.get('keyword', ''))
+        keyword = item.get('keyword', '')
+        pos = chapter.content.find(keyword) if keyword else -1
+        return pos, (len(keyword) if pos != -1 else 0)
+    
     # 构建标注数据
     annotations = []
     
@@ -2049,12 +2215,10 @@ async def get_chapter_annotations(
                 for hook in analysis.hooks:
                     # 通过标题或内容匹配
                     if mem.title and hook.get('type') in mem.title:
-                        keyword = hook.get('keyword', '')
-                        if keyword:
-                            pos = chapter.content.find(keyword)
-                            if pos != -1:
-                                position = pos
-                                length = len(keyword)
+                        pos, matched_length = locate(hook)
+                        if pos != -1:
+                            position = pos
+                            length = matched_length
                         metadata_extra["strength"] = hook.get('strength', 5)
                         metadata_extra["position_desc"] = hook.get('position', '')
                         break
@@ -2062,12 +2226,10 @@ async def get_chapter_annotations(
             elif mem.memory_type == 'foreshadow' and analysis.foreshadows:
                 for foreshadow in analysis.foreshadows:
                     if foreshadow.get('content') in mem.content:
-                        keyword = foreshadow.get('keyword', '')
-                        if keyword:
-                            pos = chapter.content.find(keyword)
-                            if pos != -1:
-                                position = pos
-                                length = len(keyword)
+                        pos, matched_length = locate(foreshadow)
+                        if pos != -1:
+                            position = pos
+                            length = matched_length
                         metadata_extra["foreshadow_type"] = foreshadow.get('type', 'planted')
                         metadata_extra["strength"] = foreshadow.get('strength', 5)
                         break
@@ -2075,12 +2237,10 @@ async def get_chapter_annotations(
             elif mem.memory_type == 'plot_point' and analysis.plot_points:
                 for plot_point in analysis.plot_points:
                     if plot_point.get('content') in mem.content:
-                        keyword = plot_point.get('keyword', '')
-                        if keyword:
-                            pos = chapter.content.find(keyword)
-                            if pos != -1:
-                                position = pos
-                                length = len(keyword)
+                        pos, matched_length = locate(plot_point)
+                        if pos != -1:
+                            position = pos
+                            length = matched_length
                         break
         else:
             # 如果数据库有位置，也从分析数据中提取额外的元数据
@@ -2139,7 +2299,6 @@ async def get_chapter_annotations(
 async def trigger_chapter_analysis(
     chapter_id: str,
     request: Request,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     user_ai_service: AIService = Depends(get_user_ai_service)
 ):
@@ -2192,14 +2351,13 @@ async def trigger_chapter_analysis(
     # 短暂延迟确保SQLite WAL完成写入（让其他会话可见）
     await asyncio.sleep(3)
     
-    # 直接启动后台分析（并发执行）
-    background_tasks.add_task(
-        analyze_chapter_background,
-        chapter_id=chapter_id,
+    # 提交后台分析作业（由作业执行器认领执行）
+    await enqueue_job(
+        db,
+        kind=JOB_CHAPTER_ANALYSIS,
         user_id=user_id,
-        project_id=project.id,
-        task_id=task_id,
-        ai_service=user_ai_service
+        ref_id=task_id,
+        payload={'chapter_id': chapter_id, 'project_id': project.id}
     )
     
     return {
@@ -2214,19 +2372,23 @@ async def trigger_chapter_analysis(
 def calculate_estimated_time(
     chapter_count: int,
     target_word_count: int,
-    enable_analysis: bool
+    enable_analysis: bool,
+    pipelined: bool = False
 ) -> int:
     """
     计算预估耗时（分钟）
     
     基准：
     - 生成3000字约需2分钟
-    - 分析约需1分钟
+    - 分析约需1分钟（流水线模式下与下一章生成重叠，只计最后一章）
     """
     generation_time_per_chapter = (target_word_count / 3000) * 2
     analysis_time_per_chapter = 1 if enable_analysis else 0
     
-    total_time = chapter_count * (generation_time_per_chapter + analysis_time_per_chapter)
+    if pipelined and enable_analysis:
+        total_time = chapter_count * max(generation_time_per_chapter, analysis_time_per_chapter) + analysis_time_per_chapter
+    else:
+        total_time = chapter_count * (generation_time_per_chapter + analysis_time_per_chapter)
     
     return max(1, int(total_time))
 
@@ -2236,7 +2398,6 @@ async def batch_generate_chapters_in_order(
     project_id: str,
     batch_request: BatchGenerateRequest,
     request: Request,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     user_ai_service: AIService = Depends(get_user_ai_service)
 ):
@@ -2313,18 +2474,26 @@ async def batch_generate_chapters_in_order(
     estimated_time = calculate_estimated_time(
         chapter_count=len(chapters_to_generate),
         target_word_count=batch_request.target_word_count,
-        enable_analysis=batch_request.enable_analysis
+        enable_analysis=batch_request.enable_analysis,
+        pipelined=(
+            batch_request.analysis_lookahead
+            if batch_request.analysis_lookahead is not None
+            else app_settings.batch_analysis_lookahead
+        ) > 0
     )
     
     logger.info(f"📦 创建批量生成任务: {batch_id}, 章节: 第{start_number}-{end_number}章, 预估耗时: {estimated_time}分钟")
     
-    # 启动后台批量生成任务，传递model参数
-    background_tasks.add_task(
-        execute_batch_generation_in_order,
-        batch_id=batch_id,
+    # 提交批量生成作业（持久化队列，进程重启后从当前章节继续），传递model参数
+    await enqueue_job(
+        db,
+        kind=JOB_BATCH_GENERATION,
         user_id=user_id,
-        ai_service=user_ai_service,
-        custom_model=batch_request.model
+        ref_id=batch_id,
+        payload={
+            'custom_model': batch_request.model,
+            'analysis_lookahead': batch_request.analysis_lookahead
+        }
     )
     
     return BatchGenerateResponse(
@@ -2417,6 +2586,59 @@ async def get_active_batch_generation(
     }
 
 
+@router.get("/project/{project_id}/task-events", summary="订阅项目任务事件（SSE）")
+async def subscribe_project_task_events(
+    project_id: str,
+    request: Request
+):
+    """
+    订阅项目内批量生成、章节分析任务的进度事件（替代轮询状态接口）
+    
+    - 连接建立后先推送项目内进行中任务的当前状态
+    - 之后任务每次状态变化推送一条事件：type=batch_generation/analysis
+    - 空闲时发送心跳
+    """
+    user_id = getattr(request.state, 'user_id', None)
+    initial_events = {}
+    async for temp_db in get_db(request):
+        try:
+            await verify_project_access(project_id, user_id, temp_db)
+            
+            # 总线只记录本进程启动后发生的变化，进行中的任务从数据库补齐一次
+            batch_result = await temp_db.execute(
+                select(BatchGenerationTask)
+                .where(BatchGenerationTask.project_id == project_id)
+                .where(BatchGenerationTask.status.in_(['pending', 'running']))
+            )
+            analysis_result = await temp_db.execute(
+                select(AnalysisTask)
+                .where(AnalysisTask.project_id == project_id)
+                .where(AnalysisTask.status.in_(['pending', 'running']))
+            )
+            for row in [*batch_result.scalars().all(), *analysis_result.scalars().all()]:
+                initial_events[row.id] = task_snapshot(row)
+        finally:
+            await temp_db.close()
+        break
+    
+    async def event_generator():
+        async with task_event_bus.subscribe(project_id) as queue:
+            for evt in task_event_bus.snapshots(project_id):
+                initial_events[evt["task_id"]] = evt
+            for evt in initial_events.values():
+                yield SSEResponse.format_sse(evt)
+            
+            while not await request.is_disconnected():
+                try:
+                    evt = await asyncio.wait_for(queue.get(), timeout=app_settings.task_event_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield await SSEResponse.send_heartbeat()
+                    continue
+                yield SSEResponse.format_sse(evt)
+    
+    return create_sse_response(event_generator())
+
+
 @router.post("/batch-generate/{batch_id}/cancel", summary="取消批量生成任务")
 async def cancel_batch_generation(
     batch_id: str,
@@ -2448,35 +2670,129 @@ async def cancel_batch_generation(
     }
 
 
+async def _is_batch_cancelled(db_session: AsyncSession, batch_id: str) -> bool:
+    """检查批量任务是否被取消"""
+    if task_event_bus.is_cancelled(batch_id):
+        return True
+    if task_event_bus.cross_process:
+        return False
+    # 事件总线仅在进程内时，其他进程（多副本/独立worker）发起的取消只能从数据库得知
+    status = await db_session.scalar(
+        select(BatchGenerationTask.status).where(BatchGenerationTask.id == batch_id)
+    )
+    return status == 'cancelled'
+
+
+async def _publish_batch_state(db_session: AsyncSession, task: BatchGenerationTask):
+    """取消后按数据库中的最终状态重新发布任务事件（内存对象上的状态可能已过期）"""
+    try:
+        await db_session.refresh(task)
+    except Exception as e:
+        logger.warning(f"⚠️ 刷新批量任务状态失败: {str(e)}")
+        return
+    task_event_bus.publish([task_snapshot(task)])
+
+
+async def _analyze_chapter_with_retry(
+    chapter_id: str,
+    chapter_number: int,
+    user_id: str,
+    project_id: str,
+    ai_service: AIService,
+    max_attempts: int = 3
+) -> Optional[str]:
+    """
+    分析章节，失败时重试（每次创建新的分析任务）
+    
+    使用独立数据库会话，可以与批量生成的主流程并发执行。
+    
+    Returns:
+        None 表示分析成功，否则为最后一次失败的错误信息
+    """
+    from app.database import get_session_factory
+    
+    AsyncSessionLocal = await get_session_factory(user_id)
+    
+    last_analysis_error = None
+    for attempt in range(max_attempts):
+        try:
+            if attempt > 0:
+                logger.info(f"🔄 重试分析章节 (第{attempt}次): 第{chapter_number}章")
+            
+            async with AsyncSessionLocal() as db_session:
+                async with write_coordinator.guard(db_session):
+                    analysis_task = AnalysisTask(
+                        chapter_id=chapter_id,
+                        user_id=user_id,
+                        project_id=project_id,
+                        status='pending',
+                        progress=0
+                    )
+                    db_session.add(analysis_task)
+                    await db_session.commit()
+                    await db_session.refresh(analysis_task)
+            
+            # 直接使用返回值判断成功/失败
+            analysis_result = await analyze_chapter_background(
+                chapter_id=chapter_id,
+                user_id=user_id,
+                project_id=project_id,
+                task_id=analysis_task.id,
+                ai_service=ai_service
+            )
+            if analysis_result:
+                logger.info(f"✅ 章节分析成功: 第{chapter_number}章")
+                return None
+            
+            last_analysis_error = "分析函数返回失败"
+            logger.error(f"❌ 章节分析失败: 第{chapter_number}章")
+        except Exception as analysis_error:
+            last_analysis_error = str(analysis_error)
+            logger.error(f"❌ 章节分析异常: 第{chapter_number}章: {last_analysis_error}")
+        
+        if attempt + 1 < max_attempts:
+            wait_time = min(2 ** (attempt + 1), 10)
+            logger.warning(f"⏳ 分析失败，等待 {wait_time} 秒后重试...")
+            await asyncio.sleep(wait_time)
+    
+    return last_analysis_error
+
+
 async def execute_batch_generation_in_order(
     batch_id: str,
     user_id: str,
     ai_service: AIService,
-    custom_model: Optional[str] = None
+    custom_model: Optional[str] = None,
+    analysis_lookahead: Optional[int] = None
 ):
     """
     按顺序执行批量生成任务（后台任务）
     - 严格按章节序号顺序
     - 任一章节失败则终止后续生成
     - 可选同步分析
+    
+    启用分析时支持流水线模式（analysis_lookahead > 0）：
+    下一章只硬依赖上一章的正文和摘要，生成完成后立即开始下一章，
+    上一章的分析（含伏笔、角色状态更新）在后台并发完成。
+    最多允许 analysis_lookahead 个章节的分析尚未完成，超出时等待最早的分析。
+    代价是下一章的上下文可能还看不到最近几章的分析结果；
+    任一章节分析最终失败时仍会终止任务（此时后续至多 analysis_lookahead 章可能已生成）。
+    analysis_lookahead = 0 时为串行模式：每章分析完成后才生成下一章。
     """
     db_session = None
-    write_lock = await get_db_write_lock(user_id)
+    task = None
+    # 进行中的分析：(章节ID, 章节序号, 分析协程任务)，按章节顺序排列
+    pending_analyses: Deque[Tuple[str, int, asyncio.Task]] = deque()
     
     try:
         logger.info(f"📦 开始执行顺序批量生成任务: {batch_id}")
         
         # 创建独立数据库会话
-        from app.database import get_engine
-        from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
-        
-        engine = await get_engine(user_id)
-        AsyncSessionLocal = async_sessionmaker(
-            engine,
-            class_=AsyncSession,
-            expire_on_commit=False
-        )
+        from app.database import get_session_factory
+        
+        AsyncSessionLocal = await get_session_factory(user_id)
         db_session = AsyncSessionLocal()
+        write_lock = write_coordinator.guard(db_session, scope=f"batch:{batch_id}")
         
         # 获取任务
         task_result = await db_session.execute(
@@ -2488,21 +2804,122 @@ async def execute_batch_generation_in_order(
             logger.error(f"❌ 批量生成任务不存在: {batch_id}")
             return
         
+        if task.status in ('completed', 'failed', 'cancelled'):
+            logger.info(f"📦 批量生成任务已结束({task.status})，跳过: {batch_id}")
+            return
+        
+        # 崩溃/重启后恢复：从中断时正在生成的章节继续（之前的章节均已完成）
+        resume_index = 0
+        if task.status == 'running' and task.current_chapter_id in (task.chapter_ids or []):
+            resume_index = task.chapter_ids.index(task.current_chapter_id)
+            logger.info(f"♻️ 恢复批量生成任务: {batch_id}，从第{resume_index + 1}/{task.total_chapters}个章节继续")
+        
         # 更新任务状态为运行中
         async with write_lock:
             task.status = 'running'
-            task.started_at = datetime.now()
+            if resume_index == 0 or not task.started_at:
+                task.started_at = datetime.now()
+            task.completed_chapters = resume_index
             await db_session.commit()
         
+        lookahead = analysis_lookahead if analysis_lookahead is not None else app_settings.batch_analysis_lookahead
+        lookahead = max(0, lookahead) if task.enable_analysis else 0
+        if lookahead:
+            logger.info(f"🔀 流水线模式: 最多 {lookahead} 个章节的分析与后续生成并发")
+        
+        def schedule_analysis(analysis_chapter_id: str, chapter_number: int):
+            logger.info(f"🔍 开始分析章节: 第{chapter_number}章")
+            pending_analyses.append((analysis_chapter_id, chapter_number, asyncio.create_task(
+                _analyze_chapter_with_retry(
+                    chapter_id=analysis_chapter_id,
+                    chapter_number=chapter_number,
+                    user_id=user_id,
+                    project_id=task.project_id,
+                    ai_service=ai_service
+                )
+            )))
+        
+        async def reap_analyses(keep: int) -> bool:
+            """按章节顺序等待分析完成，直到进行中的分析不超过 keep 个；分析失败时终止任务并返回False"""
+            while len(pending_analyses) > keep:
+                analysis_chapter_id, chapter_number, analysis = pending_analyses.popleft()
+                last_analysis_error = await analysis
+                
+                if last_analysis_error is None:
+                    async with write_lock:
+                        task.completed_chapters += 1
+                        task.current_retry_count = 0
+                        await db_session.commit()
+                    logger.info(f"✅ 进度: {task.completed_chapters}/{task.total_chapters}")
+                    continue
+                
+                # 达到最大重试次数，必须终止整个批量任务
+                logger.error(f"❌ 章节分析失败，已达最大重试次数(3次): 第{chapter_number}章")
+                for _, _, other in pending_analyses:
+                    other.cancel()
+                pending_analyses.clear()
+                
+                failed_chapter = await db_session.get(Chapter, analysis_chapter_id)
+                failed_info = {
+                    'chapter_id': analysis_chapter_id,
+                    'chapter_number': chapter_number,
+                    'title': failed_chapter.title if failed_chapter else '未知',
+                    'error': f"分析失败(重试3次): {last_analysis_error}",
+                    'retry_count': 3
+                }
+                
+                async with write_lock:
+                    if task.failed_chapters is None:
+                        task.failed_chapters = []
+                    task.failed_chapters.append(failed_info)
+                    
+                    # 标记任务失败并终止
+                    task.status = 'failed'
+                    task.error_message = f"第{chapter_number}章分析失败(重试3次): {last_analysis_error}"[:500]
+                    task.completed_at = datetime.now()
+                    task.current_retry_count = 0
+                    await db_session.commit()
+                
+                logger.error(f"🛑 批量生成中断: 第{chapter_number}章分析失败")
+                return False
+            return True
+        
+        # 恢复执行时，重新提交前瞻窗口内尚未完成分析的章节
+        if resume_index and lookahead:
+            window = task.chapter_ids[max(0, resume_index - lookahead):resume_index]
+            analyzed_result = await db_session.execute(
+                select(AnalysisTask.chapter_id)
+                .where(AnalysisTask.chapter_id.in_(window))
+                .where(AnalysisTask.status == 'completed')
+            )
+            analyzed = set(analyzed_result.scalars().all())
+            window_chapters = await db_session.execute(
+                select(Chapter.id, Chapter.chapter_number).where(Chapter.id.in_(window))
+            )
+            numbers = dict(window_chapters.all())
+            for window_chapter_id in window:
+                if window_chapter_id not in analyzed and window_chapter_id in numbers:
+                    schedule_analysis(window_chapter_id, numbers[window_chapter_id])
+            if pending_analyses:
+                async with write_lock:
+                    task.completed_chapters = resume_index - len(pending_analyses)
+                    await db_session.commit()
+        
         # 维护上一章的摘要，用于传递给下一章（防重复上下文）
         last_generated_summary = None
 
         # 按顺序生成每个章节
         for idx, chapter_id in enumerate(task.chapter_ids, 1):
+            if idx <= resume_index:
+                continue
+            
             # 检查任务是否被取消
-            await db_session.refresh(task)
-            if task.status == 'cancelled':
+            if await _is_batch_cancelled(db_session, batch_id):
                 logger.info(f"🛑 批量生成任务已被取消: {batch_id}")
+                # 已生成章节的分析继续完成
+                await asyncio.gather(*(t for _, _, t in pending_analyses), return_exceptions=True)
+                pending_analyses.clear()
+                await _publish_batch_state(db_session, task)
                 return
             
             # 更新当前章节
@@ -2546,16 +2963,20 @@ async def execute_batch_generation_in_order(
                     
                     # 生成章节内容（复用现有流式生成逻辑的核心部分），传递model参数
                     # 并获取生成后的摘要（如果生成函数支持返回）
-                    generated_summary = await generate_single_chapter_for_batch(
-                        db_session=db_session,
-                        chapter=chapter,
-                        user_id=user_id,
-                        style_id=task.style_id,
-                        target_word_count=task.target_word_count,
-                        ai_service=ai_service,
-                        write_lock=write_lock,
-                        custom_model=custom_model,
-                        previous_summary_context=last_generated_summary
+                    # 任务被取消时立即中断正在进行的生成
+                    generated_summary = await task_event_bus.run_cancellable(
+                        batch_id,
+                        generate_single_chapter_for_batch(
+                            db_session=db_session,
+                            chapter=chapter,
+                            user_id=user_id,
+                            style_id=task.style_id,
+                            target_word_count=task.target_word_count,
+                            ai_service=ai_service,
+                            write_lock=write_lock,
+                            custom_model=custom_model,
+                            previous_summary_context=last_generated_summary
+                        )
                     )
                     
                     # 更新上一章摘要，供下一章使用
@@ -2565,99 +2986,29 @@ async def execute_batch_generation_in_order(
                     
                     logger.info(f"✅ 章节生成完成: 第{chapter.chapter_number}章")
                     
-                    # 如果启用同步分析
-                    if task.enable_analysis:
-                        logger.info(f"🔍 开始同步分析章节: 第{chapter.chapter_number}章")
-                        
-                        # 分析重试机制（最多3次）
-                        analysis_retry_count = 0
-                        analysis_success = False
-                        last_analysis_error = None
-                        
-                        while analysis_retry_count < 3 and not analysis_success:
-                            try:
-                                if analysis_retry_count > 0:
-                                    logger.info(f"🔄 重试分析章节 (第{analysis_retry_count}次): 第{chapter.chapter_number}章")
-                                
-                                async with write_lock:
-                                    analysis_task = AnalysisTask(
-                                        chapter_id=chapter_id,
-                                        user_id=user_id,
-                                        project_id=task.project_id,
-                                        status='pending',
-                                        progress=0
-                                    )
-                                    db_session.add(analysis_task)
-                                    await db_session.commit()
-                                    await db_session.refresh(analysis_task)
-                                
-                                # 同步执行分析，直接使用返回值判断成功/失败
-                                analysis_result = await analyze_chapter_background(
-                                    chapter_id=chapter_id,
-                                    user_id=user_id,
-                                    project_id=task.project_id,
-                                    task_id=analysis_task.id,
-                                    ai_service=ai_service
-                                )
-                                
-                                # 直接根据返回值判断
-                                if not analysis_result:
-                                    last_analysis_error = "分析函数返回失败"
-                                    logger.error(f"❌ 章节分析失败: 第{chapter.chapter_number}章")
-                                    raise Exception(f"章节分析失败")
-                                
-                                # 分析成功
-                                analysis_success = True
-                                logger.info(f"✅ 章节分析成功: 第{chapter.chapter_number}章")
-                                
-                            except Exception as analysis_error:
-                                last_analysis_error = str(analysis_error)
-                                analysis_retry_count += 1
-                                
-                                if analysis_retry_count < 3:
-                                    # 还有重试机会，等待后重试
-                                    wait_time = min(2 ** analysis_retry_count, 10)
-                                    logger.warning(f"⏳ 分析失败，等待 {wait_time} 秒后重试...")
-                                    await asyncio.sleep(wait_time)
-                                else:
-                                    # 达到最大重试次数，必须终止整个批量任务
-                                    logger.error(f"❌ 章节分析失败，已达最大重试次数(3次): 第{chapter.chapter_number}章")
-                                    
-                                    # 记录失败信息
-                                    failed_info = {
-                                        'chapter_id': chapter_id,
-                                        'chapter_number': chapter.chapter_number,
-                                        'title': chapter.title,
-                                        'error': f"分析失败(重试3次): {last_analysis_error}",
-                                        'retry_count': 3
-                                    }
-                                    
-                                    async with write_lock:
-                                        if task.failed_chapters is None:
-                                            task.failed_chapters = []
-                                        task.failed_chapters.append(failed_info)
-                                        
-                                        # 标记任务失败并终止
-                                        task.status = 'failed'
-                                        task.error_message = f"第{chapter.chapter_number}章分析失败(重试3次): {last_analysis_error}"[:500]
-                                        task.completed_at = datetime.now()
-                                        task.current_retry_count = 0
-                                        await db_session.commit()
-                                    
-                                    logger.error(f"🛑 批量生成中断: 第{chapter.chapter_number}章分析失败")
-                                    return  # 立即终止整个批量生成任务
-                    
                     # 标记成功
                     chapter_success = True
                     
-                    # 更新完成数
-                    async with write_lock:
-                        task.completed_chapters += 1
-                        task.current_retry_count = 0  # 重置重试计数
-                        await db_session.commit()
-                    
-                    logger.info(f"✅ 进度: {task.completed_chapters}/{task.total_chapters}")
+                    if task.enable_analysis:
+                        # 提交分析（流水线模式下与后续章节的生成并发执行），完成后计入完成数
+                        schedule_analysis(chapter_id, chapter.chapter_number)
+                    else:
+                        # 更新完成数
+                        async with write_lock:
+                            task.completed_chapters += 1
+                            task.current_retry_count = 0  # 重置重试计数
+                            await db_session.commit()
+                        
+                        logger.info(f"✅ 进度: {task.completed_chapters}/{task.total_chapters}")
                     
+                except TaskCancelled:
+                    logger.info(f"🛑 批量生成任务已被取消，中断第{chapter.chapter_number}章生成: {batch_id}")
+                    await db_session.rollback()
+                    # 已生成章节的分析继续完成
+                    await asyncio.gather(*(t for _, _, t in pending_analyses), return_exceptions=True)
+                    pending_analyses.clear()
+                    await _publish_batch_state(db_session, task)
+                    return
                 except Exception as e:
                     last_error = str(e)
                     error_msg = f"第{chapter.chapter_number if chapter else '?'}章出错: {last_error}"
@@ -2701,7 +3052,18 @@ async def execute_batch_generation_in_order(
                         else:
                             logger.error(f"🛑 批量生成终止于第{chapter.chapter_number}章")
                         
+                        # 已生成章节的分析继续完成
+                        await asyncio.gather(*(t for _, _, t in pending_analyses), return_exceptions=True)
+                        pending_analyses.clear()
                         return
+            
+            # 等待超出前瞻深度的分析完成（串行模式下即等待本章分析）
+            if not await reap_analyses(keep=lookahead):
+                return
+        
+        # 等待剩余的分析完成
+        if not await reap_analyses(keep=0):
+            return
         
         # 全部完成
         async with write_lock:
@@ -2725,10 +3087,93 @@ async def execute_batch_generation_in_order(
             except Exception as commit_error:
                 logger.error(f"❌ 更新任务失败状态失败: {str(commit_error)}")
     finally:
+        # 异常退出或作业被停止时取消未完成的分析（恢复执行时会重新提交）
+        for _, _, analysis in pending_analyses:
+            analysis.cancel()
         if db_session:
             await db_session.close()
 
 
+# ==================== 持久化作业处理函数 ====================
+
+JOB_BATCH_GENERATION = "batch_generation"
+JOB_CHAPTER_ANALYSIS = "chapter_analysis"
+
+
+async def _run_batch_generation_job(job: Job):
+    """作业处理：批量生成（可重入，自动从当前章节继续）"""
+    db_session = await get_job_session()
+    try:
+        ai_service = await build_user_ai_service(job.user_id, db_session)
+        await execute_batch_generation_in_order(
+            batch_id=job.ref_id,
+            user_id=job.user_id,
+            ai_service=ai_service,
+            custom_model=(job.payload or {}).get('custom_model'),
+            analysis_lookahead=(job.payload or {}).get('analysis_lookahead')
+        )
+    finally:
+        await db_session.close()
+
+
+async def _fail_batch_generation_job(job: Job, error: str):
+    """作业最终失败时同步批量任务状态"""
+    db_session = await get_job_session()
+    try:
+        task = await db_session.get(BatchGenerationTask, job.ref_id)
+        if task and task.status in ('pending', 'running'):
+            task.status = 'failed'
+            task.error_message = f"后台作业失败: {error}"[:500]
+            task.completed_at = datetime.now()
+            await db_session.commit()
+    finally:
+        await db_session.close()
+
+
+async def _recover_batch_generation_jobs(db_session: AsyncSession) -> int:
+    """把旧版本通过 BackgroundTasks 启动、随进程退出而中断的批量任务补录为作业"""
+    job_refs = select(Job.ref_id).where(Job.kind == JOB_BATCH_GENERATION)
+    result = await db_session.execute(
+        select(BatchGenerationTask)
+        .where(BatchGenerationTask.status.in_(['pending', 'running']))
+        .where(BatchGenerationTask.id.not_in(job_refs))
+    )
+    count = 0
+    for task in result.scalars().all():
+        if await enqueue_job(db_session, JOB_BATCH_GENERATION, task.user_id, ref_id=task.id):
+            count += 1
+    return count
+
+
+async def _run_chapter_analysis_job(job: Job):
+    """作业处理：章节分析"""
+    db_session = await get_job_session()
+    try:
+        analysis_task = await db_session.get(AnalysisTask, job.ref_id)
+        if not analysis_task or analysis_task.status == 'completed':
+            return
+        payload = job.payload or {}
+        ai_service = await build_user_ai_service(job.user_id, db_session)
+        await analyze_chapter_background(
+            chapter_id=payload.get('chapter_id') or analysis_task.chapter_id,
+            user_id=job.user_id,
+            project_id=payload.get('project_id') or analysis_task.project_id,
+            task_id=job.ref_id,
+            ai_service=ai_service
+        )
+    finally:
+        await db_session.close()
+
+
+register_job_handler(
+    JOB_BATCH_GENERATION,
+    _run_batch_generation_job,
+    on_failed=_fail_batch_generation_job,
+    recover=_recover_batch_generation_jobs
+)
+register_job_handler(JOB_CHAPTER_ANALYSIS, _run_chapter_analysis_job)
+
+
 async def generate_single_chapter_for_batch(
     db_session: AsyncSession,
     chapter: Chapter,
@@ -2736,7 +3181,7 @@ async def generate_single_chapter_for_batch(
     style_id: Optional[int],
     target_word_count: int,
     ai_service: AIService,
-    write_lock: Lock,
+    write_lock: WriteGuard,
     custom_model: Optional[str] = None,
     previous_summary_context: Optional[str] = None
 ) -> Optional[str]:
@@ -2962,8 +3407,8 @@ async def generate_single_chapter_for_batch(
         chapter.word_count = new_word_count
         chapter.status = "completed"
         
-        # 更新项目字数
-        project.current_words = project.current_words - old_word_count + new_word_count
+        # 更新项目字数（在数据库中原子增减，避免与其他写入互相覆盖）
+        project.current_words = Project.current_words - old_word_count + new_word_count
         
         # 记录生成历史
         history = GenerationHistory(
@@ -3793,7 +4238,7 @@ async def apply_partial_regenerate(
     )
     project = project_result.scalar_one_or_none()
     if project:
-        project.current_words = project.current_words - old_word_count + new_word_count
+        project.current_words = Project.current_words - old_word_count + new_word_count
     
     await db.commit()
     await db.refresh(chapter)
@@ -959,7 +959,7 @@ async def generate_character_stream(
                         ai_response += content
                         
                         # 发送内容块
-                        yield await SSEResponse.send_chunk(content)
+                        yield await tracker.generating_chunk(content)
                         
                         # 定期更新进度（每收到约500字符更新一次，避免过于频繁）
                         current_len = len(ai_response)
@@ -123,9 +123,10 @@ async def generate_options(
             
             system_key, user_key = template_keys
             
-            # 获取自定义提示词模板（分别获取 system 和 user）
-            system_template = await PromptService.get_template(system_key, user_id, db)
-            user_template = await PromptService.get_template(user_key, user_id, db)
+            # 获取自定义提示词模板（system 和 user 一次解析）
+            templates = await PromptService.get_templates([system_key, user_key], user_id, db)
+            system_template = templates[system_key]
+            user_template = templates[user_key]
             
             # 准备格式化参数
             format_params = {
@@ -283,9 +284,10 @@ async def refine_options(
             
             system_key, user_key = template_keys
             
-            # 获取自定义提示词模板
-            system_template = await PromptService.get_template(system_key, user_id, db)
-            user_template = await PromptService.get_template(user_key, user_id, db)
+            # 获取自定义提示词模板（system 和 user 一次解析）
+            templates = await PromptService.get_templates([system_key, user_key], user_id, db)
+            system_template = templates[system_key]
+            user_template = templates[user_key]
             
             # 准备格式化参数
             format_params = {
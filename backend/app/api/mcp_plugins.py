@@ -4,12 +4,12 @@
 """
 import asyncio
 from fastapi import APIRouter, HTTPException, Depends, Query, Request, BackgroundTasks
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from typing import List, Optional
 from datetime import datetime
 
-from app.database import get_db, get_engine
+from app.database import get_db, get_session_factory
 from app.models.mcp_plugin import MCPPlugin
 from app.schemas.mcp_plugin import (
     MCPPluginCreate,
@@ -66,8 +66,7 @@ async def _register_plugin_background(
             success = False
 
         # 更新数据库状态
-        engine = await get_engine(user_id)
-        AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        AsyncSessionLocal = await get_session_factory(user_id)
 
         async with AsyncSessionLocal() as db:
             stmt = (
@@ -89,8 +88,7 @@ async def _register_plugin_background(
     except Exception as e:
         logger.error(f"后台注册MCP插件异常: {plugin_name}, 错误: {e}")
         try:
-            engine = await get_engine(user_id)
-            AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            AsyncSessionLocal = await get_session_factory(user_id)
             async with AsyncSessionLocal() as db:
                 stmt = (
                     update(MCPPlugin)
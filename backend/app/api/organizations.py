@@ -505,7 +505,7 @@ async def generate_organization_stream(
                     ai_content += chunk
                     
                     # 发送内容块
-                    yield await SSEResponse.send_chunk(chunk)
+                    yield await tracker.generating_chunk(chunk)
                     
                     # 定期更新字数（避免过于频繁）
                     if chunk_count % 5 == 0:
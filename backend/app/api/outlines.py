@@ -1,7 +1,7 @@
 """大纲管理API"""
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, delete
+from sqlalchemy import select, func, delete, case
 from typing import List, AsyncGenerator, Dict, Any
 import json
 
@@ -375,7 +375,10 @@ async def delete_outline(
     
     # 更新项目字数
     if deleted_word_count > 0:
-        project.current_words = max(0, project.current_words - deleted_word_count)
+        project.current_words = case(
+            (Project.current_words > deleted_word_count, Project.current_words - deleted_word_count),
+            else_=0,
+        )
         logger.info(f"更新项目字数：减少 {deleted_word_count} 字")
     
     # 删除大纲
@@ -1191,7 +1194,10 @@ async def new_outline_generator(
         
         # 更新项目字数
         if deleted_word_count > 0:
-            project.current_words = max(0, project.current_words - deleted_word_count)
+            project.current_words = case(
+                (Project.current_words > deleted_word_count, Project.current_words - deleted_word_count),
+                else_=0,
+            )
             logger.info(f"更新项目字数：减少 {deleted_word_count} 字")
         
         # 再删除所有旧大纲
@@ -2177,121 +2183,126 @@ async def batch_expand_outlines_generator(
         expansion_results = []
         total_chapters_created = 0
         skipped_outlines = []
+        estimated_total = total_outlines * chapters_per_outline * 500
         
-        for idx, outline in enumerate(outlines):
-            try:
-                # 计算当前子进度 (0.0-1.0)，用于generating阶段
-                sub_progress = idx / max(total_outlines, 1)
-                
-                yield await tracker.generating(
-                    current_chars=idx * chapters_per_outline * 500,
-                    estimated_total=total_outlines * chapters_per_outline * 500,
-                    message=f"📝 处理第 {idx + 1}/{total_outlines} 个大纲: {outline.title}"
-                )
-                
-                # 检查大纲是否已经展开过
-                existing_chapters_result = await db.execute(
-                    select(Chapter)
-                    .where(Chapter.outline_id == outline.id)
-                    .limit(1)
-                )
-                existing_chapter = existing_chapters_result.scalar_one_or_none()
-                
-                if existing_chapter:
-                    logger.info(f"大纲 {outline.title} (ID: {outline.id}) 已经展开过，跳过")
-                    skipped_outlines.append({
+        # 检查哪些大纲已经展开过（一次查询）
+        expanded_result = await db.execute(
+            select(Chapter.outline_id)
+            .where(Chapter.outline_id.in_([outline.id for outline in outlines]))
+            .distinct()
+        )
+        expanded_outline_ids = set(expanded_result.scalars().all())
+        
+        pending_outlines = []
+        for outline in outlines:
+            if outline.id not in expanded_outline_ids:
+                pending_outlines.append(outline)
+                continue
+            logger.info(f"大纲 {outline.title} (ID: {outline.id}) 已经展开过，跳过")
+            skipped_outlines.append({
+                "outline_id": outline.id,
+                "outline_title": outline.title,
+                "reason": "已展开"
+            })
+            yield await tracker.generating(
+                current_chars=len(skipped_outlines) * chapters_per_outline * 500,
+                estimated_total=estimated_total,
+                message=f"⏭️ {outline.title} 已展开过，跳过"
+            )
+        
+        concurrency = data.get("concurrency")
+        analyses = expansion_service.analyze_outlines_concurrently(
+            pending_outlines,
+            project,
+            concurrency=int(concurrency) if concurrency else None,
+            target_chapter_count=chapters_per_outline,
+            expansion_strategy=expansion_strategy,
+            enable_scene_analysis=data.get("enable_scene_analysis", True),
+            provider=data.get("provider"),
+            model=data.get("model")
+        )
+        if pending_outlines:
+            yield await tracker.generating(
+                current_chars=len(skipped_outlines) * chapters_per_outline * 500,
+                estimated_total=estimated_total,
+                message=f"🤖 AI分析 {len(pending_outlines)} 个大纲..."
+            )
+        
+        # 规划按大纲顺序返回；章节按大纲顺序创建，每个大纲的插入与后续章节序号后移在同一事务中完成
+        finished = len(skipped_outlines)
+        try:
+            async for outline, chapter_plans, error in analyses:
+                finished += 1
+                try:
+                    if error is not None:
+                        raise error
+                    
+                    yield await tracker.generating(
+                        current_chars=(finished - 0.5) * chapters_per_outline * 500,
+                        estimated_total=estimated_total,
+                        message=f"✅ {outline.title} 规划生成完成 ({len(chapter_plans)} 章)"
+                    )
+                    
+                    created_chapters = None
+                    if auto_create_chapters:
+                        # 创建章节记录（起始序号按前面大纲的章节数计算，后续章节序号同步后移）
+                        chapters = await expansion_service.create_chapters_from_plans(
+                            outline_id=outline.id,
+                            chapter_plans=chapter_plans,
+                            project_id=outline.project_id,
+                            db=db,
+                            start_chapter_number=None  # 自动计算章节序号
+                        )
+                        created_chapters = [
+                            {
+                                "id": ch.id,
+                                "chapter_number": ch.chapter_number,
+                                "title": ch.title,
+                                "summary": ch.summary,
+                                "outline_id": ch.outline_id,
+                                "sub_index": ch.sub_index,
+                                "status": ch.status
+                            }
+                            for ch in chapters
+                        ]
+                        total_chapters_created += len(chapters)
+                        
+                        yield await tracker.generating(
+                            current_chars=finished * chapters_per_outline * 500,
+                            estimated_total=estimated_total,
+                            message=f"💾 {outline.title} 章节创建完成 ({len(chapters)} 章)"
+                        )
+                    
+                    expansion_results.append({
                         "outline_id": outline.id,
                         "outline_title": outline.title,
-                        "reason": "已展开"
+                        "target_chapter_count": chapters_per_outline,
+                        "actual_chapter_count": len(chapter_plans),
+                        "expansion_strategy": expansion_strategy,
+                        "chapter_plans": chapter_plans,
+                        "created_chapters": created_chapters
                     })
-                    yield await tracker.generating(
-                        current_chars=(idx + 1) * chapters_per_outline * 500,
-                        estimated_total=total_outlines * chapters_per_outline * 500,
-                        message=f"⏭️ {outline.title} 已展开过，跳过"
-                    )
-                    continue
-                
-                # 分析大纲生成章节规划
-                yield await tracker.generating(
-                    current_chars=idx * chapters_per_outline * 500,
-                    estimated_total=total_outlines * chapters_per_outline * 500,
-                    message=f"🤖 AI分析大纲: {outline.title}"
-                )
-                
-                chapter_plans = await expansion_service.analyze_outline_for_chapters(
-                    outline=outline,
-                    project=project,
-                    db=db,
-                    target_chapter_count=chapters_per_outline,
-                    expansion_strategy=expansion_strategy,
-                    enable_scene_analysis=data.get("enable_scene_analysis", True),
-                    provider=data.get("provider"),
-                    model=data.get("model")
-                )
-                
-                yield await tracker.generating(
-                    current_chars=(idx + 0.5) * chapters_per_outline * 500,
-                    estimated_total=total_outlines * chapters_per_outline * 500,
-                    message=f"✅ {outline.title} 规划生成完成 ({len(chapter_plans)} 章)"
-                )
-                
-                created_chapters = None
-                if auto_create_chapters:
-                    # 创建章节记录
-                    chapters = await expansion_service.create_chapters_from_plans(
-                        outline_id=outline.id,
-                        chapter_plans=chapter_plans,
-                        project_id=outline.project_id,
-                        db=db,
-                        start_chapter_number=None  # 自动计算章节序号
-                    )
-                    created_chapters = [
-                        {
-                            "id": ch.id,
-                            "chapter_number": ch.chapter_number,
-                            "title": ch.title,
-                            "summary": ch.summary,
-                            "outline_id": ch.outline_id,
-                            "sub_index": ch.sub_index,
-                            "status": ch.status
-                        }
-                        for ch in chapters
-                    ]
-                    total_chapters_created += len(chapters)
                     
-                    yield await tracker.generating(
-                        current_chars=(idx + 1) * chapters_per_outline * 500,
-                        estimated_total=total_outlines * chapters_per_outline * 500,
-                        message=f"💾 {outline.title} 章节创建完成 ({len(chapters)} 章)"
+                    logger.info(f"大纲 {outline.title} 展开完成，生成 {len(chapter_plans)} 个章节规划")
+                    
+                except Exception as e:
+                    logger.error(f"展开大纲 {outline.id} 失败: {str(e)}", exc_info=True)
+                    yield await tracker.warning(
+                        f"❌ {outline.title} 展开失败: {str(e)}"
                     )
-                
-                expansion_results.append({
-                    "outline_id": outline.id,
-                    "outline_title": outline.title,
-                    "target_chapter_count": chapters_per_outline,
-                    "actual_chapter_count": len(chapter_plans),
-                    "expansion_strategy": expansion_strategy,
-                    "chapter_plans": chapter_plans,
-                    "created_chapters": created_chapters
-                })
-                
-                logger.info(f"大纲 {outline.title} 展开完成，生成 {len(chapter_plans)} 个章节规划")
-                
-            except Exception as e:
-                logger.error(f"展开大纲 {outline.id} 失败: {str(e)}", exc_info=True)
-                yield await tracker.warning(
-                    f"❌ {outline.title} 展开失败: {str(e)}"
-                )
-                expansion_results.append({
-                    "outline_id": outline.id,
-                    "outline_title": outline.title,
-                    "target_chapter_count": chapters_per_outline,
-                    "actual_chapter_count": 0,
-                    "expansion_strategy": expansion_strategy,
-                    "chapter_plans": [],
-                    "created_chapters": None,
-                    "error": str(e)
-                })
+                    expansion_results.append({
+                        "outline_id": outline.id,
+                        "outline_title": outline.title,
+                        "target_chapter_count": chapters_per_outline,
+                        "actual_chapter_count": 0,
+                        "expansion_strategy": expansion_strategy,
+                        "chapter_plans": [],
+                        "created_chapters": None,
+                        "error": str(e)
+                    })
+        finally:
+            # 客户端断开时取消尚未完成的分析
+            await analyses.aclose()
         
         yield await tracker.parsing("整理结果数据...")
         
@@ -2356,9 +2367,12 @@ async def batch_expand_outlines_stream(
         "expansion_strategy": "balanced",  // balanced/climax/detail
         "auto_create_chapters": false,  // 是否自动创建章节
         "enable_scene_analysis": true,  // 是否启用场景分析
+        "concurrency": 3,  // 可选，同时分析的大纲数（1为串行），默认使用服务端配置
         "provider": "openai",  // 可选
         "model": "gpt-4"  // 可选
     }
+    
+    多个大纲并发调用AI分析，结果仍按大纲顺序推送和创建章节。
     """
     # 验证用户权限
     user_id = getattr(request.state, 'user_id', None)
@@ -1,19 +1,123 @@
 """AI去味API - 核心特色功能"""
+import asyncio
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence, Tuple
+
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.database import get_db
 from app.models.generation_history import GenerationHistory
-from app.schemas.polish import PolishRequest, PolishResponse
+from app.schemas.polish import PolishBatchRequest, PolishRequest, PolishResponse
 from app.services.ai_service import AIService
 from app.services.prompt_service import prompt_service, PromptService
 from app.logger import get_logger
 from app.api.settings import get_user_ai_service
+from app.utils.sse_response import SSEResponse, create_sse_response
 
 router = APIRouter(prefix="/polish", tags=["AI去味"])
 logger = get_logger(__name__)
 
 
+def _response_text(response: Any) -> str:
+    """generate_text 返回包含 content 的字典，兼容直接返回字符串的实现"""
+    if isinstance(response, dict):
+        return response.get("content") or ""
+    return response or ""
+
+
+async def _polish_concurrently(
+    items: Sequence[Tuple[int, str]],
+    template: str,
+    user_ai_service: AIService,
+    provider: Optional[str],
+    model: Optional[str],
+    temperature: Optional[float],
+    concurrency: int,
+    max_retries: int,
+    idle_timeout: Optional[float] = None,
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    有界并发地处理多个文本，按完成顺序逐个产出结果
+
+    - 最多 concurrency 个文本同时调用AI（退避等待期间不占用名额），实际请求速率仍由提供商限流器控制
+    - 单个文本失败后按指数退避重试，重试耗尽只标记该条目失败，不影响其他条目
+    - 产出 {"type": "retry", ...} 与 {"type": "item", "status": "success"|"failed", ...}；
+      指定 idle_timeout 时，超过该时间没有任何事件则产出 {"type": "idle"}（供流式响应发送心跳）
+    - 调用方停止迭代（如客户端断开）时取消尚未完成的任务
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(index: int, text: str):
+        prompt = PromptService.format_prompt(template, original_text=text)
+        for attempt in range(1, max_retries + 2):
+            try:
+                # 只在调用AI期间占用并发名额，退避等待时让出给其他文本
+                async with semaphore:
+                    response = await user_ai_service.generate_text(
+                        prompt=prompt,
+                        provider=provider,
+                        model=model,
+                        temperature=temperature,
+                        max_tokens=len(text) * 2  # 预留足够token
+                    )
+                polished_text = _response_text(response)
+                await queue.put({
+                    "type": "item",
+                    "status": "success",
+                    "index": index,
+                    "original": text,
+                    "polished": polished_text,
+                    "word_count_before": len(text),
+                    "word_count_after": len(polished_text),
+                    "attempts": attempt,
+                })
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt > max_retries:
+                    logger.error(f"❌ 第 {index+1} 个文本去味失败（已尝试 {attempt} 次）: {str(e)}")
+                    await queue.put({
+                        "type": "item",
+                        "status": "failed",
+                        "index": index,
+                        "original": text,
+                        "error": str(e),
+                        "attempts": attempt,
+                    })
+                    return
+                delay = settings.polish_batch_retry_backoff * (2 ** (attempt - 1))
+                logger.warning(f"⚠️ 第 {index+1} 个文本去味失败，{delay:.1f}秒后重试（第 {attempt} 次）: {str(e)}")
+                await queue.put({"type": "retry", "index": index, "attempt": attempt, "error": str(e)})
+                await asyncio.sleep(delay)
+
+    tasks = [asyncio.create_task(worker(index, text)) for index, text in items]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=idle_timeout)
+            except asyncio.TimeoutError:
+                yield {"type": "idle"}
+                continue
+            if event["type"] == "item":
+                remaining -= 1
+            yield event
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _batch_concurrency(requested: Optional[int], total: int) -> int:
+    """请求的并发数（缺省用配置），不超过上限与文本数"""
+    concurrency = requested or settings.polish_batch_concurrency
+    return max(1, min(concurrency, settings.polish_batch_max_concurrency, total))
+
+
 @router.post("", response_model=PolishResponse, summary="AI去味")
 async def polish_text(
     request: PolishRequest,
@@ -47,13 +151,14 @@ async def polish_text(
         logger.info(f"开始AI去味处理，原文长度: {len(request.original_text)}")
         
         # 调用AI进行去味处理
-        polished_text = await user_ai_service.generate_text(
+        response = await user_ai_service.generate_text(
             prompt=prompt,
             provider=request.provider,
             model=request.model,
             temperature=request.temperature,
             max_tokens=len(request.original_text) * 2  # 预留足够token
         )
+        polished_text = _response_text(response)
         
         # 计算字数
         word_count_before = len(request.original_text)
@@ -92,6 +197,7 @@ async def polish_batch(
     project_id: int = None,
     provider: str = None,
     model: str = None,
+    concurrency: int = None,
     http_request: Request = None,
     db: AsyncSession = Depends(get_db),
     user_ai_service: AIService = Depends(get_user_ai_service)
@@ -99,43 +205,145 @@ async def polish_batch(
     """
     批量处理多个文本的AI去味
     
-    适用于一次性处理多个章节或段落
+    适用于一次性处理多个章节或段落。文本有界并发处理，全部完成后一次返回；
+    单个文本重试后仍失败时在 failed 中返回下标与错误，其余结果照常返回。
+    文本较多时建议使用 /polish/batch-stream 逐条接收结果。
     """
     try:
         # 获取用户ID
         user_id = getattr(http_request.state, 'user_id', None) if http_request else None
         
+        # 获取自定义提示词模板（所有文本共用）
+        template = await PromptService.get_template("AI_DENOISING", user_id, db)
+        
         results = []
+        failed = []
+        async for event in _polish_concurrently(
+            list(enumerate(texts)),
+            template,
+            user_ai_service,
+            provider=provider,
+            model=model,
+            temperature=None,
+            concurrency=_batch_concurrency(concurrency, len(texts)),
+            max_retries=settings.polish_batch_max_retries,
+        ):
+            if event["type"] != "item":
+                continue
+            if event["status"] == "success":
+                results.append({
+                    "index": event["index"],
+                    "original": event["original"],
+                    "polished": event["polished"],
+                    "word_count_before": event["word_count_before"],
+                    "word_count_after": event["word_count_after"]
+                })
+            else:
+                failed.append({"index": event["index"], "error": event["error"]})
         
-        for idx, text in enumerate(texts):
-            logger.info(f"处理第 {idx+1}/{len(texts)} 个文本")
-            
-            # 获取自定义提示词模板
-            template = await PromptService.get_template("AI_DENOISING", user_id, db)
-            # 格式化提示词
-            prompt = PromptService.format_prompt(template, original_text=text)
-            
-            polished_text = await user_ai_service.generate_text(
-                prompt=prompt,
-                provider=provider,
-                model=model
-            )
-            
-            results.append({
-                "index": idx,
-                "original": text,
-                "polished": polished_text,
-                "word_count_before": len(text),
-                "word_count_after": len(polished_text)
-            })
+        if texts and not results:
+            raise RuntimeError(failed[0]["error"])
         
-        logger.info(f"批量AI去味完成，共处理 {len(results)} 个文本")
+        results.sort(key=lambda r: r["index"])
+        failed.sort(key=lambda r: r["index"])
+        logger.info(f"批量AI去味完成，成功 {len(results)} 个，失败 {len(failed)} 个")
         
         return {
             "total": len(results),
-            "results": results
+            "results": results,
+            "failed": failed
         }
         
     except Exception as e:
         logger.error(f"批量AI去味失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"批量AI去味失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"批量AI去味失败: {str(e)}")
+
+
+@router.post("/batch-stream", summary="批量AI去味（流式）")
+async def polish_batch_stream(
+    request: PolishBatchRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db),
+    user_ai_service: AIService = Depends(get_user_ai_service)
+):
+    """
+    批量AI去味（SSE流式）
+    
+    文本有界并发处理，每个文本完成后立即推送结果，不必等待全部完成：
+    - item：单个文本的结果，包含 index 与 status（success / failed）
+    - retry：单个文本失败后即将重试
+    - progress：整体进度
+    - result：汇总，failed_indices 可作为下次请求的 indices 只重试失败的条目
+    
+    客户端断开时取消尚未完成的文本。
+    """
+    user_id = getattr(http_request.state, 'user_id', None)
+    texts = request.texts
+    
+    if request.indices is not None:
+        invalid = [i for i in request.indices if not 0 <= i < len(texts)]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"indices 超出范围: {invalid}")
+        items = [(i, texts[i]) for i in dict.fromkeys(request.indices)]
+    else:
+        items = list(enumerate(texts))
+    
+    # 模板在开始推送前解析，流式过程中不再占用数据库会话
+    template = await PromptService.get_template("AI_DENOISING", user_id, db)
+    concurrency = _batch_concurrency(request.concurrency, len(items))
+    max_retries = request.max_retries if request.max_retries is not None else settings.polish_batch_max_retries
+    
+    async def generate() -> AsyncGenerator[str, None]:
+        total = len(items)
+        completed = 0
+        failed_indices: List[int] = []
+        logger.info(f"开始流式批量AI去味，共 {total} 个文本，并发 {concurrency}")
+        
+        yield await SSEResponse.send_event("start", {"total": total, "concurrency": concurrency})
+        if not total:
+            yield await SSEResponse.send_result({"total": 0, "succeeded": 0, "failed": 0, "failed_indices": []})
+            yield await SSEResponse.send_done()
+            return
+        
+        events = _polish_concurrently(
+            items,
+            template,
+            user_ai_service,
+            provider=request.provider,
+            model=request.model,
+            temperature=request.temperature,
+            concurrency=concurrency,
+            max_retries=max_retries,
+            idle_timeout=settings.sse_heartbeat_idle_seconds,
+        )
+        try:
+            async for event in events:
+                if event["type"] == "idle":
+                    # 长文本单次调用可能持续数十秒，空闲时发送心跳避免代理超时断开
+                    yield await SSEResponse.send_heartbeat()
+                    continue
+                if event["type"] == "retry":
+                    yield await SSEResponse.send_event("retry", event)
+                    continue
+                completed += 1
+                if event["status"] == "failed":
+                    failed_indices.append(event["index"])
+                yield await SSEResponse.send_event("item", event)
+                yield await SSEResponse.send_progress(
+                    f"已完成 {completed}/{total} 个文本", int(completed / total * 100)
+                )
+        finally:
+            # 客户端断开时生成器被关闭，取消未完成的文本
+            await events.aclose()
+        
+        failed_indices.sort()
+        logger.info(f"流式批量AI去味完成，成功 {total - len(failed_indices)} 个，失败 {len(failed_indices)} 个")
+        yield await SSEResponse.send_result({
+            "total": total,
+            "succeeded": total - len(failed_indices),
+            "failed": len(failed_indices),
+            "failed_indices": failed_indices,
+        })
+        yield await SSEResponse.send_done()
+    
+    return create_sse_response(generate())
@@ -21,6 +21,8 @@ from app.schemas.prompt_template import (
     PromptTemplatePreviewRequest
 )
 from app.services.prompt_service import PromptService
+# 导入即注册Session事件：本模块各接口提交模板修改后自动失效对应用户的模板缓存
+from app.services.prompt_template_cache import prompt_template_cache  # noqa: F401
 from app.logger import get_logger
 
 logger = get_logger(__name__)
@@ -97,10 +97,21 @@ async def get_user_ai_service(
     自动传递 user_id 和 db_session，使得 AIService 能够加载用户配置的MCP工具。
     根据用户的所有MCP插件状态决定是否启用MCP：如果有启用的插件则启用，否则禁用。
     """
+    return await build_user_ai_service(user.user_id, db)
+
+
+async def build_user_ai_service(user_id: str, db: AsyncSession) -> AIService:
+    """
+    根据用户ID创建AI服务实例（不依赖请求上下文，后台作业也可使用）
+    
+    Args:
+        user_id: 用户ID
+        db: 数据库会话（AIService 加载MCP工具时会使用，需在服务使用期间保持打开）
+    """
     from app.models.mcp_plugin import MCPPlugin
     
     result = await db.execute(
-        select(Settings).where(Settings.user_id == user.user_id)
+        select(Settings).where(Settings.user_id == user_id)
     )
     settings = result.scalar_one_or_none()
     
@@ -108,17 +119,17 @@ async def get_user_ai_service(
         # 如果用户没有设置，从.env读取并保存
         env_defaults = read_env_defaults()
         settings = Settings(
-            user_id=user.user_id,
+            user_id=user_id,
             **env_defaults
         )
         db.add(settings)
         await db.commit()
         await db.refresh(settings)
-        logger.info(f"用户 {user.user_id} 首次使用AI服务，已从.env同步设置到数据库")
+        logger.info(f"用户 {user_id} 首次使用AI服务，已从.env同步设置到数据库")
     
     # 查询用户的所有MCP插件状态
     mcp_result = await db.execute(
-        select(MCPPlugin).where(MCPPlugin.user_id == user.user_id)
+        select(MCPPlugin).where(MCPPlugin.user_id == user_id)
     )
     mcp_plugins = mcp_result.scalars().all()
     
@@ -127,9 +138,9 @@ async def get_user_ai_service(
     
     if mcp_plugins:
         enabled_count = sum(1 for p in mcp_plugins if p.enabled)
-        logger.info(f"用户 {user.user_id} 有 {len(mcp_plugins)} 个MCP插件，{enabled_count} 个启用，{enable_mcp} 决定使用MCP")
+        logger.info(f"用户 {user_id} 有 {len(mcp_plugins)} 个MCP插件，{enabled_count} 个启用，{enable_mcp} 决定使用MCP")
     else:
-        logger.debug(f"用户 {user.user_id} 没有配置MCP插件，禁用MCP")
+        logger.debug(f"用户 {user_id} 没有配置MCP插件，禁用MCP")
     
     # ✅ 使用支持MCP的工厂函数创建AI服务实例
     # 传递 user_id 和 db_session，使得 AIService 能够自动加载用户配置的MCP工具
@@ -140,7 +151,7 @@ async def get_user_ai_service(
         model_name=settings.llm_model,
         temperature=settings.temperature,
         max_tokens=settings.max_tokens,
-        user_id=user.user_id,          # ✅ 传递 user_id
+        user_id=user_id,               # ✅ 传递 user_id
         db_session=db,                 # ✅ 传递 db_session
         system_prompt=settings.system_prompt,
         enable_mcp=enable_mcp,         # 根据MCP插件状态动态决定
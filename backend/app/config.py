@@ -65,6 +65,8 @@ class Settings(BaseSettings):
     database_enable_slow_query_log: bool = True  # 启用慢查询日志
     database_slow_query_threshold: float = 1.0  # 慢查询阈值（秒）
     database_enable_metrics: bool = True  # 启用性能指标收集
+    database_metrics_max_fingerprints: int = 500  # SQL指纹统计最多保留的语句种类数（LRU淘汰）
+    database_request_query_warn_threshold: int = 100  # 单个请求执行的SQL条数超过该值时告警（排查N+1查询）
     
     # AI服务配置
     openai_api_key: Optional[str] = None
@@ -90,6 +92,63 @@ class Settings(BaseSettings):
     # MCP配置
     mcp_max_rounds: int = 3  # MCP工具调用最大轮数（全局统一控制）
     
+    # Embedding执行器配置（长期记忆系统）
+    embedding_batch_size: int = 32  # 单个微批次最多合并的文本数
+    embedding_batch_wait_ms: float = 10.0  # 合并并发请求的最长等待时间（毫秒）
+    embedding_executor_workers: int = 1  # 编码线程数
+    embedding_cache_enabled: bool = True  # 启用向量缓存（相同文本只编码一次）
+    embedding_cache_memory_size: int = 5000  # 内存LRU缓存条目数
+    embedding_cache_path: str = str(DATA_DIR / "embedding_cache.db")  # 磁盘缓存文件
+    
+    # 流式生成配置（断线续传）
+    sse_journal_max_frames: int = 4096  # 每个生成任务在内存中保留的SSE消息数
+    sse_journal_retention_seconds: int = 300  # 生成结束后日志保留时间（秒），供迟到的重连使用
+    generation_checkpoint_interval: float = 5.0  # 生成中正文写入数据库检查点的间隔（秒）
+    sse_coalesce_enabled: bool = True  # 合并上游逐Token内容块后再发送
+    sse_coalesce_ms: float = 50.0  # 内容块最长缓冲时间（毫秒）
+    sse_coalesce_chars: int = 256  # 内容块缓冲达到该字符数时立即发送
+    sse_progress_interval_ms: float = 1000.0  # 进度值未变化时进度消息的最小间隔（毫秒）
+    sse_heartbeat_idle_seconds: float = 15.0  # 连接空闲超过该时间才发送心跳（秒）
+    
+    # 后台作业执行器配置（批量生成、章节分析）
+    job_runner_enabled: bool = True  # API进程内是否运行作业执行器（关闭后需单独运行 python -m app.worker）
+    job_runner_concurrency: int = 8  # 单个执行器同时执行的作业数
+    job_lease_seconds: int = 60  # 作业租约时长（秒），执行期间每1/3租约时长心跳续约一次
+    job_poll_interval: float = 2.0  # 空闲时轮询作业队列的间隔（秒）
+    job_max_attempts: int = 3  # 作业最大执行次数（含崩溃后重新认领）
+    batch_analysis_lookahead: int = 0  # 批量生成流水线前瞻深度：启用分析时最多几章的分析与后续生成并发（0为串行）
+    
+    # 批量AI去味配置
+    polish_batch_concurrency: int = 4  # 单个批量请求同时处理的文本数（另受提供商限流器约束）
+    polish_batch_max_concurrency: int = 16  # 请求可指定的最大并发数
+    polish_batch_max_retries: int = 2  # 单个文本失败后的最大重试次数
+    polish_batch_retry_backoff: float = 1.0  # 重试退避基数（秒），第n次重试等待 base * 2^(n-1)
+    
+    # 批量展开大纲配置
+    outline_expand_concurrency: int = 3  # 批量展开时同时分析的大纲数（1为串行），另受提供商限流器约束
+    outline_expand_max_concurrency: int = 8  # 请求可指定的最大并发数
+    
+    # 章节剧情分析配置
+    plot_analysis_segment_chars: int = 8000  # 超过该字数的章节分段分析后合并（每段最大字数）
+    plot_analysis_segment_overlap: int = 800  # 相邻片段的重叠字数，避免切分点附近的情节不完整
+    plot_analysis_segment_concurrency: int = 3  # 同一章节同时分析的片段数，另受提供商限流器约束
+    
+    # 任务事件总线配置（进度推送与即时取消）
+    task_event_backend: str = "memory"  # memory=进程内 / postgres=LISTEN/NOTIFY跨进程转发（独立worker时使用）
+    task_event_heartbeat_seconds: float = 15.0  # 任务事件订阅空闲时的心跳间隔（秒）
+    
+    # 章节上下文缓存配置
+    context_cache_ttl_seconds: float = 30.0  # 上下文分段缓存有效期（秒），其他进程（worker/多副本）的写入最多延迟该时间生效，0为不缓存
+    context_cache_max_entries: int = 2048  # 缓存的最大分段数（LRU淘汰）
+    
+    # 提示词模板缓存配置
+    prompt_template_cache_ttl_seconds: float = 300.0  # 用户自定义模板缓存有效期（秒），多进程部署时其他进程的修改最多延迟该时间生效
+    prompt_template_cache_max_users: int = 512  # 缓存的最大用户数（LRU淘汰）
+    
+    # 用户身份缓存配置（认证中间件）
+    user_cache_ttl_seconds: float = 30.0  # 用户信息缓存有效期（秒），多进程部署时其他进程的修改最多延迟该时间生效
+    user_cache_max_entries: int = 10000  # 缓存的最大用户数（LRU淘汰）
+    
     # LinuxDO OAuth2 配置
     LINUXDO_CLIENT_ID: Optional[str] = None
     LINUXDO_CLIENT_SECRET: Optional[str] = None
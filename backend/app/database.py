@@ -7,6 +7,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 from sqlalchemy.orm import declarative_base
 from fastapi import Request, HTTPException
 from app.config import settings
+from app.db_metrics import db_metrics, InstrumentedQueuePool, InstrumentedSession
 from app.logger import get_logger
 
 logger = get_logger(__name__)
@@ -21,12 +22,15 @@ from app.models import (
     Settings, WritingStyle, ProjectDefaultStyle,
     RelationshipType, CharacterRelationship, Organization, OrganizationMember,
     StoryMemory, PlotAnalysis, AnalysisTask, BatchGenerationTask,
-    RegenerationTask, Career, CharacterCareer, User, MCPPlugin, PromptTemplate
+    RegenerationTask, Career, CharacterCareer, User, MCPPlugin, PromptTemplate, Job
 )
 
 # 引擎缓存：每个用户一个引擎
 _engine_cache: Dict[str, Any] = {}
 
+# 会话工厂缓存：每个引擎一个工厂，避免每次创建会话都重新构建 async_sessionmaker
+_session_factories: Dict[str, async_sessionmaker] = {}
+
 # 锁管理：用于保护引擎创建过程
 _engine_locks: Dict[str, asyncio.Lock] = {}
 _cache_lock = asyncio.Lock()
@@ -68,6 +72,8 @@ async def get_engine(user_id: str):
                 "echo": settings.database_echo_pool,
                 "echo_pool": settings.database_echo_pool,
                 "future": True,
+                # 记录连接获取耗时（见 app.db_metrics）
+                "poolclass": InstrumentedQueuePool,
             }
             
             if is_sqlite:
@@ -118,6 +124,7 @@ async def get_engine(user_id: str):
                 )
             
             engine = create_async_engine(settings.database_url, **engine_args)
+            db_metrics.instrument_engine(engine)
             _engine_cache[cache_key] = engine
             
             # 如果是 SQLite，启用 WAL 模式以支持读写并发
@@ -142,6 +149,49 @@ async def get_engine(user_id: str):
         return _engine_cache[cache_key]
 
 
+async def get_session_factory(user_id: str) -> async_sessionmaker:
+    """获取引擎对应的会话工厂（按引擎缓存）
+    
+    所有会话都应通过此工厂创建，会话生命周期会计入 /health/db-sessions 的统计。
+    
+    Args:
+        user_id: 用户ID
+        
+    Returns:
+        会话工厂，调用后返回新的 AsyncSession
+    """
+    cache_key = "shared_postgres"
+    factory = _session_factories.get(cache_key)
+    if factory is None:
+        engine = await get_engine(user_id)
+        factory = async_sessionmaker(
+            engine,
+            class_=InstrumentedSession,
+            expire_on_commit=False
+        )
+        _session_factories[cache_key] = factory
+    return factory
+
+
+def get_pool_status() -> Dict[str, Any]:
+    """获取共享引擎连接池的实时状态（引擎未创建时返回空字典）"""
+    engine = _engine_cache.get("shared_postgres")
+    if engine is None:
+        return {}
+    pool = engine.pool
+    if not hasattr(pool, "size"):
+        return {"class": type(pool).__name__}
+    capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+    return {
+        "class": type(pool).__name__,
+        "size": pool.size(),  # 当前连接池大小
+        "checked_in": pool.checkedin(),  # 可用连接数
+        "checked_out": pool.checkedout(),  # 正在使用的连接数
+        "overflow": pool.overflow(),  # 溢出连接数
+        "usage_percent": (pool.checkedout() / capacity) * 100 if capacity else 0.0,
+    }
+
+
 async def get_db(request: Request):
     """获取数据库会话的依赖函数
     
@@ -152,15 +202,8 @@ async def get_db(request: Request):
     if not user_id:
         raise HTTPException(status_code=401, detail="未登录或用户ID缺失")
     
-    engine = await get_engine(user_id)
-    
-    AsyncSessionLocal = async_sessionmaker(
-        engine,
-        class_=AsyncSession,
-        expire_on_commit=False
-    )
-    
-    session = AsyncSessionLocal()
+    session_factory = await get_session_factory(user_id)
+    session = session_factory()
     session_id = id(session)
     
     global _session_stats
@@ -252,6 +295,7 @@ async def close_db():
             await engine.dispose()
             logger.info(f"用户 {user_id} 的数据库连接已关闭")
         _engine_cache.clear()
+        _session_factories.clear()
         logger.info("所有数据库连接已关闭")
     except Exception as e:
         logger.error(f"关闭数据库连接失败: {str(e)}", exc_info=True)
@@ -266,22 +310,11 @@ async def get_database_stats():
     from app.config import settings
     
     # 获取连接池详细状态
-    pool_stats = {}
-    cache_key = "shared_postgres"
-    if cache_key in _engine_cache:
-        engine = _engine_cache[cache_key]
-        try:
-            pool = engine.pool
-            pool_stats = {
-                "size": pool.size(),  # 当前连接池大小
-                "checked_in": pool.checkedin(),  # 可用连接数
-                "checked_out": pool.checkedout(),  # 正在使用的连接数
-                "overflow": pool.overflow(),  # 溢出连接数
-                "usage_percent": (pool.checkedout() / (settings.database_pool_size + settings.database_max_overflow)) * 100,
-            }
-        except Exception as e:
-            logger.warning(f"获取连接池状态失败: {e}")
-            pool_stats = {"error": str(e)}
+    try:
+        pool_stats = get_pool_status()
+    except Exception as e:
+        logger.warning(f"获取连接池状态失败: {e}")
+        pool_stats = {"error": str(e)}
     
     stats = {
         "session_stats": {
@@ -293,6 +326,7 @@ async def get_database_stats():
             "last_check": _session_stats["last_check"],
         },
         "pool_stats": pool_stats,  # 新增：连接池实时状态
+        "metrics": db_metrics.get_stats(),  # 会话生命周期、连接获取等待、连接占用分布
         "engine_cache": {
             "total_engines": len(_engine_cache),
             "engine_keys": list(_engine_cache.keys()),
@@ -378,13 +412,9 @@ async def check_database_health(user_id: str = None) -> dict:
             engine = _engine_cache[cache_key]
         
         # 测试数据库连接
-        AsyncSessionLocal = async_sessionmaker(
-            engine,
-            class_=AsyncSession,
-            expire_on_commit=False
-        )
+        session_factory = await get_session_factory(user_id or "_health_check_")
         
-        async with AsyncSessionLocal() as session:
+        async with session_factory() as session:
             # 执行简单查询测试连接
             await session.execute(text("SELECT 1"))
             result["checks"]["connection"] = {"status": "ok", "healthy": True}
@@ -430,5 +460,6 @@ async def reset_session_stats():
         "generator_exits": 0,
         "last_check": datetime.now().isoformat()
     }
+    db_metrics.reset()
     logger.info("✅ 会话统计信息已重置")
     return _session_stats
\ No newline at end of file
@@ -0,0 +1,404 @@
+"""数据库会话与连接池指标
+
+由 app.database 在创建引擎和会话工厂时接入：
+- 会话生命周期：会话工厂创建的每个会话从创建到关闭的耗时分布，以及当前未关闭的会话数与最老会话年龄
+- 连接获取等待：从连接池取连接的耗时分布（池满时的排队等待、新建连接、连接前ping都计入）
+- 连接占用：当前借出的连接数、峰值，以及每次借出到归还的占用时长分布
+- SQL语句：每条语句计时，超过阈值的写入慢查询日志（规范化SQL，日志自动带请求ID）；
+  按语句指纹（字面量、参数占位符、IN列表规范化后的SQL）统计次数与耗时分位数
+- 请求查询数：每个请求执行的SQL条数与耗时，按路由汇总，超过阈值告警，用于发现N+1查询
+
+所有统计都在进程内，会话与连接池指标通过 /health/db-sessions 查看，SQL指标通过 /health/sql 查看。
+"""
+import hashlib
+import re
+import time
+import weakref
+from bisect import bisect_left
+from collections import OrderedDict
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import settings
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 默认分桶上界（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+# SQL语句耗时分桶上界（秒）
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_CHECKOUT_START_KEY = "db_metrics_checkout_started"
+_STATEMENT_START_ATTR = "_db_metrics_started"
+
+# ==================== SQL规范化 ====================
+
+_SQL_NORMALIZERS = (
+    (re.compile(r"--[^\n]*"), " "),                           # 行注释
+    (re.compile(r"'(?:[^']|'')*'"), "?"),                       # 字符串字面量
+    (re.compile(r"\$\d+|(?<!:):(?!:)[A-Za-z_]\w*|%\(\w+\)s|%s"), "?"),  # 各驱动的参数占位符（跳过 :: 类型转换）
+    (re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])"), "?"),       # 数字字面量
+    (re.compile(r"\s+"), " "),                                  # 空白
+    (re.compile(r"\bIN \((?:\?(?:, )?)+\)", re.IGNORECASE), "IN (...)"),           # IN 列表
+    (re.compile(r"\bVALUES (\((?:\?(?:, )?)+\))(?:, \(.*?\))+", re.IGNORECASE), r"VALUES \1, ..."),  # 多行 VALUES
+)
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(statement: str) -> str:
+    """规范化SQL：去掉字面量与参数差异，使同一类语句得到相同文本"""
+    for pattern, replacement in _SQL_NORMALIZERS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def sql_fingerprint(normalized: str) -> str:
+    return hashlib.md5(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+class RequestQueryStats:
+    """单个请求内执行的SQL统计"""
+
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# 当前请求的SQL统计（由 QueryStatsMiddleware 设置）
+request_query_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+class Histogram:
+    """固定分桶的耗时直方图"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds: List[float] = sorted(buckets)
+        self.reset()
+
+    def reset(self):
+        # 最后一个桶收集超过最大上界的值
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按分桶上界估算分位数（落在最后一个桶时返回最大值）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"<={bound:g}s" for bound in self.bounds] + [f">{self.bounds[-1]:g}s"]
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 6) if self.count else None,
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+class DatabaseMetrics:
+    """数据库会话与连接池指标"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        slow_query_log: bool = True,
+        slow_query_threshold: float = 1.0,
+        max_fingerprints: int = 500,
+        request_query_warn_threshold: int = 100,
+    ):
+        self.enabled = enabled
+        self.slow_query_log = slow_query_log
+        self.slow_query_threshold = slow_query_threshold
+        self.max_fingerprints = max_fingerprints
+        self.request_query_warn_threshold = request_query_warn_threshold
+        # 语句指纹 -> 统计
+        self._statements: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # 路由 -> 请求查询数统计
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+        self._sql_counters = {"executed": 0, "slow": 0, "failed": 0}
+        self.session_lifetime = Histogram()
+        self.checkout_wait = Histogram()
+        self.connection_hold = Histogram()
+        # 未关闭的会话（弱引用：会话被回收后自动移除） -> 创建时间
+        self._open_sessions: "weakref.WeakKeyDictionary[AsyncSession, float]" = weakref.WeakKeyDictionary()
+        self._counters = {
+            "sessions_opened": 0,
+            "sessions_closed": 0,
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+        }
+        self.checked_out = 0
+        self.peak_checked_out = 0
+
+    # ==================== 会话 ====================
+
+    def session_opened(self, session: AsyncSession):
+        if not self.enabled:
+            return
+        self._counters["sessions_opened"] += 1
+        self._open_sessions[session] = time.perf_counter()
+
+    def session_closed(self, session: AsyncSession):
+        opened_at = self._open_sessions.pop(session, None)
+        if opened_at is None:
+            return
+        self._counters["sessions_closed"] += 1
+        self.session_lifetime.observe(time.perf_counter() - opened_at)
+
+    # ==================== 连接池 ====================
+
+    def observe_checkout_wait(self, seconds: float, timed_out: bool = False):
+        if not self.enabled:
+            return
+        self.checkout_wait.observe(seconds)
+        if timed_out:
+            self._counters["checkout_timeouts"] += 1
+
+    def instrument_engine(self, engine: AsyncEngine):
+        """监听连接借出/归还与语句执行"""
+        if self.enabled or self.slow_query_log:
+            self._instrument_statements(engine)
+        if not self.enabled:
+            return
+
+        @event.listens_for(engine.sync_engine, "checkout")
+        def _on_checkout(dbapi_conn, connection_record, connection_proxy):
+            self._counters["checkouts"] += 1
+            self.checked_out += 1
+            if self.checked_out > self.peak_checked_out:
+                self.peak_checked_out = self.checked_out
+            connection_record.info[_CHECKOUT_START_KEY] = time.perf_counter()
+
+        @event.listens_for(engine.sync_engine, "checkin")
+        def _on_checkin(dbapi_conn, connection_record):
+            started = connection_record.info.pop(_CHECKOUT_START_KEY, None)
+            if started is None:
+                return
+            self.checked_out -= 1
+            self.connection_hold.observe(time.perf_counter() - started)
+
+    # ==================== SQL语句 ====================
+
+    def _instrument_statements(self, engine: AsyncEngine):
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def _before_execute(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                setattr(context, _STATEMENT_START_ATTR, time.perf_counter())
+
+        @event.listens_for(engine.sync_engine, "after_cursor_execute")
+        def _after_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, _STATEMENT_START_ATTR, None)
+            if started is not None:
+                self.observe_statement(statement, time.perf_counter() - started)
+
+        @event.listens_for(engine.sync_engine, "handle_error")
+        def _on_error(exception_context):
+            context = exception_context.execution_context
+            started = getattr(context, _STATEMENT_START_ATTR, None)
+            if started is not None and exception_context.statement:
+                self.observe_statement(exception_context.statement, time.perf_counter() - started, failed=True)
+
+    def observe_statement(self, statement: str, seconds: float, failed: bool = False):
+        """记录一条SQL的执行耗时"""
+        self._sql_counters["executed"] += 1
+        if failed:
+            self._sql_counters["failed"] += 1
+
+        current = request_query_stats.get()
+        if current is not None:
+            current.queries += 1
+            current.seconds += seconds
+
+        slow = seconds >= self.slow_query_threshold
+        if not (self.enabled or (slow and self.slow_query_log)):
+            return
+        normalized = normalize_sql(statement)
+        fingerprint = sql_fingerprint(normalized)
+
+        if slow:
+            self._sql_counters["slow"] += 1
+            if self.slow_query_log:
+                logger.warning(f"🐢 慢查询 {seconds:.3f}s [{fingerprint}]{' (失败)' if failed else ''}: {normalized[:1000]}")
+
+        if not self.enabled:
+            return
+        stats = self._statements.get(fingerprint)
+        if stats is None:
+            stats = {"sql": normalized[:2000], "histogram": Histogram(SQL_BUCKETS), "slow": 0, "failed": 0}
+            self._statements[fingerprint] = stats
+            while len(self._statements) > self.max_fingerprints:
+                self._statements.popitem(last=False)
+        else:
+            self._statements.move_to_end(fingerprint)
+        stats["histogram"].observe(seconds)
+        if slow:
+            stats["slow"] += 1
+        if failed:
+            stats["failed"] += 1
+
+    def statement_stats(self, limit: int = 20, sort: str = "total") -> List[Dict[str, Any]]:
+        """按指纹汇总的SQL统计（sort: total/count/avg/max/p95）"""
+        rows = []
+        for fingerprint, stats in self._statements.items():
+            histogram: Histogram = stats["histogram"]
+            rows.append({
+                "fingerprint": fingerprint,
+                "sql": stats["sql"],
+                "total_seconds": round(histogram.total, 6),
+                "slow": stats["slow"],
+                "failed": stats["failed"],
+                **{k: v for k, v in histogram.snapshot().items() if k != "buckets"},
+            })
+        sort_key = {"total": "total_seconds"}.get(sort, sort)
+        rows.sort(key=lambda row: row.get(sort_key) or 0, reverse=True)
+        return rows[:limit]
+
+    # ==================== 请求查询数 ====================
+
+    def begin_request(self):
+        """开始统计当前请求的SQL（返回用于 end_request 的令牌）"""
+        return request_query_stats.set(RequestQueryStats())
+
+    def end_request(self, token, endpoint: str) -> RequestQueryStats:
+        """结束当前请求的SQL统计并按路由汇总"""
+        current = request_query_stats.get()
+        request_query_stats.reset(token)
+        endpoint_stats = self._endpoints.get(endpoint)
+        if endpoint_stats is None:
+            endpoint_stats = {"requests": 0, "queries": 0, "max_queries": 0, "db_seconds": 0.0, "over_threshold": 0}
+            self._endpoints[endpoint] = endpoint_stats
+        endpoint_stats["requests"] += 1
+        endpoint_stats["queries"] += current.queries
+        endpoint_stats["db_seconds"] += current.seconds
+        if current.queries > endpoint_stats["max_queries"]:
+            endpoint_stats["max_queries"] = current.queries
+        if current.queries > self.request_query_warn_threshold:
+            endpoint_stats["over_threshold"] += 1
+            logger.warning(
+                f"⚠️ 请求执行了 {current.queries} 条SQL（阈值 {self.request_query_warn_threshold}），"
+                f"疑似N+1查询: {endpoint}，数据库耗时 {current.seconds:.3f}s"
+            )
+        return current
+
+    def endpoint_stats(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """按路由汇总的请求查询数（按平均查询数降序）"""
+        rows = [
+            {
+                "endpoint": endpoint,
+                "requests": stats["requests"],
+                "avg_queries": round(stats["queries"] / stats["requests"], 2),
+                "max_queries": stats["max_queries"],
+                "avg_db_seconds": round(stats["db_seconds"] / stats["requests"], 6),
+                "over_threshold": stats["over_threshold"],
+            }
+            for endpoint, stats in self._endpoints.items()
+            if stats["requests"]
+        ]
+        rows.sort(key=lambda row: row["avg_queries"], reverse=True)
+        return rows[:limit]
+
+    def get_sql_stats(self, limit: int = 20, sort: str = "total") -> Dict[str, Any]:
+        """获取SQL指标"""
+        return {
+            "enabled": self.enabled,
+            "slow_query_log": self.slow_query_log,
+            "slow_query_threshold": self.slow_query_threshold,
+            **self._sql_counters,
+            "fingerprints": len(self._statements),
+            "statements": self.statement_stats(limit, sort),
+            "endpoints": self.endpoint_stats(limit),
+        }
+
+    # ==================== 统计 ====================
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.perf_counter()
+        open_ages = list(self._open_sessions.values())
+        return {
+            "enabled": self.enabled,
+            **self._counters,
+            "open_sessions": len(open_ages),
+            "oldest_open_session_seconds": round(now - min(open_ages), 3) if open_ages else None,
+            "session_lifetime": self.session_lifetime.snapshot(),
+            "checkout_wait": self.checkout_wait.snapshot(),
+            "checked_out": self.checked_out,
+            "peak_checked_out": self.peak_checked_out,
+            "connection_hold": self.connection_hold.snapshot(),
+        }
+
+    def reset(self):
+        """重置累计统计（当前借出数与未关闭会话保持不变）"""
+        for histogram in (self.session_lifetime, self.checkout_wait, self.connection_hold):
+            histogram.reset()
+        for key in self._counters:
+            self._counters[key] = 0
+        self.peak_checked_out = self.checked_out
+        for key in self._sql_counters:
+            self._sql_counters[key] = 0
+        self._statements.clear()
+        self._endpoints.clear()
+
+
+# 全局实例
+db_metrics = DatabaseMetrics(
+    enabled=settings.database_enable_metrics,
+    slow_query_log=settings.database_enable_slow_query_log,
+    slow_query_threshold=settings.database_slow_query_threshold,
+    max_fingerprints=settings.database_metrics_max_fingerprints,
+    request_query_warn_threshold=settings.database_request_query_warn_threshold,
+)
+
+
+class InstrumentedSession(AsyncSession):
+    """记录生命周期的异步会话（会话工厂统一使用）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        db_metrics.session_opened(self)
+
+    async def close(self) -> None:
+        try:
+            await super().close()
+        finally:
+            db_metrics.session_closed(self)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """记录连接获取耗时的连接池（含池满排队、新建连接与连接前ping检测）"""
+
+    def connect(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            db_metrics.observe_checkout_wait(time.perf_counter() - started, timed_out)
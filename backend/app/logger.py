@@ -1,11 +1,39 @@
 """统一日志配置模块 - Uvicorn风格"""
 import logging
 import sys
+from contextvars import ContextVar
 from pathlib import Path
 from logging.handlers import RotatingFileHandler
 from typing import Optional
 
 
+# 当前请求的追踪ID（由 RequestIDMiddleware 设置，随协程上下文传播）
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def get_request_id() -> Optional[str]:
+    """获取当前上下文的请求追踪ID（不在请求中时返回None）"""
+    return request_id_var.get()
+
+
+class RequestIDFilter(logging.Filter):
+    """日志过滤器，从当前上下文读取request_id并添加到日志记录"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        为日志记录添加request_id属性
+        
+        Args:
+            record: 日志记录
+            
+        Returns:
+            True（不过滤任何日志）
+        """
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_var.get()
+        return True
+
+
 class UvicornFormatter(logging.Formatter):
     """Uvicorn风格的日志格式化器"""
     
@@ -87,6 +115,9 @@ def setup_logging(
     console_handler.setLevel(getattr(logging, level.upper()))
     console_formatter = UvicornFormatter(use_colors=True)
     console_handler.setFormatter(console_formatter)
+    # 过滤器挂在处理器上：子日志器传播上来的记录同样会经过处理器过滤器
+    request_id_filter = RequestIDFilter()
+    console_handler.addFilter(request_id_filter)
     root_logger.addHandler(console_handler)
     
     # 2. 创建文件处理器（如果启用）
@@ -107,6 +138,7 @@ def setup_logging(
         # 文件日志不使用颜色
         file_formatter = UvicornFormatter(use_colors=False)
         file_handler.setFormatter(file_formatter)
+        file_handler.addFilter(request_id_filter)
         root_logger.addHandler(file_handler)
         
         # 记录日志配置信息
@@ -127,6 +159,8 @@ def _configure_third_party_loggers():
     # SQLAlchemy - 禁用SQL日志
     logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
     logging.getLogger('sqlalchemy.pool').setLevel(logging.WARNING)
+    # 自定义连接池类的日志器以其模块命名（见 app.db_metrics）
+    logging.getLogger('app.db_metrics.InstrumentedQueuePool').setLevel(logging.WARNING)
     logging.getLogger('sqlalchemy.dialects').setLevel(logging.WARNING)
     logging.getLogger('sqlalchemy.orm').setLevel(logging.WARNING)
     
@@ -12,6 +12,7 @@ from app.database import close_db, _session_stats
 from app.logger import setup_logging, get_logger
 from app.middleware import RequestIDMiddleware
 from app.middleware.auth_middleware import AuthMiddleware
+from app.middleware.query_stats import QueryStatsMiddleware
 from app.mcp import mcp_client, register_status_sync
 
 setup_logging(
@@ -30,17 +31,35 @@ async def lifespan(app: FastAPI):
     # 注册MCP状态同步服务
     register_status_sync()
     
+    # 启动任务事件总线（postgres后端时建立LISTEN连接）
+    from app.services.task_events import task_event_bus
+    await task_event_bus.start()
+    
+    # 启动持久化作业执行器（也可通过 python -m app.worker 单独部署）
+    from app.services.job_runner import job_runner
+    import app.api.chapters  # noqa: F401  注册作业处理函数
+    if config_settings.job_runner_enabled:
+        await job_runner.start()
+    
     logger.info("应用启动完成")
     
     yield
     
+    # 停止作业执行器（执行中的作业释放租约，由其他执行器接管）
+    await job_runner.stop()
+    await task_event_bus.stop()
+    
     # 清理MCP插件
     await mcp_client.cleanup()
     
     # 清理HTTP客户端池
     from app.services.ai_service import cleanup_http_clients
     await cleanup_http_clients()
-    
+
+    # 关闭Embedding执行器线程池
+    from app.services.memory_service import memory_service
+    memory_service.embedder.shutdown()
+
     # 关闭数据库连接
     await close_db()
     
@@ -78,8 +97,11 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
-app.add_middleware(RequestIDMiddleware)
+# 后添加的中间件在外层：RequestID 在最外层，认证等后续环节的日志也能带上请求ID；
+# SQL统计包在认证外层，认证查询用户表也计入请求查询数
 app.add_middleware(AuthMiddleware)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(RequestIDMiddleware)
 
 if config_settings.debug:
     app.add_middleware(
@@ -117,14 +139,85 @@ async def db_session_stats():
     - errors: 错误次数
     - generator_exits: SSE断开次数
     - last_check: 最后检查时间
+    - pool: 连接池实时状态（池大小、借出/空闲连接数、溢出数、使用率）
+    - metrics: 所有会话的生命周期分布、当前未关闭会话数与最老会话年龄、
+      连接获取等待分布、借出连接数与峰值、连接占用时长分布
+    - write_coordinator: 写入协调（模式、写入次数、累计等待时间、排队数）
+    - user_cache: 认证身份缓存（命中/未命中次数、命中率、条目数）
     """
+    from app.database import get_pool_status
+    from app.db_metrics import db_metrics
+    from app.services.write_coordinator import write_coordinator
+    from app.user_manager import user_manager
     return {
         "status": "ok",
         "session_stats": _session_stats,
+        "pool": get_pool_status(),
+        "metrics": db_metrics.get_stats(),
+        "write_coordinator": write_coordinator.get_stats(),
+        "user_cache": user_manager.get_cache_stats(),
         "warning": "活跃会话数过多" if _session_stats["active"] > 10 else None
     }
 
 
+@app.get("/health/sql")
+async def sql_stats(limit: int = 20, sort: str = "total"):
+    """
+    SQL执行统计
+    
+    参数：
+    - limit: 返回的语句/路由条数
+    - sort: 语句排序字段 total（累计耗时）/count/avg/max/p95
+    
+    返回：
+    - executed/slow/failed: 本进程执行的SQL总数、慢查询数、失败数
+    - statements: 按语句指纹汇总的次数、平均/最大耗时、分位数
+    - endpoints: 按路由汇总的平均/最大查询数（平均查询数高的路由可能存在N+1查询）
+    """
+    from app.db_metrics import db_metrics
+    return {
+        "status": "ok",
+        **db_metrics.get_sql_stats(limit=max(1, min(limit, 200)), sort=sort),
+    }
+
+
+@app.get("/health/jobs")
+async def job_runner_stats():
+    """
+    作业执行器统计
+
+    返回：
+    - claimed/completed/failed/retried: 本进程认领、完成、失败、重试的作业数
+    - lease_lost: 租约被其他执行器接管的次数
+    - events: 任务事件总线（后端类型、发布/投递数、订阅连接数）
+    """
+    from app.services.job_runner import job_runner
+    from app.services.task_events import task_event_bus
+    return {
+        "status": "ok",
+        "runner": job_runner.get_stats(),
+        "events": task_event_bus.get_stats()
+    }
+
+
+@app.get("/health/ai-clients")
+async def ai_client_stats():
+    """
+    AI客户端连接池与限流器统计
+
+    返回：
+    - http_pool: 每个上游的共享HTTP客户端（请求数、错误数、连接数/空闲连接数）
+    - limiters: 每个上游的限流器（当前并发上限、进行中/排队请求数）
+    """
+    from app.services.ai_clients.base_client import get_http_pool_stats
+    from app.services.ai_clients.rate_limiter import get_limiter_stats
+    return {
+        "status": "ok",
+        "http_pool": get_http_pool_stats(),
+        "limiters": get_limiter_stats(),
+    }
+
+
 from app.api import (
     projects, outlines, characters, chapters,
     wizard_stream, relationships, organizations,
@@ -6,7 +6,6 @@
 import asyncio
 from typing import Dict, Any
 from sqlalchemy import update
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.models.mcp_plugin import MCPPlugin
 from app.logger import get_logger
@@ -44,10 +43,9 @@ async def _do_sync_status(event: Dict[str, Any]):
     reason = event.get("reason", "")
 
     try:
-        from app.database import get_engine
+        from app.database import get_session_factory
 
-        engine = await get_engine(user_id)
-        AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        AsyncSessionLocal = await get_session_factory(user_id)
 
         async with AsyncSessionLocal() as db:
             stmt = (
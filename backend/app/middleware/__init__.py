@@ -1,4 +1,4 @@
 """中间件模块"""
-from .request_id import RequestIDMiddleware
+from .request_id import RequestIDMiddleware, get_request_id
 
-__all__ = ['RequestIDMiddleware']
\ No newline at end of file
+__all__ = ['RequestIDMiddleware', 'get_request_id']
@@ -0,0 +1,31 @@
+"""请求SQL统计中间件"""
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.db_metrics import db_metrics
+
+
+class QueryStatsMiddleware:
+    """
+    请求SQL统计中间件（纯ASGI实现）
+
+    统计每个请求执行的SQL条数与数据库耗时，请求结束后按路由模板汇总到 db_metrics，
+    超过 database_request_query_warn_threshold 时告警，用于发现N+1查询。
+    流式响应（SSE）统计整个流期间执行的SQL。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not db_metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        token = db_metrics.begin_request()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # 路由匹配后 scope 中才有 route，按路由模板汇总（避免路径参数导致维度爆炸）
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "(unmatched)"
+            db_metrics.end_request(token, f"{scope['method']} {path}")
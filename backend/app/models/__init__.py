@@ -18,6 +18,7 @@ from app.models.career import Career, CharacterCareer
 from app.models.prompt_template import PromptTemplate
 from app.models.foreshadow import Foreshadow
 from app.models.prompt_workshop import PromptWorkshopItem, PromptSubmission, PromptWorkshopLike
+from app.models.job import Job
 
 __all__ = [
     "Project",
@@ -46,5 +47,6 @@ __all__ = [
     "Foreshadow",
     "PromptWorkshopItem",
     "PromptSubmission",
-    "PromptWorkshopLike"
+    "PromptWorkshopLike",
+    "Job"
 ]
\ No newline at end of file
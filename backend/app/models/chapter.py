@@ -1,5 +1,5 @@
 """章节数据模型"""
-from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.database import Base
 import uuid
@@ -28,5 +28,13 @@ class Chapter(Base):
     created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
     
+    __table_args__ = (
+        # 项目内按章节序号过滤/排序（列表、前置章节检查、最近章节上下文、导航）；
+        # 带上章节ID，(章节序号, 章节ID) 游标分页可直接按索引顺序读取，无需额外排序
+        Index('idx_chapters_project_number_id', 'project_id', 'chapter_number', 'id'),
+        # 大纲下的子章节（一对多展开）
+        Index('idx_chapters_outline_sub', 'outline_id', 'sub_index'),
+    )
+    
     def __repr__(self):
         return f"<Chapter(id={self.id}, chapter_number={self.chapter_number}, title={self.title}, outline_id={self.outline_id})>"
\ No newline at end of file
@@ -1,5 +1,5 @@
 """伏笔管理数据模型 - 独立管理小说伏笔的埋入和回收"""
-from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, Float, JSON, Boolean
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, Float, JSON, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -85,6 +85,13 @@ class Foreshadow(Base):
     planted_at = Column(DateTime, comment="埋入时间")
     resolved_at = Column(DateTime, comment="回收时间")
     
+    __table_args__ = (
+        # 按状态和计划回收章节查找（待回收提醒、超期检查、本章必须回收）
+        Index('idx_foreshadows_project_status_target', 'project_id', 'status', 'target_resolve_chapter_number'),
+        # 按埋入章节查找/排序
+        Index('idx_foreshadows_project_plant', 'project_id', 'plant_chapter_number'),
+    )
+    
     def __repr__(self):
         return f"<Foreshadow(id={self.id[:8]}, title={self.title}, status={self.status})>"
     
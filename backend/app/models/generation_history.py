@@ -17,6 +17,7 @@ class GenerationHistory(Base):
     model = Column(String(50), comment="使用的模型")
     tokens_used = Column(Integer, comment="消耗的token数")
     generation_time = Column(Float, comment="生成耗时(秒)")
+    status = Column(String(20), default="completed", comment="状态：generating(生成中检查点)/completed/interrupted(生成中断)")
     created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
     
     def __repr__(self):
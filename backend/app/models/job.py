@@ -0,0 +1,47 @@
+"""后台作业模型 - 持久化作业队列（租约 + 心跳）"""
+from sqlalchemy import Column, String, Integer, Text, DateTime, JSON, Index
+from sqlalchemy.sql import func
+from app.database import Base
+import uuid
+
+
+class Job(Base):
+    """
+    后台作业表 - 由作业执行器（API进程内或独立worker进程）认领执行
+
+    状态流转: queued -> running -> completed/failed
+    running 状态的作业持有租约，执行期间定期心跳续约；
+    租约过期（进程崩溃、重启）的作业会被其他执行器重新认领。
+    """
+    __tablename__ = "jobs"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()), comment="作业ID")
+    kind = Column(String(50), nullable=False, comment="作业类型: batch_generation/chapter_analysis")
+    ref_id = Column(String(36), nullable=True, comment="关联业务任务ID（批量生成任务/分析任务）")
+    user_id = Column(String(100), nullable=False, comment="用户ID")
+    payload = Column(JSON, nullable=True, comment="作业参数")
+
+    # 执行状态
+    status = Column(String(20), nullable=False, default='queued', comment="作业状态: queued/running/completed/failed")
+    attempts = Column(Integer, nullable=False, default=0, comment="已认领次数")
+    max_attempts = Column(Integer, nullable=False, default=3, comment="最大认领次数")
+    last_error = Column(Text, nullable=True, comment="最近一次错误")
+
+    # 租约
+    lease_owner = Column(String(100), nullable=True, comment="持有租约的执行器")
+    lease_expires_at = Column(DateTime, nullable=True, comment="租约过期时间")
+    heartbeat_at = Column(DateTime, nullable=True, comment="最近心跳时间")
+    available_at = Column(DateTime, nullable=True, comment="最早可执行时间（失败重试退避）")
+
+    # 时间戳
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+    started_at = Column(DateTime, nullable=True, comment="最近一次开始执行时间")
+    completed_at = Column(DateTime, nullable=True, comment="完成时间")
+
+    __table_args__ = (
+        Index('idx_jobs_status_created', 'status', 'created_at'),
+        Index('idx_jobs_kind_ref', 'kind', 'ref_id', unique=True),
+    )
+
+    def __repr__(self):
+        return f"<Job(id={self.id[:8]}..., kind={self.kind}, status={self.status}, attempts={self.attempts})>"
@@ -1,5 +1,5 @@
 """长期记忆数据模型 - 支持向量检索和剧情分析"""
-from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, Float, JSON, Boolean
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, Float, JSON, Boolean, Index
 from sqlalchemy.sql import func
 from app.database import Base
 import uuid
@@ -55,6 +55,13 @@ class StoryMemory(Base):
     created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
     
+    __table_args__ = (
+        # 按章节读取指定类型的记忆（如上一章摘要）
+        Index('idx_memories_project_chapter_type', 'project_id', 'chapter_id', 'memory_type'),
+        # 按类型、时间线读取记忆（如最近章节摘要）
+        Index('idx_memories_project_type_timeline', 'project_id', 'memory_type', 'story_timeline'),
+    )
+    
     def __repr__(self):
         return f"<StoryMemory(id={self.id[:8]}, type={self.memory_type}, title={self.title})>"
     
@@ -67,6 +67,30 @@ class ChapterListResponse(BaseModel):
     items: list[ChapterResponse]
 
 
+class ChapterMetaResponse(BaseModel):
+    """章节元数据响应模型（列表用，不含正文和展开规划）"""
+    id: str
+    project_id: str
+    title: str
+    chapter_number: int
+    word_count: int = 0
+    status: str
+    outline_id: Optional[str] = None
+    sub_index: Optional[int] = 1
+    outline_title: Optional[str] = None
+    outline_order: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+
+
+class ChapterPageResponse(BaseModel):
+    """章节分页列表响应模型（按章节序号、章节ID游标分页）"""
+    total: int
+    items: list[ChapterMetaResponse]
+    next_cursor: Optional[str] = Field(None, description="下一页游标（章节序号:章节ID，传给after参数），没有更多数据时为空")
+    has_more: bool = False
+
+
 class ChapterGenerateRequest(BaseModel):
     """AI生成章节内容的请求模型"""
     style_id: Optional[int] = Field(None, description="写作风格ID，不提供则不使用任何风格")
@@ -96,6 +120,12 @@ class BatchGenerateRequest(BaseModel):
     enable_mcp: bool = Field(True, description="是否启用MCP工具增强（搜索参考资料）")
     max_retries: int = Field(3, description="每个章节的最大重试次数", ge=0, le=5)
     model: Optional[str] = Field(None, description="指定使用的AI模型，不提供则使用用户默认模型")
+    analysis_lookahead: Optional[int] = Field(
+        None,
+        description="流水线前瞻深度：启用分析时最多允许几个章节的分析与后续生成并发，0为串行，不提供则使用服务端配置",
+        ge=0,
+        le=5
+    )
 
 
 class BatchGenerateResponse(BaseModel):
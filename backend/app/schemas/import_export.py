@@ -118,6 +118,7 @@ class GenerationHistoryExportData(BaseModel):
     model: Optional[str] = None
     tokens_used: Optional[int] = None
     generation_time: Optional[float] = None
+    status: Optional[str] = None
     created_at: Optional[str] = None
 
 
@@ -1,6 +1,6 @@
 """AI去味相关的Pydantic模型"""
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 
 class PolishRequest(BaseModel):
@@ -17,4 +17,16 @@ class PolishResponse(BaseModel):
     original_text: str = Field(..., description="原始文本")
     polished_text: str = Field(..., description="去味后的文本")
     word_count_before: int = Field(..., description="处理前字数")
-    word_count_after: int = Field(..., description="处理后字数")
\ No newline at end of file
+    word_count_after: int = Field(..., description="处理后字数")
+
+
+class PolishBatchRequest(BaseModel):
+    """批量AI去味请求模型（流式）"""
+    texts: List[str] = Field(..., min_length=1, description="待处理的文本列表，结果按下标返回")
+    project_id: Optional[int] = Field(None, description="项目ID（可选）")
+    provider: Optional[str] = Field(None, description="AI提供商")
+    model: Optional[str] = Field(None, description="AI模型")
+    temperature: Optional[float] = Field(0.8, description="温度参数，建议0.7-0.9")
+    concurrency: Optional[int] = Field(None, ge=1, description="同时处理的文本数，默认使用服务端配置")
+    max_retries: Optional[int] = Field(None, ge=0, le=5, description="单个文本失败后的最大重试次数，默认使用服务端配置")
+    indices: Optional[List[int]] = Field(None, description="只处理这些下标的文本（用于重试上次失败的条目），为空时处理全部")
@@ -5,6 +5,8 @@ from anthropic import AsyncAnthropic
 
 from app.logger import get_logger
 from app.services.ai_config import AIClientConfig, default_config
+from .base_client import get_shared_http_client, make_client_key
+from .rate_limiter import estimate_tokens, get_limiter
 
 logger = get_logger(__name__)
 
@@ -12,12 +14,40 @@ logger = get_logger(__name__)
 class AnthropicClient:
     """Anthropic API 客户端"""
 
-    def __init__(self, api_key: str, base_url: Optional[str] = None, config: Optional[AIClientConfig] = None):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        config: Optional[AIClientConfig] = None,
+        user_id: Optional[str] = None,
+    ):
         self.config = config or default_config
-        kwargs = {"api_key": api_key}
+        self.user_id = user_id
+        self._sdk_kwargs = {"api_key": api_key}
         if base_url:
-            kwargs["base_url"] = base_url
-        self.client = AsyncAnthropic(**kwargs)
+            self._sdk_kwargs["base_url"] = base_url
+        endpoint = base_url or "https://api.anthropic.com"
+        self._client_key = make_client_key(self.__class__.__name__, endpoint, api_key)
+        self._sdk: Optional[AsyncAnthropic] = None
+        self._sdk_http_client = None
+        self.limiter = get_limiter(self.__class__.__name__, endpoint, api_key, self.config.rate_limit)
+
+    @property
+    def client(self) -> AsyncAnthropic:
+        """基于共享 HTTP 连接池的 SDK 客户端（连接池重建时同步重建）"""
+        if self._sdk is not None and self._sdk_http_client is None:
+            return self._sdk
+        http_client = get_shared_http_client(self._client_key, self.config.http)
+        if self._sdk is None or self._sdk_http_client is not http_client:
+            try:
+                self._sdk = AsyncAnthropic(**self._sdk_kwargs, http_client=http_client)
+                self._sdk_http_client = http_client
+            except TypeError as e:
+                # SDK 使用的 HTTP 库与共享连接池不兼容时，退回 SDK 自带的连接池（客户端对象本身仍会被复用）
+                logger.warning(f"⚠️ Anthropic SDK 无法使用共享连接池，改用 SDK 内置连接池: {str(e)}")
+                self._sdk = AsyncAnthropic(**self._sdk_kwargs)
+                self._sdk_http_client = None
+        return self._sdk
 
     async def chat_completion(
         self,
@@ -44,7 +74,11 @@ class AnthropicClient:
             elif tool_choice == "auto":
                 kwargs["tool_choice"] = {"type": "auto"}
 
-        response = await self.client.messages.create(**kwargs)
+        async with self.limiter.slot(self.user_id, estimate_tokens(system_prompt, messages)) as lease:
+            response = await self.client.messages.create(**kwargs)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                lease.record_usage((usage.input_tokens or 0) + (usage.output_tokens or 0))
 
         tool_calls = []
         content = ""
@@ -99,12 +133,15 @@ class AnthropicClient:
                 kwargs["tool_choice"] = {"type": "auto"}
 
         try:
-            async with self.client.messages.stream(**kwargs) as stream:
+            # 整个流式响应期间持有限流槽位
+            async with self.limiter.slot(self.user_id, estimate_tokens(system_prompt, messages)) as lease, \
+                    self.client.messages.stream(**kwargs) as stream:
                 try:
                     tool_calls = []
                     async for chunk in stream:
                         # 处理不同类型的块
                         if chunk.type == "text_delta":
+                            lease.record_output(chunk.text)
                             yield {"content": chunk.text}
                         elif chunk.type == "tool_use_delta":
                             # 工具调用增量
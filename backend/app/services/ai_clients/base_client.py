@@ -1,27 +1,94 @@
 """AI 客户端基类"""
 import asyncio
 import hashlib
+import importlib.util
 from abc import ABC, abstractmethod
 from typing import Any, AsyncGenerator, Dict, Optional
 
 import httpx
 
 from app.logger import get_logger
-from app.services.ai_config import AIClientConfig, default_config
+from app.services.ai_config import AIClientConfig, HTTPClientConfig, default_config
+from .rate_limiter import RequestLease, get_limiter
 
 logger = get_logger(__name__)
 
-# 全局 HTTP 客户端池
+# 全局 HTTP 客户端池（OpenAI / Anthropic / Gemini 共用）
 _http_client_pool: Dict[str, httpx.AsyncClient] = {}
-_global_semaphore: Optional[asyncio.Semaphore] = None
+_http_pool_stats: Dict[str, Dict[str, Any]] = {}
 
+# HTTP/2 依赖 h2 包（httpx[http2]），未安装时回退到 HTTP/1.1
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
 
-def _get_semaphore(max_concurrent: int) -> asyncio.Semaphore:
-    """获取全局信号量"""
-    global _global_semaphore
-    if _global_semaphore is None:
-        _global_semaphore = asyncio.Semaphore(max_concurrent)
-    return _global_semaphore
+
+def make_client_key(kind: str, base_url: str, api_key: str) -> str:
+    """生成连接池中的客户端唯一键"""
+    key_hash = hashlib.md5((api_key or "").encode()).hexdigest()[:8]
+    return f"{kind}_{(base_url or '').rstrip('/')}_{key_hash}"
+
+
+def get_shared_http_client(client_key: str, http_cfg: HTTPClientConfig) -> httpx.AsyncClient:
+    """获取或创建共享的 HTTP 客户端（同一上游复用连接，避免重复TLS握手）"""
+    client = _http_client_pool.get(client_key)
+    if client is not None:
+        if not client.is_closed:
+            return client
+        del _http_client_pool[client_key]
+
+    stats = _http_pool_stats.setdefault(client_key, {"created": 0, "requests": 0, "responses": 0, "errors": 0})
+    stats["created"] += 1
+
+    async def _on_request(request: httpx.Request):
+        stats["requests"] += 1
+
+    async def _on_response(response: httpx.Response):
+        stats["responses"] += 1
+        if response.status_code >= 400:
+            stats["errors"] += 1
+
+    http2 = http_cfg.http2 and _HTTP2_AVAILABLE
+    client = httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(
+            connect=http_cfg.connect_timeout,
+            read=http_cfg.read_timeout,
+            write=http_cfg.write_timeout,
+            pool=http_cfg.pool_timeout,
+        ),
+        limits=httpx.Limits(
+            max_keepalive_connections=http_cfg.max_keepalive_connections,
+            max_connections=http_cfg.max_connections,
+            keepalive_expiry=http_cfg.keepalive_expiry,
+        ),
+        event_hooks={"request": [_on_request], "response": [_on_response]},
+    )
+    _http_client_pool[client_key] = client
+    logger.info(f"✅ 创建 HTTP 客户端: {client_key} ({'HTTP/2' if http2 else 'HTTP/1.1'})")
+    return client
+
+
+def _pool_connections(client: httpx.AsyncClient) -> Dict[str, int]:
+    """读取底层连接池的连接数（依赖 httpcore 内部结构，取不到时返回空）"""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return {}
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return {"connections": len(connections), "idle_connections": idle}
+
+
+def get_http_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """获取 HTTP 客户端池统计"""
+    result = {}
+    for client_key, stats in _http_pool_stats.items():
+        client = _http_client_pool.get(client_key)
+        alive = client is not None and not client.is_closed
+        result[client_key] = {
+            **stats,
+            "alive": alive,
+            **(_pool_connections(client) if alive else {}),
+        }
+    return result
 
 
 class BaseAIClient(ABC):
@@ -32,44 +99,19 @@ class BaseAIClient(ABC):
         api_key: str,
         base_url: str,
         config: Optional[AIClientConfig] = None,
+        user_id: Optional[str] = None,
     ):
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
         self.config = config or default_config
-        self.http_client = self._get_or_create_client()
-
-    def _get_client_key(self) -> str:
-        """生成客户端唯一键"""
-        key_hash = hashlib.md5(self.api_key.encode()).hexdigest()[:8]
-        return f"{self.__class__.__name__}_{self.base_url}_{key_hash}"
-
-    def _get_or_create_client(self) -> httpx.AsyncClient:
-        """获取或创建 HTTP 客户端"""
-        client_key = self._get_client_key()
-
-        if client_key in _http_client_pool:
-            client = _http_client_pool[client_key]
-            if not client.is_closed:
-                return client
-            del _http_client_pool[client_key]
-
-        http_cfg = self.config.http
-        client = httpx.AsyncClient(
-            timeout=httpx.Timeout(
-                connect=http_cfg.connect_timeout,
-                read=http_cfg.read_timeout,
-                write=http_cfg.write_timeout,
-                pool=http_cfg.pool_timeout,
-            ),
-            limits=httpx.Limits(
-                max_keepalive_connections=http_cfg.max_keepalive_connections,
-                max_connections=http_cfg.max_connections,
-                keepalive_expiry=http_cfg.keepalive_expiry,
-            ),
-        )
-        _http_client_pool[client_key] = client
-        logger.info(f"✅ 创建 HTTP 客户端: {client_key}")
-        return client
+        self.user_id = user_id
+        self._client_key = make_client_key(self.__class__.__name__, self.base_url, self.api_key)
+        self.limiter = get_limiter(self.__class__.__name__, self.base_url, self.api_key, self.config.rate_limit)
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """共享的 HTTP 客户端（每次从池中取，池被清理后自动重建）"""
+        return get_shared_http_client(self._client_key, self.config.http)
 
     @abstractmethod
     def _build_headers(self) -> Dict[str, str]:
@@ -82,43 +124,52 @@ class BaseAIClient(ABC):
         endpoint: str,
         payload: Dict[str, Any],
         stream: bool = False,
+        estimated_tokens: int = 0,
     ) -> Any:
-        """带重试的 HTTP 请求"""
+        """
+        带重试的 HTTP 请求
+
+        非流式请求的每次尝试都单独占用限流槽位，退避等待期间不占用槽位；
+        流式请求直接返回 stream 上下文，由调用方在整个流期间持有槽位。
+        """
         url = f"{self.base_url}{endpoint}"
         headers = self._build_headers()
         retry_cfg = self.config.retry
-        rate_cfg = self.config.rate_limit
-
-        semaphore = _get_semaphore(rate_cfg.max_concurrent_requests)
-
-        async with semaphore:
-            await asyncio.sleep(rate_cfg.request_delay)
 
-            for attempt in range(retry_cfg.max_retries):
-                try:
-                    if attempt > 0:
-                        delay = min(
-                            retry_cfg.base_delay * (retry_cfg.exponential_base ** attempt),
-                            retry_cfg.max_delay,
-                        )
-                        logger.warning(f"⚠️ 重试 {attempt + 1}/{retry_cfg.max_retries}，等待 {delay}s")
-                        await asyncio.sleep(delay)
+        if stream:
+            return self.http_client.stream(method, url, headers=headers, json=payload)
 
-                    if stream:
-                        return self.http_client.stream(method, url, headers=headers, json=payload)
+        for attempt in range(retry_cfg.max_retries):
+            try:
+                if attempt > 0:
+                    delay = min(
+                        retry_cfg.base_delay * (retry_cfg.exponential_base ** attempt),
+                        retry_cfg.max_delay,
+                    )
+                    logger.warning(f"⚠️ 重试 {attempt + 1}/{retry_cfg.max_retries}，等待 {delay}s")
+                    await asyncio.sleep(delay)
 
+                async with self.limiter.slot(self.user_id, estimated_tokens) as lease:
                     response = await self.http_client.request(method, url, headers=headers, json=payload)
                     response.raise_for_status()
-                    return response.json()
-
-                except httpx.HTTPStatusError as e:
-                    if e.response.status_code in retry_cfg.non_retryable_status_codes:
-                        raise
-                    if attempt == retry_cfg.max_retries - 1:
-                        raise
-                except (httpx.ConnectError, httpx.TimeoutException):
-                    if attempt == retry_cfg.max_retries - 1:
-                        raise
+                    data = response.json()
+                    self._record_usage(lease, data)
+                    return data
+
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code in retry_cfg.non_retryable_status_codes:
+                    raise
+                if attempt == retry_cfg.max_retries - 1:
+                    raise
+            except (httpx.ConnectError, httpx.TimeoutException):
+                if attempt == retry_cfg.max_retries - 1:
+                    raise
+
+    def _record_usage(self, lease: RequestLease, data: Dict[str, Any]):
+        """从响应中读取实际Token用量（子类可按各自格式覆盖）"""
+        usage = data.get("usage") if isinstance(data, dict) else None
+        if isinstance(usage, dict):
+            lease.record_usage(usage.get("total_tokens"))
 
     @abstractmethod
     async def chat_completion(
@@ -3,6 +3,8 @@ from typing import Any, AsyncGenerator, Dict, List, Optional
 import httpx
 from app.services.ai_config import AIClientConfig, default_config
 from app.logger import get_logger
+from .base_client import get_shared_http_client, make_client_key
+from .rate_limiter import estimate_tokens, get_limiter
 
 logger = get_logger(__name__)
 
@@ -10,19 +12,24 @@ logger = get_logger(__name__)
 class GeminiClient:
     """Google Gemini API 客户端"""
 
-    def __init__(self, api_key: str, base_url: Optional[str] = None, config: Optional[AIClientConfig] = None):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        config: Optional[AIClientConfig] = None,
+        user_id: Optional[str] = None,
+    ):
         self.api_key = api_key
         self.base_url = (base_url or "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
         self.config = config or default_config
-        http_cfg = self.config.http
-        self.client = httpx.AsyncClient(
-            timeout=httpx.Timeout(
-                connect=http_cfg.connect_timeout,
-                read=http_cfg.read_timeout,
-                write=http_cfg.write_timeout,
-                pool=http_cfg.pool_timeout
-            )
-        )
+        self.user_id = user_id
+        self._client_key = make_client_key(self.__class__.__name__, self.base_url, api_key)
+        self.limiter = get_limiter(self.__class__.__name__, self.base_url, api_key, self.config.rate_limit)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """共享的 HTTP 客户端"""
+        return get_shared_http_client(self._client_key, self.config.http)
 
     def _convert_tools_to_gemini(self, tools: list) -> list:
         """将 OpenAI 格式工具转换为 Gemini 格式"""
@@ -70,9 +77,11 @@ class GeminiClient:
         if tools:
             payload["tools"] = self._convert_tools_to_gemini(tools)
 
-        response = await self.client.post(url, json=payload)
-        response.raise_for_status()
-        data = response.json()
+        async with self.limiter.slot(self.user_id, estimate_tokens(system_prompt, messages)) as lease:
+            response = await self.client.post(url, json=payload)
+            response.raise_for_status()
+            data = response.json()
+            lease.record_usage(data.get("usageMetadata", {}).get("totalTokenCount"))
         
         candidates = data.get("candidates", [])
         if not candidates or len(candidates) == 0:
@@ -140,7 +149,9 @@ class GeminiClient:
             payload["tools"] = self._convert_tools_to_gemini(tools)
 
         try:
-            async with self.client.stream("POST", url, json=payload) as response:
+            # 整个流式响应期间持有限流槽位
+            async with self.limiter.slot(self.user_id, estimate_tokens(system_prompt, messages)) as lease, \
+                    self.client.stream("POST", url, json=payload) as response:
                 response.raise_for_status()
                 try:
                     async for line in response.aiter_lines():
@@ -169,6 +180,7 @@ class GeminiClient:
                                                 })
                                         
                                         if text:
+                                            lease.record_output(text)
                                             yield {"content": text}
                                         if function_calls:
                                             yield {"tool_calls": function_calls}
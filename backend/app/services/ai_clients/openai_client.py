@@ -4,6 +4,7 @@ from typing import Any, AsyncGenerator, Dict, Optional
 
 from app.logger import get_logger
 from .base_client import BaseAIClient
+from .rate_limiter import estimate_tokens
 
 logger = get_logger(__name__)
 
@@ -63,7 +64,9 @@ class OpenAIClient(BaseAIClient):
         
         logger.debug(f"📤 OpenAI 请求 payload: {json.dumps(payload, ensure_ascii=False, indent=2)}")
         
-        data = await self._request_with_retry("POST", "/chat/completions", payload)
+        data = await self._request_with_retry(
+            "POST", "/chat/completions", payload, estimated_tokens=estimate_tokens(messages)
+        )
         
         # 调试日志：输出原始响应
         logger.debug(f"📥 OpenAI 原始响应: {json.dumps(data, ensure_ascii=False, indent=2)}")
@@ -103,7 +106,9 @@ class OpenAIClient(BaseAIClient):
         tool_calls_buffer = {}  # 收集工具调用块
         
         try:
-            async with await self._request_with_retry("POST", "/chat/completions", payload, stream=True) as response:
+            # 整个流式响应期间持有限流槽位
+            async with self.limiter.slot(self.user_id, estimate_tokens(messages)) as lease, \
+                    await self._request_with_retry("POST", "/chat/completions", payload, stream=True) as response:
                 response.raise_for_status()
                 try:
                     async for line in response.aiter_lines():
@@ -117,6 +122,8 @@ class OpenAIClient(BaseAIClient):
                                 break
                             try:
                                 data = json.loads(data_str)
+                                if isinstance(data.get("usage"), dict):
+                                    lease.record_usage(data["usage"].get("total_tokens"))
                                 choices = data.get("choices", [])
                                 if choices and len(choices) > 0:
                                     delta = choices[0].get("delta", {})
@@ -140,6 +147,7 @@ class OpenAIClient(BaseAIClient):
                                                         )
                                     
                                     if content:
+                                        lease.record_output(content)
                                         yield {"content": content}
                                         
                             except json.JSONDecodeError:
@@ -0,0 +1,303 @@
+"""AI 请求限流器 - 按上游端点自适应调整并发
+
+每个 (客户端类型, base_url, API Key哈希) 对应一个独立的限流器，不同提供商、
+不同中转地址、不同密钥之间互不影响：
+- 并发上限采用 AIMD：请求成功时缓慢增加，遇到 429/5xx 时按比例减小（带冷却时间）
+- 上游返回 Retry-After 时，在该时间之前暂停派发新请求
+- 等待中的请求按用户轮转派发，单个用户的批量生成不会饿死其他用户
+- 可选的 RPM/TPM 令牌桶，Token 数按提示词长度预估，拿到实际用量后修正
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import httpx
+
+from app.logger import get_logger
+from app.services.ai_config import RateLimitConfig
+
+logger = get_logger(__name__)
+
+ANONYMOUS_USER = "anonymous"
+
+
+def estimate_tokens(*parts: Any) -> int:
+    """粗略估算Token数（中文约1~2字符/Token，英文约4字符/Token，按2字符/Token折中）"""
+    chars = 0
+    for part in parts:
+        if not part:
+            continue
+        if isinstance(part, str):
+            chars += len(part)
+        elif isinstance(part, dict):
+            chars += len(str(part.get("content") or ""))
+        elif isinstance(part, (list, tuple)):
+            chars += sum(
+                len(str(item.get("content") or "")) if isinstance(item, dict) else len(str(item))
+                for item in part
+            )
+        else:
+            chars += len(str(part))
+    return chars // 2 + 1
+
+
+def _error_status(error: BaseException) -> Optional[int]:
+    """从异常中提取HTTP状态码（兼容httpx和各SDK的异常类型）"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    status = getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """读取响应头中的 Retry-After（秒）"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """每分钟额度的令牌桶"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """获取 amount 个令牌还需等待的秒数"""
+        self._refill()
+        # 单次需求超过桶容量时按容量计算，避免永远等不到
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        """扣减令牌（允许为负，表示透支，后续请求需要等待补齐）"""
+        self._refill()
+        self.tokens -= amount
+
+
+@dataclass
+class RequestLease:
+    """一次请求占用的限流槽位"""
+    user: str
+    reserved_tokens: int
+    used_tokens: Optional[int] = None
+    output_chars: int = 0
+
+    def record_usage(self, total_tokens: Optional[int]):
+        """记录上游返回的实际Token用量"""
+        if total_tokens:
+            self.used_tokens = int(total_tokens)
+
+    def record_output(self, text: Optional[str]):
+        """流式响应无用量信息时，按输出长度估算"""
+        if text:
+            self.output_chars += len(text)
+
+    @property
+    def actual_tokens(self) -> int:
+        if self.used_tokens is not None:
+            return self.used_tokens
+        return self.reserved_tokens + self.output_chars // 2
+
+
+class AdaptiveLimiter:
+    """单个上游端点的自适应限流器"""
+
+    def __init__(self, key: str, config: RateLimitConfig):
+        self.key = key
+        self.config = config
+        self.min_limit = max(1, config.min_concurrent_requests)
+        self.max_limit = max(self.min_limit, config.max_concurrent_limit)
+        self.limit = float(min(max(config.max_concurrent_requests, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._last_decrease = 0.0
+        # 用户 -> 等待中的Future，按用户轮转派发
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._rpm = TokenBucket(config.requests_per_minute) if config.requests_per_minute > 0 else None
+        self._tpm = TokenBucket(config.tokens_per_minute) if config.tokens_per_minute > 0 else None
+        self._stats = {
+            "requests": 0,
+            "queued": 0,
+            "throttled": 0,
+            "errors": 0,
+            "wait_seconds": 0.0,
+        }
+
+    # ==================== 并发槽位 ====================
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def _acquire_slot(self, user: str):
+        """获取并发槽位；有人排队时新请求必须排队，保证轮转公平"""
+        if not self._waiters and self._has_capacity():
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user, deque()).append(future)
+        self._stats["queued"] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 槽位已经派发给自己但调用方被取消，归还槽位
+                self._release_slot()
+            else:
+                queue = self._waiters.get(user)
+                if queue is not None and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del self._waiters[user]
+            raise
+
+    def _release_slot(self):
+        self.in_flight = max(0, self.in_flight - 1)
+        self._dispatch()
+
+    def _dispatch(self):
+        """按用户轮转把空闲槽位派发给等待者"""
+        while self._waiters and self._has_capacity():
+            user, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            if queue:
+                self._waiters.move_to_end(user)
+            else:
+                del self._waiters[user]
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    # ==================== RPM / TPM 与 Retry-After ====================
+
+    async def _wait_budget(self, tokens: int):
+        """等待 Retry-After 暂停期结束，以及 RPM/TPM 额度"""
+        while True:
+            delay = max(0.0, self.blocked_until - time.monotonic())
+            if self._rpm:
+                delay = max(delay, self._rpm.wait_time(1))
+            if self._tpm:
+                delay = max(delay, self._tpm.wait_time(tokens))
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        if self._rpm:
+            self._rpm.consume(1)
+        if self._tpm:
+            self._tpm.consume(tokens)
+
+    # ==================== AIMD ====================
+
+    def _on_success(self):
+        if self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + self.config.aimd_increase / self.limit)
+
+    def _on_throttled(self, status: int, retry_after: Optional[float]):
+        now = time.monotonic()
+        self._stats["throttled"] += 1
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+        # 同一波失败只收缩一次
+        if now - self._last_decrease >= self.config.decrease_cooldown:
+            old = self.limit
+            self.limit = max(self.min_limit, self.limit * self.config.aimd_decrease)
+            self._last_decrease = now
+            logger.warning(
+                f"⚠️ 上游限流/错误({status})，并发上限 {old:.1f} -> {self.limit:.1f}"
+                f"{f'，暂停 {retry_after:.1f}s' if retry_after else ''}: {self.key}"
+            )
+
+    # ==================== 对外接口 ====================
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str] = None, estimated_tokens: int = 0) -> AsyncIterator[RequestLease]:
+        """
+        占用一个请求槽位，退出时根据结果调整并发上限
+
+        Args:
+            user_id: 发起请求的用户（用于公平派发）
+            estimated_tokens: 预估Token数（用于TPM预扣）
+        """
+        user = user_id or ANONYMOUS_USER
+        started = time.monotonic()
+        await self._acquire_slot(user)
+        try:
+            await self._wait_budget(estimated_tokens)
+        except BaseException:
+            self._release_slot()
+            raise
+        self._stats["requests"] += 1
+        self._stats["wait_seconds"] += time.monotonic() - started
+
+        lease = RequestLease(user=user, reserved_tokens=estimated_tokens)
+        try:
+            yield lease
+        except BaseException as e:
+            status = _error_status(e)
+            if status == 429 or (status is not None and status >= 500):
+                self._on_throttled(status, _retry_after(e))
+            elif not isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+                self._stats["errors"] += 1
+            raise
+        else:
+            self._on_success()
+        finally:
+            if self._tpm:
+                # 用实际用量修正预扣额度
+                self._tpm.consume(lease.actual_tokens - lease.reserved_tokens)
+            self._release_slot()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流器状态"""
+        return {
+            **self._stats,
+            "wait_seconds": round(self._stats["wait_seconds"], 3),
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": sum(len(q) for q in self._waiters.values()),
+            "waiting_users": len(self._waiters),
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+        }
+
+
+# 全局限流器表
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def get_limiter(provider: str, base_url: str, api_key: str, config: RateLimitConfig) -> AdaptiveLimiter:
+    """获取（或创建）上游端点对应的限流器"""
+    key_hash = hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+    key = f"{provider}|{(base_url or '').rstrip('/')}|{key_hash}"
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = AdaptiveLimiter(key, config)
+        _limiters[key] = limiter
+        logger.debug(f"🚦 创建限流器: {key}")
+    return limiter
+
+
+def get_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有限流器状态"""
+    return {key: limiter.get_stats() for key, limiter in _limiters.items()}
@@ -13,6 +13,7 @@ class HTTPClientConfig:
     max_keepalive_connections: int = 50
     max_connections: int = 100
     keepalive_expiry: float = 60.0
+    http2: bool = True  # 需要安装 h2，未安装时自动回退到 HTTP/1.1
 
 
 @dataclass
@@ -27,9 +28,15 @@ class RetryConfig:
 
 @dataclass
 class RateLimitConfig:
-    """限流配置"""
-    max_concurrent_requests: int = 5
-    request_delay: float = 0.2
+    """限流配置（每个上游端点独立计算）"""
+    max_concurrent_requests: int = 5      # 初始并发上限
+    min_concurrent_requests: int = 1      # AIMD收缩下限
+    max_concurrent_limit: int = 20        # AIMD增长上限
+    aimd_increase: float = 1.0            # 每轮成功请求增加的并发数
+    aimd_decrease: float = 0.5            # 遇到429/5xx时的收缩比例
+    decrease_cooldown: float = 2.0        # 两次收缩之间的最短间隔（秒）
+    requests_per_minute: int = 0          # RPM额度，0表示不限制
+    tokens_per_minute: int = 0            # TPM额度，0表示不限制
 
 
 @dataclass
@@ -5,6 +5,9 @@
 - 如果有启用的MCP插件且有可用工具，自动发送tools
 - 通过 auto_mcp 参数控制是否启用自动工具加载
 """
+import dataclasses
+import hashlib
+from collections import OrderedDict
 from typing import Optional, AsyncGenerator, List, Dict, Any, Union
 
 from app.config import settings as app_settings
@@ -20,11 +23,34 @@ from app.services.ai_providers.gemini_provider import GeminiProvider
 from app.services.ai_providers.base_provider import BaseAIProvider
 from app.services.json_helper import clean_json_response, parse_json
 
-# 导出清理函数
-cleanup_http_clients = cleanup_all_clients
-
 logger = get_logger(__name__)
 
+# AI客户端复用缓存：相同 (客户端类型, 密钥, 地址, 配置, 用户) 的 AIService 共用同一个客户端对象
+_CLIENT_CACHE_SIZE = 256
+_client_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+
+
+def _get_client(client_cls, api_key: str, base_url: Optional[str], config: AIClientConfig, user_id: Optional[str]):
+    """获取（或创建）复用的AI客户端"""
+    key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+    # 按配置的取值区分（对象 id 在回收后会被复用，不能作为键）
+    cache_key = (client_cls.__name__, key_hash, base_url, dataclasses.astuple(config), user_id)
+    client = _client_cache.get(cache_key)
+    if client is None:
+        client = client_cls(api_key, base_url, config, user_id=user_id)
+        _client_cache[cache_key] = client
+        while len(_client_cache) > _CLIENT_CACHE_SIZE:
+            _client_cache.popitem(last=False)
+    else:
+        _client_cache.move_to_end(cache_key)
+    return client
+
+
+async def cleanup_http_clients():
+    """清理复用的AI客户端与HTTP客户端池"""
+    _client_cache.clear()
+    await cleanup_all_clients()
+
 
 class AIService:
     """
@@ -104,37 +130,37 @@ class AIService:
         openai_key = api_key if api_provider == "openai" else app_settings.openai_api_key
         if openai_key:
             base_url = api_base_url if api_provider == "openai" else app_settings.openai_base_url
-            client = OpenAIClient(openai_key, base_url or "https://api.openai.com/v1", self.config)
+            client = _get_client(OpenAIClient, openai_key, base_url or "https://api.openai.com/v1", self.config, user_id)
             self._openai_provider = OpenAIProvider(client)
 
         # 初始化 Anthropic
         anthropic_key = api_key if api_provider == "anthropic" else app_settings.anthropic_api_key
         if anthropic_key:
             base_url = api_base_url if api_provider == "anthropic" else app_settings.anthropic_base_url
-            client = AnthropicClient(anthropic_key, base_url, self.config)
+            client = _get_client(AnthropicClient, anthropic_key, base_url, self.config, user_id)
             self._anthropic_provider = AnthropicProvider(client)
 
         # 初始化 Gemini
         if api_provider == "gemini" and api_key:
-            client = GeminiClient(api_key, api_base_url, self.config)
+            client = _get_client(GeminiClient, api_key, api_base_url, self.config, user_id)
             self._gemini_provider = GeminiProvider(client)
 
         # 初始化火山引擎（使用OpenAI兼容接口）
         if api_provider == "volcano" and api_key:
             base_url = api_base_url or "https://ark.cn-beijing.volces.com/api/v3"
-            client = OpenAIClient(api_key, base_url, self.config)
+            client = _get_client(OpenAIClient, api_key, base_url, self.config, user_id)
             self._volcano_provider = OpenAIProvider(client)
 
         # 初始化阿里云百炼（使用OpenAI兼容接口）
         if api_provider == "aliyun" and api_key:
             base_url = api_base_url or "https://dashscope.aliyuncs.com/compatible-mode/v1"
-            client = OpenAIClient(api_key, base_url, self.config)
+            client = _get_client(OpenAIClient, api_key, base_url, self.config, user_id)
             self._aliyun_provider = OpenAIProvider(client)
 
         # 初始化 SiliconFlow（使用OpenAI兼容接口）
         if api_provider == "siliconflow" and api_key:
             base_url = api_base_url or "https://api.siliconflow.cn/v1"
-            client = OpenAIClient(api_key, base_url, self.config)
+            client = _get_client(OpenAIClient, api_key, base_url, self.config, user_id)
             self._siliconflow_provider = OpenAIProvider(client)
 
     @property
@@ -14,6 +14,11 @@ from app.models.career import Career, CharacterCareer
 from app.models.memory import StoryMemory
 from app.models.foreshadow import Foreshadow
 from app.models.relationship import CharacterRelationship, Organization, OrganizationMember
+from app.services.context_cache import (
+    context_cache,
+    DOMAIN_CHARACTERS, DOMAIN_CAREERS, DOMAIN_RELATIONSHIPS,
+    DOMAIN_FORESHADOWS, DOMAIN_CHAPTERS, DOMAIN_MEMORIES
+)
 from app.logger import get_logger
 
 logger = get_logger(__name__)
@@ -127,6 +132,13 @@ class OneToOneContext:
         return total
 
 
+# 各上下文分段依赖的数据域（任一数据域有写入即重新构建该分段）
+CHARACTER_SECTION_DOMAINS = (DOMAIN_CHARACTERS, DOMAIN_CAREERS, DOMAIN_RELATIONSHIPS)
+RECENT_CHAPTERS_DOMAINS = (DOMAIN_CHAPTERS,)
+CONTINUATION_DOMAINS = (DOMAIN_CHAPTERS, DOMAIN_MEMORIES)
+FORESHADOW_DOMAINS = (DOMAIN_FORESHADOWS,)
+
+
 # ==================== 1-N模式上下文构建器 ====================
 
 class OneToManyContextBuilder:
@@ -147,6 +159,7 @@ class OneToManyContextBuilder:
     MEMORY_COUNT = 10            # 记忆条数
     MEMORY_SIMILARITY_THRESHOLD = 0.6  # 记忆相关度阈值
     RECENT_CHAPTERS_COUNT = 10   # 最近章节规划数量
+    SKELETON_SAMPLE_INTERVAL = 10  # 故事骨架采样间隔（每N章取1章）
     
     def __init__(self, memory_service=None, foreshadow_service=None):
         """
@@ -214,8 +227,9 @@ class OneToManyContextBuilder:
         
         # === 最近10章expansion_plan摘要 ===
         if chapter_number > 1:
-            context.recent_chapters_context = await self._build_recent_chapters_context(
-                chapter, project.id, db
+            context.recent_chapters_context = await context_cache.get_or_build(
+                project.id, "1n_recent_chapters", chapter_number, RECENT_CHAPTERS_DOMAINS,
+                lambda: self._build_recent_chapters_context(chapter, project.id, db)
             )
             logger.info(f"  ✅ 最近章节规划: {len(context.recent_chapters_context or '')}字符")
         
@@ -226,8 +240,9 @@ class OneToManyContextBuilder:
             context.previous_chapter_events = None
             logger.info("  ✅ 第1章无需衔接锚点")
         else:
-            ending_info = await self._get_last_ending_enhanced(
-                chapter, db, self.ENDING_LENGTH
+            ending_info = await context_cache.get_or_build(
+                project.id, "1n_continuation", chapter_number, CONTINUATION_DOMAINS,
+                lambda: self._get_last_ending_enhanced(chapter, db, self.ENDING_LENGTH)
             )
             context.continuation_point = ending_info.get('ending_text')
             context.previous_chapter_summary = ending_info.get('summary')
@@ -236,8 +251,10 @@ class OneToManyContextBuilder:
         
         # === P1-重要信息 ===
         # 角色信息（完整版：含年龄、外貌、背景、关系、组织、职业）+ 独立职业详情
-        characters_info, careers_info = await self._build_chapter_characters_1n(
-            chapter, project, outline, db
+        character_focus = self._extract_character_focus(chapter)
+        characters_info, careers_info = await context_cache.get_or_build(
+            project.id, "1n_characters", tuple(character_focus or ()), CHARACTER_SECTION_DOMAINS,
+            lambda: self._build_chapter_characters_1n(chapter, project, outline, db)
         )
         context.chapter_characters = characters_info
         context.chapter_careers = careers_info
@@ -255,8 +272,9 @@ class OneToManyContextBuilder:
         
         # === P2-伏笔提醒===
         if self.foreshadow_service:
-            context.foreshadow_reminders = await self._get_foreshadow_reminders(
-                project.id, chapter_number, db
+            context.foreshadow_reminders = await context_cache.get_or_build(
+                project.id, "1n_foreshadows", chapter_number, FORESHADOW_DOMAINS,
+                lambda: self._get_foreshadow_reminders(project.id, chapter_number, db)
             )
             if context.foreshadow_reminders:
                 logger.info(f"  ✅ 伏笔提醒: {len(context.foreshadow_reminders)}字符")
@@ -305,6 +323,16 @@ class OneToManyContextBuilder:
         # 回退到大纲内容
         return outline.content if outline else chapter.summary or '暂无大纲'
     
+    def _extract_character_focus(self, chapter: Chapter) -> Optional[List[str]]:
+        """从expansion_plan中提取角色焦点"""
+        if chapter.expansion_plan:
+            try:
+                plan = json.loads(chapter.expansion_plan)
+                return plan.get('character_focus', [])
+            except json.JSONDecodeError:
+                pass
+        return None
+    
     async def _build_chapter_characters_1n(
         self,
         chapter: Chapter,
@@ -328,13 +356,7 @@ class OneToManyContextBuilder:
         all_char_map = {c.id: c.name for c in all_characters}
         
         # 从expansion_plan中提取角色焦点
-        filter_character_names = None
-        if chapter.expansion_plan:
-            try:
-                plan = json.loads(chapter.expansion_plan)
-                filter_character_names = plan.get('character_focus', [])
-            except json.JSONDecodeError:
-                pass
+        filter_character_names = self._extract_character_focus(chapter)
         
         # 筛选角色
         characters = all_characters
@@ -1033,42 +1055,21 @@ class OneToOneContextBuilder:
         # === P1-重要信息 ===
         # 1. 获取上一章内容的最后500字和上一章摘要
         if chapter_number > 1:
-            # 查找前一章：不假设序号连续，取 chapter_number < 当前章 中最大的
-            prev_chapter_result = await db.execute(
-                select(Chapter)
-                .where(Chapter.project_id == chapter.project_id)
-                .where(Chapter.chapter_number < chapter_number)
-                .order_by(Chapter.chapter_number.desc())
-                .limit(1)
+            previous_info = await context_cache.get_or_build(
+                project.id, "11_continuation", chapter_number, CONTINUATION_DOMAINS,
+                lambda: self._get_previous_chapter_info(chapter, db)
             )
-            prev_chapter = prev_chapter_result.scalar_one_or_none()
             
-            if prev_chapter and prev_chapter.content:
-                content = prev_chapter.content.strip()
-                if len(content) <= 500:
-                    context.continuation_point = content
-                else:
-                    context.continuation_point = content[-500:]
+            if previous_info:
+                context.continuation_point = previous_info['ending_text']
                 logger.info(f"  ✅ P1-上一章内容(最后500字): {len(context.continuation_point)}字符")
                 
-                # 获取上一章摘要（优先从记忆系统获取，其次使用章节摘要）
-                summary_result = await db.execute(
-                    select(StoryMemory.content)
-                    .where(StoryMemory.project_id == chapter.project_id)
-                    .where(StoryMemory.chapter_id == prev_chapter.id)
-                    .where(StoryMemory.memory_type == 'chapter_summary')
-                    .limit(1)
-                )
-                summary_mem = summary_result.scalar_one_or_none()
-                
-                if summary_mem:
-                    context.previous_chapter_summary = summary_mem[:300]
+                context.previous_chapter_summary = previous_info['summary']
+                if previous_info['summary_source'] == 'memory':
                     logger.info(f"  ✅ P1-上一章摘要(记忆): {len(context.previous_chapter_summary)}字符")
-                elif prev_chapter.summary:
-                    context.previous_chapter_summary = prev_chapter.summary[:300]
+                elif previous_info['summary_source'] == 'chapter':
                     logger.info(f"  ✅ P1-上一章摘要(章节): {len(context.previous_chapter_summary)}字符")
                 else:
-                    context.previous_chapter_summary = None
                     logger.info(f"  ⚠️ P1-上一章摘要: 无")
             else:
                 context.continuation_point = None
@@ -1095,22 +1096,13 @@ class OneToOneContextBuilder:
                 pass
         
         if character_names:
-            # 获取角色基本信息
-            characters_result = await db.execute(
-                select(Character)
-                .where(Character.project_id == project.id)
-                .where(Character.name.in_(character_names))
+            characters_section = await context_cache.get_or_build(
+                project.id, "11_characters", tuple(character_names), CHARACTER_SECTION_DOMAINS,
+                lambda: self._build_characters_for_names(db, project.id, character_names)
             )
-            characters = characters_result.scalars().all()
             
-            if characters:
-                # 构建包含职业信息的角色上下文和职业详情
-                characters_info, careers_info = await self._build_characters_and_careers(
-                    db=db,
-                    project_id=project.id,
-                    characters=characters,
-                    filter_character_names=character_names
-                )
+            if characters_section:
+                characters_info, careers_info = characters_section
                 context.chapter_characters = characters_info
                 context.chapter_careers = careers_info
                 logger.info(f"  ✅ P1-角色信息: {len(context.chapter_characters)}字符")
@@ -1127,8 +1119,9 @@ class OneToOneContextBuilder:
         # === P2-参考信息 ===
         # 1. 伏笔提醒
         if self.foreshadow_service:
-            context.foreshadow_reminders = await self._get_foreshadow_reminders(
-                project.id, chapter_number, db
+            context.foreshadow_reminders = await context_cache.get_or_build(
+                project.id, "11_foreshadows", chapter_number, FORESHADOW_DOMAINS,
+                lambda: self._get_foreshadow_reminders(project.id, chapter_number, db)
             )
             if context.foreshadow_reminders:
                 logger.info(f"  ✅ P2-伏笔提醒: {len(context.foreshadow_reminders)}字符")
@@ -1232,6 +1225,81 @@ class OneToOneContextBuilder:
         else:
             return outline.content if outline else "暂无大纲"
     
+    async def _get_previous_chapter_info(
+        self,
+        chapter: Chapter,
+        db: AsyncSession
+    ) -> Optional[Dict[str, Any]]:
+        """
+        获取上一章最后500字及摘要（1-1模式专用）
+        
+        Returns:
+            上一章无内容时返回None，否则返回 ending_text、summary、summary_source(memory/chapter/None)
+        """
+        # 查找前一章：不假设序号连续，取 chapter_number < 当前章 中最大的
+        prev_chapter_result = await db.execute(
+            select(Chapter)
+            .where(Chapter.project_id == chapter.project_id)
+            .where(Chapter.chapter_number < chapter.chapter_number)
+            .order_by(Chapter.chapter_number.desc())
+            .limit(1)
+        )
+        prev_chapter = prev_chapter_result.scalar_one_or_none()
+        
+        if not prev_chapter or not prev_chapter.content:
+            return None
+        
+        content = prev_chapter.content.strip()
+        info = {
+            'ending_text': content if len(content) <= 500 else content[-500:],
+            'summary': None,
+            'summary_source': None
+        }
+        
+        # 获取上一章摘要（优先从记忆系统获取，其次使用章节摘要）
+        summary_result = await db.execute(
+            select(StoryMemory.content)
+            .where(StoryMemory.project_id == chapter.project_id)
+            .where(StoryMemory.chapter_id == prev_chapter.id)
+            .where(StoryMemory.memory_type == 'chapter_summary')
+            .limit(1)
+        )
+        summary_mem = summary_result.scalar_one_or_none()
+        
+        if summary_mem:
+            info['summary'] = summary_mem[:300]
+            info['summary_source'] = 'memory'
+        elif prev_chapter.summary:
+            info['summary'] = prev_chapter.summary[:300]
+            info['summary_source'] = 'chapter'
+        
+        return info
+    
+    async def _build_characters_for_names(
+        self,
+        db: AsyncSession,
+        project_id: str,
+        character_names: List[str]
+    ) -> Optional[tuple[str, Optional[str]]]:
+        """按名称查询角色并构建角色信息和职业信息，无匹配角色时返回None"""
+        characters_result = await db.execute(
+            select(Character)
+            .where(Character.project_id == project_id)
+            .where(Character.name.in_(character_names))
+        )
+        characters = characters_result.scalars().all()
+        
+        if not characters:
+            return None
+        
+        # 构建包含职业信息的角色上下文和职业详情
+        return await self._build_characters_and_careers(
+            db=db,
+            project_id=project_id,
+            characters=characters,
+            filter_character_names=character_names
+        )
+    
     async def _build_characters_and_careers(
         self,
         db: AsyncSession,
@@ -1309,12 +1377,18 @@ class OneToOneContextBuilder:
             else:
                 char_career_relations[cc.character_id]['sub'].append(cc)
         
+        # 限制最多10个角色
+        display_characters = [full_characters[cid] for cid in character_ids[:10] if cid in full_characters]
+        
+        # === 批量预取关系、组织、成员数据（固定次数的集合查询，避免逐角色查询）===
+        char_rels_map, related_name_map, org_members_map = await self._prefetch_character_links(
+            db, project_id, display_characters
+        )
+        
         # 构建角色信息字符串
         characters_info_parts = []
-        for char_id in character_ids[:10]:  # 限制最多10个角色
-            c = full_characters.get(char_id)
-            if not c:
-                continue
+        for c in display_characters:
+            char_id = c.id
             
             # === 角色基本信息 ===
             entity_type = '组织' if c.is_organization else '角色'
@@ -1393,37 +1467,18 @@ class OneToOneContextBuilder:
             
             # === 角色关系信息 ===
             if not c.is_organization:
-                from sqlalchemy import or_
-                rels_result = await db.execute(
-                    select(CharacterRelationship).where(
-                        CharacterRelationship.project_id == project_id,
-                        or_(
-                            CharacterRelationship.character_from_id == c.id,
-                            CharacterRelationship.character_to_id == c.id
-                        )
-                    )
-                )
-                rels = rels_result.scalars().all()
-                if rels:
-                    related_ids = set()
+                rels = char_rels_map.get(c.id, [])
+                # 仅在存在其他关联角色时输出（与自身的关系不单独成行）
+                if any(r.character_from_id != c.id or r.character_to_id != c.id for r in rels):
+                    rel_parts = []
                     for r in rels:
-                        related_ids.add(r.character_from_id)
-                        related_ids.add(r.character_to_id)
-                    related_ids.discard(c.id)
-                    if related_ids:
-                        names_result = await db.execute(
-                            select(Character.id, Character.name).where(Character.id.in_(related_ids))
-                        )
-                        name_map = {row.id: row.name for row in names_result}
-                        rel_parts = []
-                        for r in rels:
-                            if r.character_from_id == c.id:
-                                target_name = name_map.get(r.character_to_id, "未知")
-                            else:
-                                target_name = name_map.get(r.character_from_id, "未知")
-                            rel_name = r.relationship_name or "相关"
-                            rel_parts.append(f"与{target_name}：{rel_name}")
-                        info_lines.append(f"  关系网络: {'；'.join(rel_parts)}")
+                        if r.character_from_id == c.id:
+                            target_name = related_name_map.get(r.character_to_id, "未知")
+                        else:
+                            target_name = related_name_map.get(r.character_from_id, "未知")
+                        rel_name = r.relationship_name or "相关"
+                        rel_parts.append(f"与{target_name}：{rel_name}")
+                    info_lines.append(f"  关系网络: {'；'.join(rel_parts)}")
             
             # === 组织特有信息 ===
             if c.is_organization:
@@ -1431,21 +1486,10 @@ class OneToOneContextBuilder:
                     info_lines.append(f"  组织类型: {c.organization_type}")
                 if c.organization_purpose:
                     info_lines.append(f"  组织目的: {c.organization_purpose[:100]}")
-                # 从 OrganizationMember 表动态查询组织成员
-                org_result = await db.execute(
-                    select(Organization).where(Organization.character_id == c.id)
-                )
-                org = org_result.scalar_one_or_none()
-                if org:
-                    members_result = await db.execute(
-                        select(OrganizationMember, Character.name).join(
-                            Character, OrganizationMember.character_id == Character.id
-                        ).where(OrganizationMember.organization_id == org.id)
-                    )
-                    members = members_result.all()
-                    if members:
-                        member_parts = [f"{name}（{m.position}）" for m, name in members]
-                        info_lines.append(f"  组织成员: {'、'.join(member_parts)[:100]}")
+                members = org_members_map.get(c.id)
+                if members:
+                    member_parts = [f"{name}（{m.position}）" for m, name in members]
+                    info_lines.append(f"  组织成员: {'、'.join(member_parts)[:100]}")
             
             # 组合完整信息
             full_info = "\n".join(info_lines)
@@ -1515,6 +1559,76 @@ class OneToOneContextBuilder:
         
         return characters_result, careers_result
     
+    async def _prefetch_character_links(
+        self,
+        db: AsyncSession,
+        project_id: str,
+        characters: list
+    ) -> tuple[Dict[str, List], Dict[str, str], Dict[str, List]]:
+        """
+        一次性预取一组角色的关系、关联角色名、组织及组织成员
+        
+        无论角色数量多少，最多执行4次查询。
+        
+        Returns:
+            tuple: (角色ID -> 关系列表, 关联角色ID -> 名称, 组织角色ID -> [(成员, 成员名)])
+        """
+        from sqlalchemy import or_
+        
+        person_ids = [c.id for c in characters if not c.is_organization]
+        org_char_ids = [c.id for c in characters if c.is_organization]
+        
+        # 1. 所有普通角色涉及的关系
+        char_rels_map: Dict[str, List] = {cid: [] for cid in person_ids}
+        related_ids = set()
+        if person_ids:
+            rels_result = await db.execute(
+                select(CharacterRelationship).where(
+                    CharacterRelationship.project_id == project_id,
+                    or_(
+                        CharacterRelationship.character_from_id.in_(person_ids),
+                        CharacterRelationship.character_to_id.in_(person_ids)
+                    )
+                )
+            )
+            for r in rels_result.scalars().all():
+                if r.character_from_id in char_rels_map:
+                    char_rels_map[r.character_from_id].append(r)
+                if r.character_to_id in char_rels_map and r.character_to_id != r.character_from_id:
+                    char_rels_map[r.character_to_id].append(r)
+                related_ids.add(r.character_from_id)
+                related_ids.add(r.character_to_id)
+        
+        # 2. 关联角色名称
+        related_name_map: Dict[str, str] = {}
+        if related_ids:
+            names_result = await db.execute(
+                select(Character.id, Character.name).where(Character.id.in_(list(related_ids)))
+            )
+            related_name_map = {row.id: row.name for row in names_result}
+        
+        # 3-4. 组织角色对应的组织及其成员
+        org_members_map: Dict[str, List] = {}
+        if org_char_ids:
+            orgs_result = await db.execute(
+                select(Organization.id, Organization.character_id)
+                .where(Organization.character_id.in_(org_char_ids))
+            )
+            org_id_to_char_id = {row.id: row.character_id for row in orgs_result}
+            
+            if org_id_to_char_id:
+                members_result = await db.execute(
+                    select(OrganizationMember, Character.name).join(
+                        Character, OrganizationMember.character_id == Character.id
+                    ).where(OrganizationMember.organization_id.in_(list(org_id_to_char_id)))
+                )
+                for m, member_name in members_result.all():
+                    char_id = org_id_to_char_id.get(m.organization_id)
+                    if char_id:
+                        org_members_map.setdefault(char_id, []).append((m, member_name))
+        
+        return char_rels_map, related_name_map, org_members_map
+    
     async def _get_foreshadow_reminders(
         self,
         project_id: str,
@@ -0,0 +1,202 @@
+"""章节上下文缓存 - 基于版本号失效的项目级缓存
+
+上下文构建器的各个分段（角色/职业、最近章节、衔接锚点、伏笔提醒）按
+(项目ID, 分段名, 分段参数) 缓存。每个缓存条目记录构建时所依赖数据域的版本号，
+读取时版本号一致才复用。
+
+版本号由 SQLAlchemy Session 事件自动维护：
+- after_flush 收集本次事务中写入的模型所属的 (项目, 数据域)
+- after_commit 提交成功后统一递增对应版本号，回滚则丢弃
+- ORM 批量 UPDATE/DELETE 语句无法确定项目时，递增该数据域的全局版本号
+
+缓存与版本号都在进程内，以下写入不会递增本进程的版本号：
+- 其他进程（独立 worker、多副本部署）的写入
+- 直接执行原生 SQL 的写入
+因此每个条目另有有效期，上述写入最多延迟 context_cache_ttl_seconds 生效。
+"""
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.logger import get_logger
+from app.models.career import Career, CharacterCareer
+from app.models.chapter import Chapter
+from app.models.character import Character
+from app.models.foreshadow import Foreshadow
+from app.models.memory import StoryMemory
+from app.models.relationship import CharacterRelationship, Organization, OrganizationMember
+
+logger = get_logger(__name__)
+
+# 数据域
+DOMAIN_CHARACTERS = "characters"
+DOMAIN_CAREERS = "careers"
+DOMAIN_RELATIONSHIPS = "relationships"
+DOMAIN_FORESHADOWS = "foreshadows"
+DOMAIN_CHAPTERS = "chapters"
+DOMAIN_MEMORIES = "memories"
+
+# 模型 -> 数据域
+_MODEL_DOMAINS: Dict[type, str] = {
+    Character: DOMAIN_CHARACTERS,
+    Career: DOMAIN_CAREERS,
+    CharacterCareer: DOMAIN_CAREERS,
+    CharacterRelationship: DOMAIN_RELATIONSHIPS,
+    Organization: DOMAIN_RELATIONSHIPS,
+    OrganizationMember: DOMAIN_RELATIONSHIPS,
+    Foreshadow: DOMAIN_FORESHADOWS,
+    Chapter: DOMAIN_CHAPTERS,
+    StoryMemory: DOMAIN_MEMORIES,
+}
+
+_PENDING_KEY = "context_cache_pending"
+_MISSING = object()
+
+
+class ContextCache:
+    """项目级上下文分段缓存"""
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # 项目ID -> 数据域 -> 版本号
+        self._versions: Dict[str, Dict[str, int]] = {}
+        # 数据域 -> 全局版本号（无法确定项目的写入）
+        self._global_versions: Dict[str, int] = {}
+        # (项目ID, 分段名, 参数) -> (过期时间, 版本快照, 值)
+        self._entries: "OrderedDict[Tuple[str, str, Hashable], Tuple[float, tuple, Any]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "bumps": 0, "expired": 0}
+
+    # ==================== 版本号 ====================
+
+    def bump(self, project_id: Optional[str], domain: str):
+        """递增版本号；project_id 为空时递增全局版本号"""
+        if project_id:
+            domains = self._versions.setdefault(project_id, {})
+            domains[domain] = domains.get(domain, 0) + 1
+        else:
+            self._global_versions[domain] = self._global_versions.get(domain, 0) + 1
+        self._stats["bumps"] += 1
+
+    def snapshot(self, project_id: str, domains: Iterable[str]) -> tuple:
+        """获取指定数据域的当前版本快照"""
+        project_versions = self._versions.get(project_id, {})
+        return tuple(
+            (project_versions.get(d, 0), self._global_versions.get(d, 0))
+            for d in domains
+        )
+
+    # ==================== 缓存读写 ====================
+
+    async def get_or_build(
+        self,
+        project_id: str,
+        section: str,
+        key: Hashable,
+        domains: Tuple[str, ...],
+        builder: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        读取分段缓存，版本不一致、条目过期或未命中时调用 builder 重新构建
+
+        Args:
+            project_id: 项目ID
+            section: 分段名
+            key: 分段参数（需可哈希）
+            domains: 该分段依赖的数据域
+            builder: 构建函数
+        """
+        cache_key = (project_id, section, key)
+        # 构建前取快照：构建期间发生的写入会让该条目在下次读取时失效
+        current = self.snapshot(project_id, domains)
+        cached = self._entries.get(cache_key, _MISSING)
+        if cached is not _MISSING and cached[1] == current:
+            if cached[0] > time.monotonic():
+                self._entries.move_to_end(cache_key)
+                self._stats["hits"] += 1
+                logger.debug(f"♻️ 复用上下文缓存: {section} {key}")
+                return cached[2]
+            # 版本未变但已过期：可能有其他进程的写入，重新构建
+            self._stats["expired"] += 1
+
+        self._stats["misses"] += 1
+        value = await builder()
+        if self.ttl <= 0:
+            return value
+        self._entries[cache_key] = (time.monotonic() + self.ttl, current, value)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def invalidate_project(self, project_id: str):
+        """清除项目的所有缓存条目"""
+        for cache_key in [k for k in self._entries if k[0] == project_id]:
+            del self._entries[cache_key]
+        self._versions.pop(project_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        total = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "hit_rate": round(self._stats["hits"] / total, 4) if total else 0.0,
+        }
+
+
+# 全局实例
+context_cache = ContextCache(
+    max_entries=settings.context_cache_max_entries,
+    ttl=settings.context_cache_ttl_seconds,
+)
+
+
+# ==================== Session事件：自动维护版本号 ====================
+
+def _pending(session: Session) -> Set[Tuple[Optional[str], str]]:
+    return session.info.setdefault(_PENDING_KEY, set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_changes(session: Session, flush_context):
+    """收集本次flush写入的模型所属的(项目, 数据域)"""
+    pending = None
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        domain = _MODEL_DOMAINS.get(type(obj))
+        if domain is None:
+            continue
+        if pending is None:
+            pending = _pending(session)
+        pending.add((getattr(obj, "project_id", None), domain))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_changes(orm_execute_state):
+    """ORM批量UPDATE/DELETE无法逐行确定项目，按全局版本处理"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    domain = _MODEL_DOMAINS.get(mapper.class_) if mapper is not None else None
+    if domain:
+        _pending(orm_execute_state.session).add((None, domain))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_changes(session: Session):
+    """事务提交后递增版本号"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        for project_id, domain in pending:
+            context_cache.bump(project_id, domain)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_changes(session: Session):
+    """事务回滚时丢弃未提交的变更"""
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,182 @@
+"""Embedding缓存 - 基于内容哈希的两级向量缓存
+
+缓存键为 (模型名, sha256(规范化文本))：
+- 内存层：OrderedDict 实现的 LRU，命中时零开销
+- 磁盘层：data/ 下的 SQLite 文件，向量以 float32 二进制存储，进程重启后仍然有效
+
+相同文本（记忆内容、章节摘要、重复的检索查询）永远只会被模型编码一次。
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：统一Unicode形式、去除首尾空白、合并连续空白"""
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def make_cache_key(model_name: str, text: str) -> str:
+    """生成缓存键"""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+class EmbeddingCache:
+    """
+    两级Embedding缓存
+
+    内存层方法可以直接在事件循环中调用；磁盘层方法会访问SQLite，
+    应由调用方放到线程池中执行。
+    """
+
+    def __init__(self, model_name: str, db_path: Optional[str], memory_size: int = 5000):
+        """
+        Args:
+            model_name: Embedding模型名（不同模型的向量互不复用）
+            db_path: SQLite缓存文件路径，为空时仅启用内存层
+            memory_size: 内存LRU最多保存的向量数
+        """
+        self.model_name = model_name
+        self.memory_size = max(0, memory_size)
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "disk_writes": 0,
+            "disk_errors": 0,
+        }
+
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._conn = sqlite3.connect(db_path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                    "cache_key TEXT PRIMARY KEY, "
+                    "dim INTEGER NOT NULL, "
+                    "vector BLOB NOT NULL)"
+                )
+                self._conn.commit()
+                logger.info(f"✅ Embedding磁盘缓存已启用: {db_path}")
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding磁盘缓存初始化失败，仅使用内存缓存: {str(e)}")
+                self._conn = None
+
+    def key(self, text: str) -> str:
+        """生成当前模型下的缓存键"""
+        return make_cache_key(self.model_name, text)
+
+    # ==================== 内存层 ====================
+
+    def get_memory(self, keys: List[str]) -> Dict[str, List[float]]:
+        """从内存层批量读取，返回命中的部分"""
+        found = {}
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                found[key] = vector
+        self._stats["memory_hits"] += len(found)
+        return found
+
+    def put_memory(self, items: Dict[str, List[float]]):
+        """写入内存层并淘汰最久未使用的条目"""
+        if self.memory_size <= 0:
+            return
+        for key, vector in items.items():
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    # ==================== 磁盘层（线程池中调用） ====================
+
+    def get_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        """从磁盘层批量读取，返回命中的部分"""
+        if not self._conn or not keys:
+            return {}
+        found = {}
+        try:
+            with self._db_lock:
+                # SQLite单条语句的参数上限为999，分段查询
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = self._conn.execute(
+                        f"SELECT cache_key, vector FROM embedding_cache WHERE cache_key IN ({placeholders})",
+                        chunk
+                    ).fetchall()
+                    for cache_key, blob in rows:
+                        found[cache_key] = array("f", blob).tolist()
+        except Exception as e:
+            self._stats["disk_errors"] += 1
+            logger.warning(f"⚠️ 读取Embedding磁盘缓存失败: {str(e)}")
+            return {}
+        self._stats["disk_hits"] += len(found)
+        return found
+
+    def put_disk(self, items: Dict[str, List[float]]):
+        """批量写入磁盘层"""
+        if not self._conn or not items:
+            return
+        rows = [
+            (key, len(vector), array("f", vector).tobytes())
+            for key, vector in items.items()
+        ]
+        try:
+            with self._db_lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (cache_key, dim, vector) VALUES (?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+            self._stats["disk_writes"] += len(rows)
+        except Exception as e:
+            self._stats["disk_errors"] += 1
+            logger.warning(f"⚠️ 写入Embedding磁盘缓存失败: {str(e)}")
+
+    # ==================== 统计 ====================
+
+    def record_misses(self, count: int):
+        """记录未命中次数"""
+        self._stats["misses"] += count
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取缓存命中统计"""
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+        total = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "model_name": self.model_name,
+            "memory_entries": len(self._memory),
+            "memory_capacity": self.memory_size,
+            "disk_enabled": self._conn is not None,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+    def close(self):
+        """关闭磁盘缓存连接"""
+        if self._conn:
+            with self._db_lock:
+                self._conn.close()
+            self._conn = None
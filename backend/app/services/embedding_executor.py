@@ -0,0 +1,244 @@
+"""Embedding执行器 - 在独立线程池中运行SentenceTransformer并合并并发请求
+
+所有 encode 调用都不在事件循环中执行：
+- 并发到达的编码请求先进入待处理队列
+- 队列达到 max_batch_size 或等待超过 max_wait_ms 时合并为一个微批次
+- 微批次在专用线程池中调用 model.encode，结果按请求拆分后回填到各自的 Future
+- 配置了 EmbeddingCache 时，命中缓存的文本不会进入编码队列
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.logger import get_logger
+from app.services.embedding_cache import EmbeddingCache
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class _PendingEncode:
+    """待编码请求"""
+    texts: List[str]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class EmbeddingExecutor:
+    """
+    Embedding批处理执行器
+
+    使用方式：
+        executor = EmbeddingExecutor(model)
+        vectors = await executor.encode(["文本1", "文本2"])
+        vector = await executor.encode_one("查询文本")
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10.0,
+        max_workers: int = 1,
+        cache: Optional[EmbeddingCache] = None,
+    ):
+        """
+        Args:
+            model: SentenceTransformer模型实例
+            max_batch_size: 单个微批次最多包含的文本数
+            max_wait_ms: 第一个请求进入队列后最多等待多久再发起编码
+            max_workers: 编码线程数（CPU推理通常1个线程即可吃满算力）
+            cache: 可选的两级Embedding缓存
+        """
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="embedding")
+        self.cache = cache
+        # 磁盘缓存读写使用独立的单线程池，不占用编码线程
+        self._io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-cache")
+
+        self._pending: List[_PendingEncode] = []
+        self._pending_count = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # 运行统计
+        self._stats = {
+            "requests": 0,
+            "texts": 0,
+            "batches": 0,
+            "max_batch_texts": 0,
+            "encode_seconds": 0.0,
+        }
+
+    def _ensure_worker(self):
+        """确保当前事件循环上有合并批次的后台任务"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 事件循环发生变化（例如测试或脚本中多次 asyncio.run），重建状态
+            self._loop = loop
+            self._pending = []
+            self._pending_count = 0
+            self._wakeup = asyncio.Event()
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+    async def encode(self, texts: List[str]) -> List[List[float]]:
+        """
+        编码一组文本
+
+        Args:
+            texts: 待编码文本列表
+
+        Returns:
+            与输入顺序一致的向量列表
+        """
+        if not texts:
+            return []
+        if self.cache is None:
+            return await self._submit(texts)
+
+        loop = asyncio.get_running_loop()
+        keys = [self.cache.key(text) for text in texts]
+        # 同一请求内的重复文本只编码一次
+        unique: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            unique.setdefault(key, text)
+
+        found = self.cache.get_memory(list(unique))
+        missing = [key for key in unique if key not in found]
+
+        if missing:
+            from_disk = await loop.run_in_executor(self._io_pool, self.cache.get_disk, missing)
+            if from_disk:
+                found.update(from_disk)
+                self.cache.put_memory(from_disk)
+                missing = [key for key in missing if key not in from_disk]
+
+        if missing:
+            self.cache.record_misses(len(missing))
+            vectors = await self._submit([unique[key] for key in missing])
+            computed = dict(zip(missing, vectors))
+            found.update(computed)
+            self.cache.put_memory(computed)
+            # 磁盘写入不阻塞调用方
+            loop.run_in_executor(self._io_pool, self.cache.put_disk, computed)
+
+        return [found[key] for key in keys]
+
+    async def _submit(self, texts: List[str]) -> List[List[float]]:
+        """将文本提交到合批队列并等待编码结果"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._pending.append(_PendingEncode(texts=list(texts), future=future))
+        self._pending_count += len(texts)
+        self._stats["requests"] += 1
+        self._wakeup.set()
+        return await future
+
+    async def encode_one(self, text: str) -> List[float]:
+        """编码单条文本"""
+        vectors = await self.encode([text])
+        return vectors[0]
+
+    async def _run(self):
+        """后台合批循环"""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+
+            # 等待更多请求加入，直到批次已满或超过最长等待时间
+            deadline = self._pending[0].enqueued_at + self.max_wait
+            while self._pending_count < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+                    self._wakeup.clear()
+                except asyncio.TimeoutError:
+                    break
+
+            batch = self._take_batch()
+            if self._pending:
+                # 剩余请求留给下一轮
+                self._wakeup.set()
+            await self._encode_batch(batch)
+
+    def _take_batch(self) -> List[_PendingEncode]:
+        """从队列头部取出一个微批次（单个超大请求不会被拆分）"""
+        batch: List[_PendingEncode] = []
+        size = 0
+        while self._pending:
+            item = self._pending[0]
+            if batch and size + len(item.texts) > self.max_batch_size:
+                break
+            batch.append(self._pending.pop(0))
+            size += len(item.texts)
+        self._pending_count -= size
+        return batch
+
+    async def _encode_batch(self, batch: List[_PendingEncode]):
+        """在线程池中编码一个微批次并回填结果"""
+        texts = [text for item in batch for text in item.texts]
+        started = time.perf_counter()
+        try:
+            vectors = await self._loop.run_in_executor(self._pool, self._encode_sync, texts)
+        except Exception as e:
+            logger.error(f"❌ Embedding批量编码失败: {str(e)}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        elapsed = time.perf_counter() - started
+        self._stats["batches"] += 1
+        self._stats["texts"] += len(texts)
+        self._stats["encode_seconds"] += elapsed
+        self._stats["max_batch_texts"] = max(self._stats["max_batch_texts"], len(texts))
+        logger.debug(f"🧮 Embedding微批次: {len(batch)}个请求, {len(texts)}条文本, 耗时{elapsed * 1000:.1f}ms")
+
+        offset = 0
+        for item in batch:
+            count = len(item.texts)
+            if not item.future.done():
+                item.future.set_result(vectors[offset:offset + count])
+            offset += count
+
+    def _encode_sync(self, texts: List[str]) -> List[List[float]]:
+        """同步编码（在线程池中执行）"""
+        embeddings = self.model.encode(
+            texts,
+            batch_size=self.max_batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+        )
+        return embeddings.tolist()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取执行器统计信息"""
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "pending_texts": self._pending_count,
+            "avg_batch_texts": round(self._stats["texts"] / batches, 2) if batches else 0,
+            "avg_batch_ms": round(self._stats["encode_seconds"] * 1000 / batches, 2) if batches else 0,
+            "cache": self.cache.get_stats() if self.cache else None,
+        }
+
+    def shutdown(self):
+        """关闭线程池"""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+        self._pool.shutdown(wait=False)
+        # 等待未完成的磁盘写入后再关闭缓存
+        self._io_pool.shutdown(wait=True)
+        if self.cache:
+            self.cache.close()
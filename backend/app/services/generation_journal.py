@@ -0,0 +1,167 @@
+"""生成日志 - 让流式生成与HTTP连接解耦
+
+生成任务在独立的 asyncio 任务中运行，产生的 SSE 消息写入有界日志：
+- 每条消息分配单调递增的事件ID（格式为 "{运行标识}-{序号}"），随 SSE 的 id 字段下发
+- 日志在内存中保留最近 N 条消息（环形缓冲），同时保留已生成正文用于断线快照
+- 浏览器断开后生成继续进行；客户端携带 Last-Event-ID 重连即可从断点继续接收
+- 断点已被环形缓冲淘汰时，先下发一条 snapshot 消息（完整正文），再继续推送后续消息
+
+空消息与心跳消息（": heartbeat"）不写入日志，由每个订阅连接在空闲时自行发送。
+"""
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from collections import deque
+from typing import AsyncGenerator, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class GenerationInProgressError(Exception):
+    """同一key下已有进行中的生成"""
+
+
+class GenerationJournal:
+    """单次流式生成的消息日志"""
+
+    def __init__(self, key: str, user_id: str, max_frames: int = 4096):
+        self.key = key
+        self.user_id = user_id
+        self.run_token = uuid.uuid4().hex[:8]
+        self.created_at = time.time()
+        self.finished = False
+        self._frames: Deque[Tuple[int, str]] = deque(maxlen=max(16, max_frames))
+        self._last_seq = 0
+        self._content_parts: List[str] = []
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # ==================== 写入端 ====================
+
+    def start(self, source: AsyncGenerator[str, None]) -> asyncio.Task:
+        """在后台任务中消费生成器，把产生的消息写入日志"""
+        self._task = asyncio.create_task(self._pump(source))
+        return self._task
+
+    async def _pump(self, source: AsyncGenerator[str, None]):
+        try:
+            async for frame in source:
+                if not frame or frame.startswith(":"):
+                    continue
+                self.append(frame)
+        except Exception as e:
+            logger.error(f"❌ 后台生成任务异常 [{self.key}]: {str(e)}")
+            self.append(f'data: {json.dumps({"type": "error", "error": str(e), "code": 500}, ensure_ascii=False)}\n\n')
+        finally:
+            self.finished = True
+            self._notify()
+            _schedule_cleanup(self)
+
+    def append(self, frame: str):
+        """追加一条SSE消息"""
+        self._last_seq += 1
+        self._frames.append((self._last_seq, frame))
+        self._notify()
+
+    def record_content(self, chunk: str):
+        """记录正文内容块（用于断线重连时的快照）"""
+        self._content_parts.append(chunk)
+
+    @property
+    def content(self) -> str:
+        return "".join(self._content_parts)
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    # ==================== 读取端 ====================
+
+    def owns_event_id(self, last_event_id: Optional[str]) -> bool:
+        """Last-Event-ID 是否属于本次运行"""
+        if not last_event_id:
+            return False
+        token, _, seq = last_event_id.strip().partition("-")
+        return token == self.run_token and seq.isdigit()
+
+    def parse_event_id(self, last_event_id: Optional[str]) -> int:
+        """解析 Last-Event-ID，不属于本次运行的ID从头开始"""
+        if not self.owns_event_id(last_event_id):
+            return 0
+        return min(int(last_event_id.strip().partition("-")[2]), self._last_seq)
+
+    def _format(self, seq: int, frame: str) -> str:
+        return f"id: {self.run_token}-{seq}\n{frame}"
+
+    async def subscribe(self, last_event_id: Optional[str] = None, heartbeat: float = 15.0) -> AsyncGenerator[str, None]:
+        """从指定事件之后开始推送消息，直到生成结束"""
+        seq = self.parse_event_id(last_event_id)
+        while True:
+            first_seq = self._frames[0][0] if self._frames else self._last_seq + 1
+            if seq < first_seq - 1:
+                # 断点已被淘汰：下发当前正文快照后从最新位置继续
+                seq = self._last_seq
+                snapshot = {"type": "snapshot", "content": self.content}
+                yield self._format(seq, f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n")
+
+            if seq < self._last_seq:
+                start = seq - first_seq + 1
+                for frame_seq, frame in list(itertools.islice(self._frames, start, None)):
+                    yield self._format(frame_seq, frame)
+                    seq = frame_seq
+                continue
+
+            if self.finished:
+                return
+
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+
+
+# 活跃及刚结束的生成日志：key -> 日志
+_journals: Dict[str, GenerationJournal] = {}
+
+
+def get_journal(key: str) -> Optional[GenerationJournal]:
+    """获取生成日志"""
+    return _journals.get(key)
+
+
+def get_running_journal(key: str) -> Optional[GenerationJournal]:
+    """获取仍在运行中的生成日志"""
+    journal = _journals.get(key)
+    return journal if journal is not None and not journal.finished else None
+
+
+def create_journal(key: str, user_id: str) -> GenerationJournal:
+    """
+    为新的生成任务创建日志（替换同一key下已结束的旧日志）
+
+    Raises:
+        GenerationInProgressError: 同一key下的生成仍在进行
+    """
+    if get_running_journal(key) is not None:
+        raise GenerationInProgressError(key)
+    journal = GenerationJournal(key, user_id, max_frames=settings.sse_journal_max_frames)
+    _journals[key] = journal
+    return journal
+
+
+def _schedule_cleanup(journal: GenerationJournal):
+    """生成结束后保留一段时间供迟到的重连使用"""
+    def _remove():
+        if _journals.get(journal.key) is journal:
+            del _journals[journal.key]
+
+    try:
+        asyncio.get_running_loop().call_later(settings.sse_journal_retention_seconds, _remove)
+    except RuntimeError:
+        _remove()
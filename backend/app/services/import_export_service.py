@@ -436,6 +436,7 @@ class ImportExportService:
                 model=history.model,
                 tokens_used=history.tokens_used,
                 generation_time=history.generation_time,
+                status=history.status,
                 created_at=history.created_at.isoformat() if history.created_at else None
             )
             for history, chapter in histories
@@ -0,0 +1,391 @@
+"""持久化作业执行器 - 基于数据库队列的后台作业（租约 + 心跳）
+
+作业写入 jobs 表后由执行器认领执行，与发起作业的HTTP请求和进程解耦：
+- 认领：条件 UPDATE（status=queued，或 running 但租约已过期）抢占租约，PostgreSQL/SQLite 通用
+- 心跳：执行期间每 lease/3 秒续约一次；续约失败说明租约已被他人接管，立即停止执行
+- 崩溃恢复：进程退出后租约自然过期，其他执行器（或重启后的本进程）重新认领
+- 失败重试：处理函数抛出异常时按指数退避重新排队，超过最大次数后标记失败
+
+执行器可以运行在API进程内（settings.job_runner_enabled），也可以通过
+`python -m app.worker` 启动独立的worker进程，按需横向扩展。
+
+作业处理函数通过 register_job_handler 注册，处理函数需自行保证可重入（从断点继续）。
+"""
+import asyncio
+import os
+import socket
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.logger import get_logger
+from app.models.job import Job
+
+logger = get_logger(__name__)
+
+JobHandler = Callable[[Job], Awaitable[None]]
+JobFailedHook = Callable[[Job, str], Awaitable[None]]
+JobRecoverHook = Callable[[AsyncSession], Awaitable[int]]
+
+
+@dataclass
+class _Registration:
+    handler: JobHandler
+    on_failed: Optional[JobFailedHook] = None
+    recover: Optional[JobRecoverHook] = None
+
+
+_registry: Dict[str, _Registration] = {}
+
+
+def register_job_handler(
+    kind: str,
+    handler: JobHandler,
+    on_failed: Optional[JobFailedHook] = None,
+    recover: Optional[JobRecoverHook] = None,
+):
+    """
+    注册作业处理函数
+
+    Args:
+        kind: 作业类型
+        handler: 处理函数，参数为已认领的作业
+        on_failed: 作业最终失败（超过最大次数）时的回调，用于同步业务任务状态
+        recover: 执行器启动时调用一次，用于把旧版本遗留的业务任务补录为作业，返回补录数量
+    """
+    _registry[kind] = _Registration(handler=handler, on_failed=on_failed, recover=recover)
+
+
+async def get_job_session() -> AsyncSession:
+    """创建作业使用的独立数据库会话（调用方负责关闭）"""
+    from app.database import get_session_factory
+    session_factory = await get_session_factory("job_runner")
+    return session_factory()
+
+
+async def enqueue_job(
+    db: AsyncSession,
+    kind: str,
+    user_id: str,
+    ref_id: Optional[str] = None,
+    payload: Optional[Dict[str, Any]] = None,
+    max_attempts: Optional[int] = None,
+) -> Optional[Job]:
+    """
+    提交作业并唤醒本进程的执行器
+
+    同一 (kind, ref_id) 只会存在一个作业，重复提交时返回 None。
+    """
+    job = Job(
+        kind=kind,
+        ref_id=ref_id,
+        user_id=user_id,
+        payload=payload or {},
+        status='queued',
+        attempts=0,
+        max_attempts=max_attempts or settings.job_max_attempts,
+    )
+    db.add(job)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        logger.info(f"📋 作业已存在，跳过重复提交: {kind} {ref_id}")
+        return None
+    logger.info(f"📋 提交作业: {kind} {ref_id or job.id}")
+    job_runner.notify()
+    return job
+
+
+class JobRunner:
+    """作业执行器"""
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        lease_seconds: int = 60,
+        poll_interval: float = 2.0,
+    ):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.concurrency = max(1, concurrency)
+        self.lease = timedelta(seconds=max(10, lease_seconds))
+        self.poll_interval = max(0.1, poll_interval)
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._lease_lost: set = set()
+        self._stats = {"claimed": 0, "completed": 0, "failed": 0, "retried": 0, "lease_lost": 0}
+
+    @property
+    def running(self) -> bool:
+        return any(not w.done() for w in self._workers)
+
+    def notify(self):
+        """有新作业时唤醒空闲的worker"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ==================== 生命周期 ====================
+
+    async def start(self):
+        """启动worker协程"""
+        if self.running:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        await self._recover()
+        self._workers = [
+            asyncio.create_task(self._worker_loop(i), name=f"job-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        logger.info(f"✅ 作业执行器已启动: {self.worker_id}, 并发 {self.concurrency}")
+
+    async def stop(self):
+        """停止worker，正在执行的作业释放租约后由其他执行器接管"""
+        self._stopping = True
+        for worker in self._workers:
+            worker.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info(f"✅ 作业执行器已停止: {self.worker_id}")
+
+    async def run_forever(self):
+        """独立worker进程入口"""
+        await self.start()
+        try:
+            await asyncio.gather(*self._workers)
+        finally:
+            await self.stop()
+
+    async def _recover(self):
+        """调用各作业类型的恢复钩子，补录旧版本遗留的业务任务"""
+        for kind, registration in _registry.items():
+            if not registration.recover:
+                continue
+            db = await get_job_session()
+            try:
+                count = await registration.recover(db)
+                if count:
+                    logger.info(f"♻️ 补录遗留任务为作业: {kind} x{count}")
+            except Exception as e:
+                logger.error(f"❌ 作业恢复钩子执行失败 [{kind}]: {str(e)}")
+            finally:
+                await db.close()
+
+    # ==================== 认领 ====================
+
+    def _claimable(self, now: datetime):
+        return and_(
+            Job.kind.in_(list(_registry)),
+            or_(
+                and_(
+                    Job.status == 'queued',
+                    or_(Job.available_at.is_(None), Job.available_at <= now),
+                ),
+                and_(Job.status == 'running', Job.lease_expires_at < now),
+            ),
+        )
+
+    async def _claim(self) -> Optional[Job]:
+        """认领一个可执行的作业"""
+        if not _registry:
+            return None
+        db = await get_job_session()
+        try:
+            now = datetime.now()
+            result = await db.execute(
+                select(Job.id)
+                .where(self._claimable(now))
+                .order_by(Job.created_at)
+                .limit(self.concurrency)
+            )
+            for job_id in result.scalars().all():
+                claimed = await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id)
+                    .where(self._claimable(now))
+                    .values(
+                        status='running',
+                        lease_owner=self.worker_id,
+                        lease_expires_at=now + self.lease,
+                        heartbeat_at=now,
+                        started_at=now,
+                        attempts=Job.attempts + 1,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                if claimed.rowcount == 1:
+                    job = await db.get(Job, job_id, populate_existing=True)
+                    self._stats["claimed"] += 1
+                    return job
+            return None
+        finally:
+            await db.close()
+
+    # ==================== 执行 ====================
+
+    async def _worker_loop(self, index: int):
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ 认领作业失败: {str(e)}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    self._wakeup.clear()
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._execute(job)
+
+    async def _execute(self, job: Job):
+        registration = _registry.get(job.kind)
+        if registration is None:
+            return
+
+        if job.attempts > job.max_attempts:
+            error = f"超过最大执行次数({job.max_attempts})"
+            await self._finish(job, 'failed', error)
+            await self._on_failed(registration, job, error)
+            return
+
+        logger.info(f"▶️ 开始执行作业: {job.kind} {job.ref_id or job.id} (第{job.attempts}次)")
+        handler_task = asyncio.create_task(registration.handler(job))
+        heartbeat_task = asyncio.create_task(self._heartbeat(job, handler_task))
+        try:
+            await handler_task
+        except asyncio.CancelledError:
+            if job.id in self._lease_lost:
+                self._lease_lost.discard(job.id)
+                logger.warning(f"⚠️ 作业租约已被接管，停止执行: {job.kind} {job.ref_id or job.id}")
+                return
+            # 执行器停止：释放租约，本次不计入执行次数
+            await asyncio.shield(self._release(job))
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"[:2000]
+            logger.error(f"❌ 作业执行失败: {job.kind} {job.ref_id or job.id}: {error}", exc_info=True)
+            if job.attempts < job.max_attempts:
+                await self._retry(job, error)
+            else:
+                await self._finish(job, 'failed', error)
+                await self._on_failed(registration, job, error)
+            return
+        finally:
+            heartbeat_task.cancel()
+
+        await self._finish(job, 'completed')
+        logger.info(f"✅ 作业完成: {job.kind} {job.ref_id or job.id}")
+
+    async def _heartbeat(self, job: Job, handler_task: asyncio.Task):
+        """定期续约，租约丢失时取消处理函数"""
+        interval = self.lease.total_seconds() / 3
+        while not handler_task.done():
+            await asyncio.sleep(interval)
+            try:
+                renewed = await self._update_owned(
+                    job,
+                    lease_expires_at=datetime.now() + self.lease,
+                    heartbeat_at=datetime.now(),
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ 作业心跳失败: {job.id}: {str(e)}")
+                continue
+            if not renewed:
+                self._stats["lease_lost"] += 1
+                self._lease_lost.add(job.id)
+                handler_task.cancel()
+                return
+
+    async def _update_owned(self, job: Job, **values) -> bool:
+        """只更新仍由本执行器持有的作业"""
+        db = await get_job_session()
+        try:
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == job.id)
+                .where(Job.lease_owner == self.worker_id)
+                .where(Job.status == 'running')
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            return result.rowcount == 1
+        finally:
+            await db.close()
+
+    async def _finish(self, job: Job, status: str, error: Optional[str] = None):
+        self._stats["completed" if status == 'completed' else "failed"] += 1
+        await self._update_owned(
+            job,
+            status=status,
+            last_error=error,
+            lease_owner=None,
+            lease_expires_at=None,
+            completed_at=datetime.now(),
+        )
+
+    async def _retry(self, job: Job, error: str):
+        self._stats["retried"] += 1
+        delay = min(2 ** job.attempts, 60)
+        await self._update_owned(
+            job,
+            status='queued',
+            last_error=error,
+            lease_owner=None,
+            lease_expires_at=None,
+            available_at=datetime.now() + timedelta(seconds=delay),
+        )
+        logger.info(f"⏳ 作业将在 {delay}s 后重试: {job.kind} {job.ref_id or job.id}")
+
+    async def _release(self, job: Job):
+        try:
+            await self._update_owned(
+                job,
+                status='queued',
+                attempts=Job.attempts - 1,
+                lease_owner=None,
+                lease_expires_at=None,
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ 释放作业租约失败: {job.id}: {str(e)}")
+
+    async def _on_failed(self, registration: _Registration, job: Job, error: str):
+        if not registration.on_failed:
+            return
+        try:
+            await registration.on_failed(job, error)
+        except Exception as e:
+            logger.error(f"❌ 作业失败回调异常: {job.kind} {job.ref_id}: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取执行器统计"""
+        return {
+            **self._stats,
+            "worker_id": self.worker_id,
+            "running": self.running,
+            "concurrency": self.concurrency,
+            "kinds": list(_registry),
+        }
+
+
+# 全局实例
+job_runner = JobRunner(
+    concurrency=settings.job_runner_concurrency,
+    lease_seconds=settings.job_lease_seconds,
+    poll_interval=settings.job_poll_interval,
+)
@@ -2,9 +2,13 @@
 import chromadb
 from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Any, Optional
+from dataclasses import dataclass
 import json
 from datetime import datetime
 from app.logger import get_logger
+from app.config import settings
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_executor import EmbeddingExecutor
 import os
 import hashlib
 
@@ -66,6 +70,24 @@ if 'SENTENCE_TRANSFORMERS_HOME' not in os.environ:
             logger.info(f"🔧 使用降级模型目录: {fallback_dir}")
 
 
+@dataclass
+class RetrievalQuery:
+    """检索计划中的一个语义查询"""
+    name: str
+    query: str
+    memory_types: Optional[List[str]] = None
+    limit: int = 10
+    min_importance: float = 0.0
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """判断一条记忆是否满足本查询的过滤条件"""
+        if self.memory_types and metadata.get("memory_type") not in self.memory_types:
+            return False
+        if self.min_importance > 0 and float(metadata.get("importance", 0)) < self.min_importance:
+            return False
+        return True
+
+
 class MemoryService:
     """向量记忆管理服务 - 实现语义检索和长期记忆"""
     
@@ -176,6 +198,7 @@ class MemoryService:
                             trust_remote_code=True,
                             local_files_only=True  # 强制使用本地文件
                         )
+                        self.embedding_model_name = 'paraphrase-multilingual-MiniLM-L12-v2'
                         logger.info("✅ Embedding模型加载成功 (离线模式)")
                     except Exception as local_err:
                         logger.warning(f"⚠️ 离线模式加载失败: {str(local_err)}")
@@ -191,6 +214,7 @@ class MemoryService:
                         trust_remote_code=True,
                         local_files_only=False  # 允许联网下载
                     )
+                    self.embedding_model_name = 'paraphrase-multilingual-MiniLM-L12-v2'
                     logger.info("✅ Embedding模型加载成功 (在线下载)")
             except Exception as e:
                 logger.warning(f"⚠️ 无法加载多语言模型: {str(e)}")
@@ -206,6 +230,7 @@ class MemoryService:
                         device='cpu',
                         trust_remote_code=False
                     )
+                    self.embedding_model_name = 'all-MiniLM-L6-v2'
                     logger.info("✅ 使用备用Embedding模型 (all-MiniLM-L6-v2)")
                 except Exception as e2:
                     logger.error(f"❌ 所有模型加载失败: {str(e2)}")
@@ -218,10 +243,28 @@ class MemoryService:
                     logger.error(f"   {os.path.abspath(model_cache_dir)}/models--sentence-transformers--paraphrase-multilingual-MiniLM-L12-v2/")
                     raise RuntimeError("无法加载任何Embedding模型")
             
+            # 按(模型名, 文本哈希)缓存向量，相同文本只编码一次
+            embedding_cache = None
+            if settings.embedding_cache_enabled:
+                embedding_cache = EmbeddingCache(
+                    model_name=self.embedding_model_name,
+                    db_path=settings.embedding_cache_path,
+                    memory_size=settings.embedding_cache_memory_size
+                )
+            
+            # 所有编码请求都通过执行器在线程池中合批完成，避免阻塞事件循环
+            self.embedder = EmbeddingExecutor(
+                self.embedding_model,
+                max_batch_size=settings.embedding_batch_size,
+                max_wait_ms=settings.embedding_batch_wait_ms,
+                max_workers=settings.embedding_executor_workers,
+                cache=embedding_cache
+            )
+            
             self._initialized = True
             logger.info("✅ MemoryService初始化成功")
             logger.info(f"  - ChromaDB目录: {chroma_dir}")
-            logger.info(f"  - Embedding模型: paraphrase-multilingual-MiniLM-L12-v2")
+            logger.info(f"  - Embedding模型: {self.embedding_model_name}")
             
         except Exception as e:
             logger.error(f"❌ MemoryService初始化失败: {str(e)}")
@@ -293,7 +336,7 @@ class MemoryService:
             collection = self.get_collection(user_id, project_id)
             
             # 生成文本的向量表示
-            embedding = self.embedding_model.encode(content).tolist()
+            embedding = await self.embedder.encode_one(content)
             
             # 准备元数据(ChromaDB要求所有值为基础类型)
             chroma_metadata = {
@@ -355,17 +398,12 @@ class MemoryService:
             ids = []
             documents = []
             metadatas = []
-            embeddings = []
             
             # 批量准备数据
             for mem in memories:
                 ids.append(mem['id'])
                 documents.append(mem['content'])
                 
-                # 生成embedding
-                embedding = self.embedding_model.encode(mem['content']).tolist()
-                embeddings.append(embedding)
-                
                 # 准备元数据
                 metadata = mem.get('metadata', {})
                 chroma_metadata = {
@@ -380,6 +418,9 @@ class MemoryService:
                 }
                 metadatas.append(chroma_metadata)
             
+            # 一次性批量生成embedding
+            embeddings = await self.embedder.encode(documents)
+            
             # 批量添加
             collection.add(
                 ids=ids,
@@ -424,47 +465,17 @@ class MemoryService:
             collection = self.get_collection(user_id, project_id)
             
             # 生成查询向量
-            query_embedding = self.embedding_model.encode(query).tolist()
-            
-            # 构建过滤条件 - ChromaDB要求使用$and组合多个条件
-            where_filter = None
-            conditions = []
-            
-            if memory_types:
-                conditions.append({"memory_type": {"$in": memory_types}})
-            if min_importance > 0:
-                conditions.append({"importance": {"$gte": min_importance}})
-            if chapter_range:
-                conditions.append({"chapter_number": {"$gte": chapter_range[0]}})
-                conditions.append({"chapter_number": {"$lte": chapter_range[1]}})
-            
-            # 根据条件数量选择合适的格式
-            if len(conditions) == 0:
-                where_filter = None
-            elif len(conditions) == 1:
-                where_filter = conditions[0]
-            else:
-                where_filter = {"$and": conditions}
+            query_embedding = await self.embedder.encode_one(query)
             
-            # 执行向量相似度搜索
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=limit,
-                where=where_filter
+            memories = self._query_by_embedding(
+                collection,
+                query_embedding,
+                memory_types=memory_types,
+                limit=limit,
+                min_importance=min_importance,
+                chapter_range=chapter_range
             )
             
-            # 格式化结果
-            memories = []
-            if results['ids'] and results['ids'][0]:
-                for i in range(len(results['ids'][0])):
-                    memories.append({
-                        "id": results['ids'][0][i],
-                        "content": results['documents'][0][i],
-                        "metadata": results['metadatas'][0][i],
-                        "similarity": 1 - results['distances'][0][i] if 'distances' in results else 1.0,
-                        "distance": results['distances'][0][i] if 'distances' in results else 0.0
-                    })
-            
             logger.info(f"🔍 语义搜索完成: 查询='{query[:30]}...', 找到{len(memories)}条记忆")
             return memories
             
@@ -472,6 +483,146 @@ class MemoryService:
             logger.error(f"❌ 搜索记忆失败: {str(e)}")
             return []
     
+    def _build_where_filter(
+        self,
+        memory_types: Optional[List[str]] = None,
+        min_importance: float = 0.0,
+        chapter_range: Optional[tuple] = None
+    ) -> Optional[Dict[str, Any]]:
+        """构建过滤条件 - ChromaDB要求使用$and组合多个条件"""
+        conditions = []
+        
+        if memory_types:
+            conditions.append({"memory_type": {"$in": memory_types}})
+        if min_importance > 0:
+            conditions.append({"importance": {"$gte": min_importance}})
+        if chapter_range:
+            conditions.append({"chapter_number": {"$gte": chapter_range[0]}})
+            conditions.append({"chapter_number": {"$lte": chapter_range[1]}})
+        
+        # 根据条件数量选择合适的格式
+        if len(conditions) == 0:
+            return None
+        elif len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+    
+    def _format_query_results(self, results: Dict[str, Any], index: int = 0) -> List[Dict[str, Any]]:
+        """将 collection.query 第 index 个查询的结果格式化为记忆列表"""
+        memories = []
+        if results['ids'] and len(results['ids']) > index and results['ids'][index]:
+            distances = results.get('distances')
+            for i in range(len(results['ids'][index])):
+                distance = distances[index][i] if distances else None
+                memories.append({
+                    "id": results['ids'][index][i],
+                    "content": results['documents'][index][i],
+                    "metadata": results['metadatas'][index][i],
+                    "similarity": 1 - distance if distance is not None else 1.0,
+                    "distance": distance if distance is not None else 0.0
+                })
+        return memories
+    
+    def _query_by_embedding(
+        self,
+        collection,
+        query_embedding: List[float],
+        memory_types: Optional[List[str]] = None,
+        limit: int = 10,
+        min_importance: float = 0.0,
+        chapter_range: Optional[tuple] = None
+    ) -> List[Dict[str, Any]]:
+        """使用已编码的查询向量执行单次过滤检索"""
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=limit,
+            where=self._build_where_filter(memory_types, min_importance, chapter_range)
+        )
+        return self._format_query_results(results)
+    
+    async def multi_search_memories(
+        self,
+        user_id: str,
+        project_id: str,
+        queries: List[RetrievalQuery],
+        oversample: int = 4
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        单次往返执行多个语义查询
+        
+        所有查询文本一次性批量编码，再通过一次多向量 collection.query 取回
+        无过滤的候选集，按各查询自己的类型/重要性条件在内存中过滤。
+        候选集不足以填满的查询（且集合中还有更多记忆时）合并为第二次多向量检索：
+        过滤条件取这些查询条件的并集($or)，同样放大候选数后在内存中按各自条件过滤，
+        因此无论检索计划有多少查询，最多只有两次 Chroma 往返。
+        
+        Args:
+            user_id: 用户ID
+            project_id: 项目ID
+            queries: 检索计划
+            oversample: 候选集相对最大limit的放大倍数（两次检索均适用）
+        
+        Returns:
+            查询名 -> 相关记忆列表(按相似度排序)
+        """
+        sections: Dict[str, List[Dict[str, Any]]] = {q.name: [] for q in queries}
+        if not queries:
+            return sections
+        
+        try:
+            collection = self.get_collection(user_id, project_id)
+            total = collection.count()
+            if total == 0:
+                return sections
+            
+            embeddings = await self.embedder.encode([q.query for q in queries])
+            
+            n_candidates = min(total, max(q.limit for q in queries) * max(1, oversample))
+            results = collection.query(
+                query_embeddings=embeddings,
+                n_results=n_candidates
+            )
+            
+            short_indexes = []
+            for index, plan in enumerate(queries):
+                candidates = self._format_query_results(results, index)
+                sections[plan.name] = [m for m in candidates if plan.matches(m['metadata'])][:plan.limit]
+                # 候选集未覆盖整个集合时，过滤后数量不足的查询需要补充检索
+                if len(sections[plan.name]) < plan.limit and n_candidates < total:
+                    short_indexes.append(index)
+            
+            if short_indexes:
+                short_plans = [queries[i] for i in short_indexes]
+                filters = [
+                    self._build_where_filter(plan.memory_types, plan.min_importance)
+                    for plan in short_plans
+                ]
+                if len(filters) == 1:
+                    where = filters[0]
+                elif all(filters):
+                    where = {"$or": filters}
+                else:
+                    where = None
+                
+                filtered_results = collection.query(
+                    query_embeddings=[embeddings[i] for i in short_indexes],
+                    n_results=min(total, max(plan.limit for plan in short_plans) * max(1, oversample)),
+                    where=where
+                )
+                for position, plan in enumerate(short_plans):
+                    candidates = self._format_query_results(filtered_results, position)
+                    sections[plan.name] = [m for m in candidates if plan.matches(m['metadata'])][:plan.limit]
+            
+            logger.info(
+                f"🔍 批量语义检索完成: {len(queries)}个查询, 候选{n_candidates}条, "
+                f"补充检索{len(short_indexes)}个查询"
+            )
+            return sections
+            
+        except Exception as e:
+            logger.error(f"❌ 批量搜索记忆失败: {str(e)}")
+            return sections
+    
     async def get_recent_memories(
         self,
         user_id: str,
@@ -620,58 +771,40 @@ class MemoryService:
             recent_count=3, min_importance=0.5
         )
         
-        # 2. 语义搜索相关记忆
-        relevant = await self.search_memories(
-            user_id=user_id,
-            project_id=project_id,
-            query=chapter_outline,
-            limit=10,
-            min_importance=0.4
-        )
-        
-        # 3. 查找未完结伏笔
+        # 2. 查找未完结伏笔
         foreshadows = await self.find_unresolved_foreshadows(
             user_id, project_id, current_chapter
         )
         
-        # 4. 如果有指定角色,获取角色相关记忆
-        character_memories = []
-        if character_names:
-            character_query = " ".join(character_names) + " 角色 状态 关系"
-            character_memories = await self.search_memories(
-                user_id=user_id,
-                project_id=project_id,
-                query=character_query,
-                memory_types=["character_event", "plot_point"],
-                limit=8
-            )
-        
-        # 5. 获取重要情节点
-        # 注意：ChromaDB的where条件需要特殊处理，不能同时使用多个顶层条件
-        try:
-            plot_points = await self.search_memories(
-                user_id=user_id,
-                project_id=project_id,
+        # 3. 语义检索计划：相关记忆、角色相关记忆(如果有指定角色)、重要情节点
+        # 所有查询一次编码、一次检索，再按各自条件分发
+        plan = [
+            RetrievalQuery(
+                name="relevant",
+                query=chapter_outline,
+                limit=10,
+                min_importance=0.4
+            ),
+            RetrievalQuery(
+                name="plot_points",
                 query="重要 转折 高潮 关键",
                 memory_types=["plot_point", "hook"],
                 limit=5,
                 min_importance=0.7
             )
-        except Exception as e:
-            logger.error(f"❌ 搜索记忆失败: {str(e)}")
-            # 降级处理：分别查询
-            plot_points = []
-            try:
-                plot_points = await self.search_memories(
-                    user_id=user_id,
-                    project_id=project_id,
-                    query="重要 转折 高潮 关键",
-                    memory_types=["plot_point", "hook"],
-                    limit=5
-                )
-            except Exception as e2:
-                logger.warning(f"⚠️ 降级查询也失败: {str(e2)}")
-                plot_points = []
+        ]
+        if character_names:
+            plan.append(RetrievalQuery(
+                name="characters",
+                query=" ".join(character_names) + " 角色 状态 关系",
+                memory_types=["character_event", "plot_point"],
+                limit=8
+            ))
+        
+        sections = await self.multi_search_memories(user_id, project_id, plan)
+        relevant = sections["relevant"]
+        plot_points = sections["plot_points"]
+        character_memories = sections.get("characters", [])
         
         context = {
             "recent_context": self._format_memories(recent, "最近章节记忆"),
@@ -827,7 +960,7 @@ class MemoryService:
             
             if content:
                 # 重新生成embedding
-                embedding = self.embedding_model.encode(content).tolist()
+                embedding = await self.embedder.encode_one(content)
                 update_data['embeddings'] = [embedding]
                 update_data['documents'] = [content]
             
@@ -882,7 +1015,8 @@ class MemoryService:
                     "total_count": 0,
                     "by_type": {},
                     "by_chapter": {},
-                    "foreshadow_count": 0
+                    "foreshadow_count": 0,
+                    "embedding": self.embedder.get_stats()
                 }
             
             # 统计各类型数量
@@ -906,7 +1040,8 @@ class MemoryService:
                 "by_type": type_counts,
                 "by_chapter": chapter_counts,
                 "foreshadow_count": foreshadow_count,
-                "foreshadow_resolved": sum(1 for m in all_memories['metadatas'] if m.get('is_foreshadow') == 2)
+                "foreshadow_resolved": sum(1 for m in all_memories['metadatas'] if m.get('is_foreshadow') == 2),
+                "embedding": self.embedder.get_stats()
             }
             
             logger.info(f"📊 记忆统计: 总计{stats['total_count']}条, 伏笔{foreshadow_count}个")
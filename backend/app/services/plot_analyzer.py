@@ -1,8 +1,9 @@
 """剧情分析服务 - 自动分析章节的钩子、伏笔、冲突等元素"""
-from typing import Dict, Any, List, Optional, Callable, Awaitable
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.ai_service import AIService
 from app.services.prompt_service import prompt_service, PromptService
+from app.config import settings
 from app.logger import get_logger
 import json
 import re
@@ -44,6 +45,9 @@ class PlotAnalyzer:
         """
         分析单章内容（带重试机制）
         
+        超过 plot_analysis_segment_chars 的长章节切分为相互重叠的片段并发分析，
+        再合并为一份完整的分析结果（见 _analyze_in_segments）。
+        
         Args:
             chapter_number: 章节号
             title: 章节标题
@@ -61,9 +65,6 @@ class PlotAnalyzer:
         """
         logger.info(f"🔍 开始分析第{chapter_number}章: {title}")
         
-        # 如果内容过长,截取前8000字(避免超token)
-        analysis_content = content[:8000] if len(content) > 8000 else content
-        
         # 获取自定义提示词模板
         try:
             if user_id and db:
@@ -77,6 +78,20 @@ class PlotAnalyzer:
         
         # 格式化已有伏笔列表
         foreshadows_text = self._format_existing_foreshadows(existing_foreshadows)
+        characters_text = characters_info if characters_info else "（暂无角色信息）"
+        
+        # 长章节分段并发分析后合并（单次分析需要截断，会丢失后半章的钩子、伏笔和角色变化）
+        if len(content) > settings.plot_analysis_segment_chars:
+            return await self._analyze_in_segments(
+                chapter_number=chapter_number,
+                title=title,
+                content=content,
+                template=template,
+                foreshadows_text=foreshadows_text,
+                characters_text=characters_text,
+                max_retries=max_retries,
+                on_retry=on_retry
+            )
         
         # 格式化提示词
         prompt = PromptService.format_prompt(
@@ -84,17 +99,45 @@ class PlotAnalyzer:
             chapter_number=chapter_number,
             title=title,
             word_count=word_count,
-            content=analysis_content,
+            content=content,
             existing_foreshadows=foreshadows_text,
-            characters_info=characters_info if characters_info else "（暂无角色信息）"
+            characters_info=characters_text
         )
+        return await self._analyze_prompt(
+            prompt=prompt,
+            label=f"第{chapter_number}章",
+            content_length=len(content),
+            max_retries=max_retries,
+            on_retry=on_retry
+        )
+    
+    async def _analyze_prompt(
+        self,
+        prompt: str,
+        label: str,
+        content_length: int,
+        max_retries: int,
+        on_retry: Optional[OnRetryCallback]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        调用AI执行一次分析（带重试机制）
+        
+        Args:
+            prompt: 已格式化的分析提示词
+            label: 日志中的分析对象描述（如"第3章"、"第3章片段2/4"）
+            content_length: 被分析内容的长度（用于日志）
+            max_retries: 最大重试次数
+            on_retry: 重试回调
         
+        Returns:
+            分析结果字典,失败返回None
+        """
         last_error = None
         logger.debug(f"章节分析提示词{prompt}")
         for attempt in range(1, max_retries + 1):
             try:
                 # 调用AI进行分析
-                logger.info(f"  📡 调用AI分析(内容长度: {len(analysis_content)}字, 尝试 {attempt}/{max_retries})...")
+                logger.info(f"  📡 调用AI分析{label}(内容长度: {content_length}字, 尝试 {attempt}/{max_retries})...")
                 accumulated_text = ""
                 
                 try:
@@ -129,7 +172,7 @@ class PlotAnalyzer:
                         await asyncio.sleep(wait_time)
                         continue
                     else:
-                        logger.error(f"❌ 第{chapter_number}章分析失败: AI响应为空，已达最大重试次数")
+                        logger.error(f"❌ {label}分析失败: AI响应为空，已达最大重试次数")
                         return None
                 
                 # 提取内容
@@ -140,7 +183,7 @@ class PlotAnalyzer:
                 analysis_result = self._parse_analysis_response(response_text)
                 
                 if analysis_result:
-                    logger.info(f"✅ 第{chapter_number}章分析完成 (尝试 {attempt}/{max_retries})")
+                    logger.info(f"✅ {label}分析完成 (尝试 {attempt}/{max_retries})")
                     logger.info(f"  - 钩子: {len(analysis_result.get('hooks', []))}个")
                     logger.info(f"  - 伏笔: {len(analysis_result.get('foreshadows', []))}个")
                     logger.info(f"  - 情节点: {len(analysis_result.get('plot_points', []))}个")
@@ -162,7 +205,7 @@ class PlotAnalyzer:
                         await asyncio.sleep(wait_time)
                         continue
                     else:
-                        logger.error(f"❌ 第{chapter_number}章分析失败: JSON解析错误，已达最大重试次数")
+                        logger.error(f"❌ {label}分析失败: JSON解析错误，已达最大重试次数")
                         return None
                     
             except Exception as e:
@@ -181,13 +224,364 @@ class PlotAnalyzer:
                     await asyncio.sleep(wait_time)
                     continue
                 else:
-                    logger.error(f"❌ 第{chapter_number}章分析失败: {last_error}，已达最大重试次数")
+                    logger.error(f"❌ {label}分析失败: {last_error}，已达最大重试次数")
                     return None
         
         # 不应该到达这里，但作为安全措施
-        logger.error(f"❌ 第{chapter_number}章分析失败: {last_error}")
+        logger.error(f"❌ {label}分析失败: {last_error}")
         return None
     
+    # ==================== 长章节分段分析 ====================
+    
+    def _split_segments(self, content: str, segment_chars: int, overlap: int) -> List[Tuple[int, str]]:
+        """
+        将长文本切分为相互重叠的片段
+        
+        片段尽量在段落（换行）处结束；相邻片段重叠 overlap 字，
+        避免跨越切分点的情节在两个片段中都不完整。
+        
+        Returns:
+            [(片段在原文中的起始位置, 片段文本)]
+        """
+        overlap = max(0, min(overlap, segment_chars // 2))
+        segments = []
+        start = 0
+        total = len(content)
+        while start < total:
+            end = min(start + segment_chars, total)
+            if end < total:
+                # 在片段后半部分寻找最后一个换行作为切分点
+                cut = content.rfind("\n", start + segment_chars // 2, end)
+                if cut != -1:
+                    end = cut + 1
+            segments.append((start, content[start:end]))
+            if end >= total:
+                break
+            next_start = end - overlap
+            # 下一片段从重叠区内的段落开头开始
+            newline = content.find("\n", next_start, end)
+            if newline != -1 and newline + 1 < end:
+                next_start = newline + 1
+            start = max(next_start, start + 1)
+        return segments
+    
+    async def _analyze_in_segments(
+        self,
+        chapter_number: int,
+        title: str,
+        content: str,
+        template: str,
+        foreshadows_text: str,
+        characters_text: str,
+        max_retries: int,
+        on_retry: Optional[OnRetryCallback]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        长章节分段分析（map-reduce）
+        
+        - map：各片段使用同一提示词模板并发分析（最多 plot_analysis_segment_concurrency 个同时进行）
+        - reduce：合并钩子、伏笔、情节点、角色状态等，关键词位置换算为全文偏移（见 _merge_segment_results）
+        任一片段重试后仍失败时整章分析失败（不返回缺失部分内容的结果）。
+        片段的重试回调加锁串行执行，错误原因前标注片段序号与该片段的重试次数。
+        """
+        segments = self._split_segments(
+            content,
+            settings.plot_analysis_segment_chars,
+            settings.plot_analysis_segment_overlap
+        )
+        total = len(segments)
+        logger.info(f"📚 第{chapter_number}章共{len(content)}字，分为{total}个片段并发分析")
+        
+        semaphore = asyncio.Semaphore(max(1, settings.plot_analysis_segment_concurrency))
+        # 片段并发重试时串行调用回调（调用方通常在回调中使用同一个数据库会话）
+        retry_lock = asyncio.Lock()
+        # 各片段的重试次数；上报的次数取所有片段的最大值，避免进度随片段交替来回跳动
+        segment_attempts = [0] * total
+        
+        def segment_retry_callback(index: int) -> Optional[OnRetryCallback]:
+            if not on_retry:
+                return None
+            
+            async def report(attempt: int, max_attempts: int, wait_time: int, error_reason: str):
+                async with retry_lock:
+                    segment_attempts[index] = attempt
+                    await on_retry(
+                        max(segment_attempts),
+                        max_attempts,
+                        wait_time,
+                        f"片段{index + 1}/{total}第{attempt}次重试：{error_reason}"
+                    )
+            
+            return report
+        
+        async def analyze_segment(index: int, start: int, text: str) -> Optional[Dict[str, Any]]:
+            prompt = PromptService.format_prompt(
+                template,
+                chapter_number=chapter_number,
+                title=f"{title}（片段{index + 1}/{total}，原文第{start + 1}-{start + len(text)}字）",
+                word_count=len(text),
+                content=text,
+                existing_foreshadows=foreshadows_text,
+                characters_info=characters_text
+            )
+            async with semaphore:
+                return await self._analyze_prompt(
+                    prompt=prompt,
+                    label=f"第{chapter_number}章片段{index + 1}/{total}",
+                    content_length=len(text),
+                    max_retries=max_retries,
+                    on_retry=segment_retry_callback(index)
+                )
+        
+        results = await asyncio.gather(*(
+            analyze_segment(index, start, text) for index, (start, text) in enumerate(segments)
+        ))
+        
+        failed = [index + 1 for index, result in enumerate(results) if not result]
+        if failed:
+            logger.error(f"❌ 第{chapter_number}章分析失败: 片段{failed}分析失败")
+            return None
+        
+        merged = self._merge_segment_results(segments, results, len(content))
+        logger.info(f"✅ 第{chapter_number}章分段分析合并完成")
+        logger.info(f"  - 钩子: {len(merged.get('hooks', []))}个")
+        logger.info(f"  - 伏笔: {len(merged.get('foreshadows', []))}个")
+        logger.info(f"  - 情节点: {len(merged.get('plot_points', []))}个")
+        logger.info(f"  - 整体评分: {merged.get('scores', {}).get('overall', 'N/A')}")
+        return merged
+    
+    def _merge_segment_results(
+        self,
+        segments: List[Tuple[int, str]],
+        results: List[Dict[str, Any]],
+        content_length: int
+    ) -> Dict[str, Any]:
+        """
+        合并各片段的分析结果为单章结果
+        
+        - 钩子/伏笔/情节点：关键词在所属片段内定位后加上片段起始偏移，写入 text_position/text_length；
+          重叠区被两个片段重复识别的条目（钩子、情节点为同一位置，伏笔为同一标题或回收ID）去重，
+          保留强度/重要性更高的一条，按全文位置排序；
+          钩子的 position（开头/中段/结尾）按全文位置重新判断
+        - 角色状态：同一角色合并，state_before 取最早片段、state_after 取最晚片段
+        - 评分与比例：按片段长度加权平均；剧情阶段取最后一个片段
+        """
+        weights = [len(text) for _, text in segments]
+        merged: Dict[str, Any] = {}
+        
+        # 1. 可定位的条目
+        hooks = self._merge_located_items(
+            segments, results, "hooks", "strength",
+            key=lambda item: (item.get('type'), item.get('keyword') or item.get('content'), item['text_position'])
+        )
+        for hook in hooks:
+            position = hook.get('text_position', -1)
+            if position >= 0:
+                ratio = position / max(content_length, 1)
+                hook['position'] = "开头" if ratio < 1 / 3 else ("中段" if ratio < 2 / 3 else "结尾")
+        merged['hooks'] = hooks
+        merged['foreshadows'] = self._merge_located_items(
+            segments, results, "foreshadows", "strength",
+            key=lambda item: (
+                item.get('type'),
+                item.get('reference_foreshadow_id') or item.get('title') or item.get('keyword')
+            )
+        )
+        merged['plot_points'] = self._merge_located_items(
+            segments, results, "plot_points", "importance",
+            key=lambda item: (item.get('keyword') or item.get('content'), item['text_position'])
+        )
+        
+        # 2. 角色与组织状态（按名称合并，后面片段的变化覆盖前面）
+        merged['character_states'] = self._merge_character_states(results)
+        organization_states: Dict[str, Dict[str, Any]] = {}
+        for result in results:
+            for org_state in result.get('organization_states') or []:
+                name = org_state.get('organization_name')
+                if not name:
+                    continue
+                existing = organization_states.get(name)
+                if existing is None:
+                    organization_states[name] = dict(org_state)
+                    continue
+                existing['power_change'] = (existing.get('power_change') or 0) + (org_state.get('power_change') or 0)
+                for field in ('new_location', 'new_purpose', 'status_description'):
+                    if org_state.get(field):
+                        existing[field] = org_state[field]
+                existing['key_event'] = self._join_text(existing.get('key_event'), org_state.get('key_event'))
+                existing['is_destroyed'] = bool(existing.get('is_destroyed') or org_state.get('is_destroyed'))
+        merged['organization_states'] = list(organization_states.values())
+        
+        # 3. 冲突：类型/各方取并集，强度取最大，解决进度取最后一个片段
+        conflicts = [result.get('conflict') or {} for result in results]
+        if any(conflicts):
+            merged['conflict'] = {
+                'types': self._unique([t for c in conflicts for t in c.get('types') or []]),
+                'parties': self._unique([p for c in conflicts for p in c.get('parties') or []]),
+                'level': max((c.get('level') or 0) for c in conflicts),
+                'description': self._join_text(*(c.get('description') for c in conflicts)),
+                'resolution_progress': next(
+                    (c['resolution_progress'] for c in reversed(conflicts) if c.get('resolution_progress') is not None),
+                    0
+                )
+            }
+        
+        # 4. 情感曲线：主导情绪取强度最高的片段，曲线按片段顺序衔接
+        arcs = [result.get('emotional_arc') or {} for result in results]
+        if any(arcs):
+            strongest = max(arcs, key=lambda arc: arc.get('intensity') or 0)
+            merged['emotional_arc'] = {
+                'primary_emotion': strongest.get('primary_emotion', ''),
+                'intensity': strongest.get('intensity') or 0,
+                'curve': "→".join(arc['curve'] for arc in arcs if arc.get('curve')),
+                'secondary_emotions': self._unique([e for arc in arcs for e in arc.get('secondary_emotions') or []])
+            }
+        
+        # 5. 场景（按地点去重）
+        scenes = []
+        seen_locations = set()
+        for result in results:
+            for scene in result.get('scenes') or []:
+                location = scene.get('location') if isinstance(scene, dict) else scene
+                if location in seen_locations:
+                    continue
+                seen_locations.add(location)
+                scenes.append(scene)
+        merged['scenes'] = scenes
+        
+        # 6. 评分与比例（按片段长度加权）
+        scores: Dict[str, Any] = {}
+        for field in ('pacing', 'engagement', 'coherence', 'overall'):
+            value = self._weighted_average([(result.get('scores') or {}).get(field) for result in results], weights)
+            if value is not None:
+                scores[field] = round(value, 1)
+        justification = self._join_text(*((result.get('scores') or {}).get('score_justification') for result in results))
+        if justification:
+            scores['score_justification'] = justification
+        merged['scores'] = scores
+        for field in ('dialogue_ratio', 'description_ratio'):
+            value = self._weighted_average([result.get(field) for result in results], weights)
+            if value is not None:
+                merged[field] = round(value, 2)
+        
+        pacings = [result.get('pacing') for result in results if result.get('pacing')]
+        if pacings:
+            merged['pacing'] = pacings[0] if len(set(pacings)) == 1 else "varied"
+        stages = [result.get('plot_stage') for result in results if result.get('plot_stage')]
+        if stages:
+            merged['plot_stage'] = stages[-1]
+        merged['suggestions'] = self._unique([s for result in results for s in result.get('suggestions') or []])
+        summary = self._join_text(*(result.get('summary') for result in results))
+        if summary:
+            merged['summary'] = summary
+        
+        merged['segments'] = [{"start": start, "length": len(text)} for start, text in segments]
+        return merged
+    
+    def _merge_located_items(
+        self,
+        segments: List[Tuple[int, str]],
+        results: List[Dict[str, Any]],
+        field: str,
+        rank_field: str,
+        key: Callable[[Dict[str, Any]], Any]
+    ) -> List[Dict[str, Any]]:
+        """合并各片段的可定位条目：换算全文位置、去重并按位置排序"""
+        merged: Dict[Any, Dict[str, Any]] = {}
+        for (start, text), result in zip(segments, results):
+            for item in result.get(field) or []:
+                if not isinstance(item, dict):
+                    continue
+                item = dict(item)
+                position, length = self._find_text_position(text, item.get('keyword', ''))
+                item['text_position'] = start + position if position >= 0 else -1
+                item['text_length'] = length
+                
+                item_key = key(item)
+                existing = merged.get(item_key)
+                if existing is None:
+                    merged[item_key] = item
+                    continue
+                # 重叠区重复识别：保留强度/重要性更高的一条，位置缺失时用另一条补全
+                if (item.get(rank_field) or 0) > (existing.get(rank_field) or 0):
+                    if item['text_position'] < 0:
+                        item['text_position'] = existing['text_position']
+                        item['text_length'] = existing['text_length']
+                    merged[item_key] = item
+                elif existing['text_position'] < 0 and item['text_position'] >= 0:
+                    existing['text_position'] = item['text_position']
+                    existing['text_length'] = item['text_length']
+        
+        # 定位到的按全文位置排序，未定位的保持片段顺序排在最后
+        items = list(merged.values())
+        return sorted(
+            items,
+            key=lambda item: (item['text_position'] < 0, item['text_position'])
+        )
+    
+    def _merge_character_states(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按角色合并各片段的状态变化"""
+        states: Dict[str, Dict[str, Any]] = {}
+        for result in results:
+            for state in result.get('character_states') or []:
+                if not isinstance(state, dict):
+                    continue
+                name = state.get('character_name')
+                if not name:
+                    continue
+                existing = states.get(name)
+                if existing is None:
+                    states[name] = dict(state)
+                    continue
+                if state.get('state_after'):
+                    existing['state_after'] = state['state_after']
+                if not existing.get('state_before'):
+                    existing['state_before'] = state.get('state_before')
+                for field in ('psychological_change', 'key_event'):
+                    existing[field] = self._join_text(existing.get(field), state.get(field))
+                if state.get('survival_status'):
+                    existing['survival_status'] = state['survival_status']
+                if state.get('relationship_changes'):
+                    existing['relationship_changes'] = {
+                        **(existing.get('relationship_changes') or {}),
+                        **state['relationship_changes']
+                    }
+                if state.get('career_changes'):
+                    existing['career_changes'] = state['career_changes']
+                if state.get('organization_changes'):
+                    seen = {
+                        (change.get('organization_name'), change.get('change_type'))
+                        for change in existing.get('organization_changes') or []
+                    }
+                    existing['organization_changes'] = list(existing.get('organization_changes') or []) + [
+                        change for change in state['organization_changes']
+                        if (change.get('organization_name'), change.get('change_type')) not in seen
+                    ]
+        return list(states.values())
+    
+    @staticmethod
+    def _unique(values: List[Any]) -> List[Any]:
+        """保持顺序去重"""
+        unique = []
+        for value in values:
+            if value not in unique:
+                unique.append(value)
+        return unique
+    
+    @staticmethod
+    def _join_text(*texts: Optional[str]) -> str:
+        """拼接多个片段的描述文本（去空、去重）"""
+        return "；".join(PlotAnalyzer._unique([text for text in texts if text]))
+    
+    @staticmethod
+    def _weighted_average(values: List[Any], weights: List[int]) -> Optional[float]:
+        """忽略缺失值的加权平均"""
+        pairs = [(float(value), weight) for value, weight in zip(values, weights) if isinstance(value, (int, float))]
+        total_weight = sum(weight for _, weight in pairs)
+        if not total_weight:
+            return None
+        return sum(value * weight for value, weight in pairs) / total_weight
+    
     def _format_existing_foreshadows(self, foreshadows: Optional[List[Dict[str, Any]]]) -> str:
         """
         格式化已有伏笔列表，用于注入到分析提示词中
@@ -357,7 +751,7 @@ class PlotAnalyzer:
             for i, hook in enumerate(analysis.get('hooks', [])):
                 if hook.get('strength', 0) >= 6:  # 只保存强度>=6的钩子
                     keyword = hook.get('keyword', '')
-                    position, length = self._find_text_position(chapter_content, keyword)
+                    position, length = self._item_position(hook, chapter_content)
                     
                     logger.info(f"  钩子位置: keyword='{keyword[:30]}...', pos={position}, len={length}")
                     
@@ -383,7 +777,7 @@ class PlotAnalyzer:
             for i, foreshadow in enumerate(analysis.get('foreshadows', [])):
                 is_planted = foreshadow.get('type') == 'planted'
                 keyword = foreshadow.get('keyword', '')
-                position, length = self._find_text_position(chapter_content, keyword)
+                position, length = self._item_position(foreshadow, chapter_content)
                 
                 logger.info(f"  伏笔位置: keyword='{keyword[:30]}...', pos={position}, len={length}")
                 
@@ -410,7 +804,7 @@ class PlotAnalyzer:
             for i, plot_point in enumerate(analysis.get('plot_points', [])):
                 if plot_point.get('importance', 0) >= 0.6:  # 只保存重要性>=0.6的情节点
                     keyword = plot_point.get('keyword', '')
-                    position, length = self._find_text_position(chapter_content, keyword)
+                    position, length = self._item_position(plot_point, chapter_content)
                     
                     logger.info(f"  情节点位置: keyword='{keyword[:30]}...', pos={position}, len={length}")
                     
@@ -480,6 +874,18 @@ class PlotAnalyzer:
             logger.error(f"❌ 提取记忆失败: {str(e)}")
             return []
     
+    def _item_position(self, item: Dict[str, Any], full_text: str) -> tuple[int, int]:
+        """
+        获取分析条目在全文中的位置
+        
+        分段分析的条目已在所属片段内定位并换算为全文偏移（text_position/text_length），直接使用；
+        否则在全文中查找关键词（同一关键词多次出现时只能取第一次）。
+        """
+        position = item.get('text_position')
+        if isinstance(position, int) and 0 <= position < len(full_text):
+            return (position, item.get('text_length') or len(item.get('keyword', '')))
+        return self._find_text_position(full_text, item.get('keyword', ''))
+    
     def _find_text_position(self, full_text: str, keyword: str) -> tuple[int, int]:
         """
         在全文中查找关键词位置
@@ -1,7 +1,8 @@
 """大纲剧情展开服务 - 将大纲节点展开为多个章节"""
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import AsyncGenerator, List, Dict, Any, Optional, Sequence, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
 import json
 
 from app.models.outline import Outline
@@ -10,6 +11,7 @@ from app.models.character import Character
 from app.models.chapter import Chapter
 from app.services.ai_service import AIService
 from app.services.prompt_service import prompt_service, PromptService
+from app.config import settings
 from app.logger import get_logger
 
 logger = get_logger(__name__)
@@ -287,6 +289,67 @@ class PlotExpansionService:
         logger.info(f"分批生成完成，共生成 {len(all_chapter_plans)} 个章节规划")
         return all_chapter_plans
     
+    async def analyze_outlines_concurrently(
+        self,
+        outlines: Sequence[Outline],
+        project: Project,
+        concurrency: Optional[int] = None,
+        **analyze_kwargs
+    ) -> AsyncGenerator[Tuple[Outline, Optional[List[Dict[str, Any]]], Optional[Exception]], None]:
+        """
+        并发分析多个大纲，按传入顺序逐个产出 (大纲, 章节规划, 异常)
+        
+        每个大纲的展开提示词只依赖自身和项目上下文，可以互不等待地调用AI：
+        - 最多 concurrency 个大纲同时分析（默认 outline_expand_concurrency），实际请求速率仍受提供商限流器约束
+        - AsyncSession 不能并发使用，每个分析任务使用独立的数据库会话（只读）
+        - 结果按大纲顺序产出：后面的大纲先完成时等待前面的大纲
+        - 单个大纲失败不影响其他大纲，异常随结果产出
+        - 调用方停止迭代时取消尚未完成的分析
+        
+        Args:
+            outlines: 大纲列表（按产出顺序）
+            project: 项目对象
+            concurrency: 并发数，1为串行
+            **analyze_kwargs: 透传给 analyze_outline_for_chapters 的参数
+        """
+        from app.database import get_session_factory
+        
+        if not outlines:
+            return
+        
+        concurrency = concurrency or settings.outline_expand_concurrency
+        concurrency = max(1, min(concurrency, settings.outline_expand_max_concurrency, len(outlines)))
+        session_factory = await get_session_factory(project.user_id)
+        semaphore = asyncio.Semaphore(concurrency)
+        logger.info(f"🔀 并发展开 {len(outlines)} 个大纲，并发数 {concurrency}")
+        
+        async def analyze(outline: Outline) -> List[Dict[str, Any]]:
+            async with semaphore:
+                async with session_factory() as session:
+                    return await self.analyze_outline_for_chapters(
+                        outline=outline,
+                        project=project,
+                        db=session,
+                        **analyze_kwargs
+                    )
+        
+        tasks = [asyncio.create_task(analyze(outline)) for outline in outlines]
+        try:
+            for outline, task in zip(outlines, tasks):
+                try:
+                    chapter_plans = await task
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    yield outline, None, e
+                else:
+                    yield outline, chapter_plans, None
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
     async def batch_expand_outlines(
         self,
         project_id: str,
@@ -295,10 +358,11 @@ class PlotExpansionService:
         target_chapters_per_outline: int = 3,
         expansion_strategy: str = "balanced",
         provider: Optional[str] = None,
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        concurrency: Optional[int] = None
     ) -> Dict[str, Any]:
         """
-        批量展开所有大纲为章节
+        批量展开所有大纲为章节（最多 concurrency 个大纲并发分析，结果按大纲顺序排列）
         
         Returns:
             {
@@ -333,40 +397,38 @@ class PlotExpansionService:
                 "expansions": []
             }
         
-        # 逐个展开大纲
+        # 并发展开大纲（按大纲顺序汇总）
         expansions = []
         total_chapters = 0
         
-        for outline in outlines:
-            try:
-                chapter_plans = await self.analyze_outline_for_chapters(
-                    outline=outline,
-                    project=project,
-                    db=db,
-                    target_chapter_count=target_chapters_per_outline,
-                    expansion_strategy=expansion_strategy,
-                    provider=provider,
-                    model=model
-                )
-                
-                expansions.append({
-                    "outline_id": outline.id,
-                    "outline_title": outline.title,
-                    "chapter_plans": chapter_plans,
-                    "chapter_count": len(chapter_plans)
-                })
-                
-                total_chapters += len(chapter_plans)
-                logger.info(f"大纲 {outline.title} 展开为 {len(chapter_plans)} 章")
-                
-            except Exception as e:
-                logger.error(f"展开大纲 {outline.id} 失败: {str(e)}")
+        async for outline, chapter_plans, error in self.analyze_outlines_concurrently(
+            outlines,
+            project,
+            concurrency=concurrency,
+            target_chapter_count=target_chapters_per_outline,
+            expansion_strategy=expansion_strategy,
+            provider=provider,
+            model=model
+        ):
+            if error is not None:
+                logger.error(f"展开大纲 {outline.id} 失败: {str(error)}")
                 expansions.append({
                     "outline_id": outline.id,
                     "outline_title": outline.title,
-                    "error": str(e),
+                    "error": str(error),
                     "chapter_count": 0
                 })
+                continue
+            
+            expansions.append({
+                "outline_id": outline.id,
+                "outline_title": outline.title,
+                "chapter_plans": chapter_plans,
+                "chapter_count": len(chapter_plans)
+            })
+            
+            total_chapters += len(chapter_plans)
+            logger.info(f"大纲 {outline.title} 展开为 {len(chapter_plans)} 章")
         
         result = {
             "total_outlines": len(outlines),
@@ -383,7 +445,8 @@ class PlotExpansionService:
         chapter_plans: List[Dict[str, Any]],
         project_id: str,
         db: AsyncSession,
-        start_chapter_number: int = None
+        start_chapter_number: int = None,
+        renumber: bool = True
     ) -> List[Chapter]:
         """
         根据章节规划创建实际的章节记录
@@ -394,6 +457,8 @@ class PlotExpansionService:
             project_id: 项目ID
             db: 数据库会话
             start_chapter_number: 起始章节号（如果为None，则自动计算）
+            renumber: 是否为新章节腾出序号（起始序号及之后的章节整体后移，与插入在同一事务中）；
+                仅在调用方已保证序号不冲突时传False
             
         Returns:
             创建的章节列表
@@ -411,33 +476,24 @@ class PlotExpansionService:
             if not current_outline:
                 raise ValueError(f"大纲 {outline_id} 不存在")
             
-            # 2. 查询所有在当前大纲之前的大纲（按order_index排序）
-            prev_outlines_result = await db.execute(
-                select(Outline)
-                .where(
-                    Outline.project_id == project_id,
-                    Outline.order_index < current_outline.order_index
-                )
-                .order_by(Outline.order_index)
+            # 2. 前面所有大纲已展开的章节总数（一次聚合查询）
+            total_prev_chapters = await self._count_chapters_before(
+                project_id, current_outline.order_index, db
             )
-            prev_outlines = prev_outlines_result.scalars().all()
             
-            # 3. 计算前面所有大纲已展开的章节总数
-            total_prev_chapters = 0
-            for prev_outline in prev_outlines:
-                count_result = await db.execute(
-                    select(func.count(Chapter.id))
-                    .where(
-                        Chapter.project_id == project_id,
-                        Chapter.outline_id == prev_outline.id
-                    )
-                )
-                total_prev_chapters += count_result.scalar() or 0
-            
-            # 4. 起始章节号 = 前面所有大纲的章节数 + 1
+            # 3. 起始章节号 = 前面所有大纲的章节数 + 1
             start_chapter_number = total_prev_chapters + 1
             logger.info(f"自动计算起始章节号: {start_chapter_number} (基于大纲order_index={current_outline.order_index}, 前置章节数={total_prev_chapters})")
         
+        # 为新章节腾出序号：起始序号及之后的章节整体后移（与插入在同一事务中）
+        if renumber and chapter_plans:
+            await self._shift_chapter_numbers(
+                project_id=project_id,
+                from_number=start_chapter_number,
+                delta=len(chapter_plans),
+                db=db
+            )
+        
         chapters = []
         for idx, plan in enumerate(chapter_plans):
             # 保存完整的展开规划数据（JSON格式）
@@ -471,13 +527,6 @@ class PlotExpansionService:
         
         logger.info(f"成功创建 {len(chapters)} 个章节记录（已保存展开规划数据）")
         
-        # 重新排序当前大纲之后的所有章节
-        await self._renumber_subsequent_chapters(
-            project_id=project_id,
-            current_outline_id=outline_id,
-            db=db
-        )
-        
         return chapters
     
     async def _get_outline_context(
@@ -596,6 +645,64 @@ class PlotExpansionService:
             }]
 
 
+    async def renumber_chapters_from(
+        self,
+        project_id: str,
+        outline_id: str,
+        db: AsyncSession
+    ):
+        """从指定大纲开始重新排序后续所有章节序号（批量创建章节后统一调用一次）"""
+        await self._renumber_subsequent_chapters(
+            project_id=project_id,
+            current_outline_id=outline_id,
+            db=db
+        )
+    
+    async def _count_chapters_before(
+        self,
+        project_id: str,
+        order_index: int,
+        db: AsyncSession
+    ) -> int:
+        """统计排在指定大纲顺序之前的所有大纲的章节总数"""
+        result = await db.execute(
+            select(func.count(Chapter.id))
+            .join(Outline, Chapter.outline_id == Outline.id)
+            .where(
+                Chapter.project_id == project_id,
+                Outline.project_id == project_id,
+                Outline.order_index < order_index
+            )
+        )
+        return result.scalar() or 0
+    
+    async def _shift_chapter_numbers(
+        self,
+        project_id: str,
+        from_number: int,
+        delta: int,
+        db: AsyncSession
+    ) -> int:
+        """
+        将项目中序号 >= from_number 的章节序号整体加 delta（一条UPDATE，不逐行加载）
+        
+        (project_id, chapter_number) 只有普通索引没有唯一约束，原地平移不会产生冲突，
+        无需先移到临时区间再移回。
+        
+        Returns:
+            平移的章节数
+        """
+        result = await db.execute(
+            update(Chapter)
+            .where(
+                Chapter.project_id == project_id,
+                Chapter.chapter_number >= from_number
+            )
+            .values(chapter_number=Chapter.chapter_number + delta)
+        )
+        logger.info(f"章节序号 >= {from_number} 的 {result.rowcount} 个章节整体后移 {delta}")
+        return result.rowcount
+    
     async def _renumber_subsequent_chapters(
         self,
         project_id: str,
@@ -603,7 +710,10 @@ class PlotExpansionService:
         db: AsyncSession
     ):
         """
-        重新计算当前大纲之后所有大纲的章节序号
+        重新计算当前大纲及之后所有大纲的章节序号
+        
+        按 (大纲order_index, sub_index) 顺序连续编号，起点为前面大纲的章节总数 + 1，
+        可修复序号空洞或错位。编号由窗口函数计算，一条 UPDATE ... FROM 只写入序号变化的章节。
         
         Args:
             project_id: 项目ID
@@ -622,66 +732,42 @@ class PlotExpansionService:
             logger.warning(f"大纲 {current_outline_id} 不存在，跳过重新排序")
             return
         
-        # 2. 获取当前大纲及之后的所有大纲（按order_index排序）
-        subsequent_outlines_result = await db.execute(
-            select(Outline)
+        # 2. 前面大纲的章节总数决定编号起点
+        base_number = await self._count_chapters_before(
+            project_id, current_outline.order_index, db
+        )
+        
+        # 3. 当前大纲及之后的章节按大纲顺序、子序号连续编号
+        numbered = (
+            select(
+                Chapter.id.label("chapter_id"),
+                (
+                    func.row_number().over(
+                        order_by=(Outline.order_index, Chapter.sub_index, Chapter.chapter_number)
+                    ) + base_number
+                ).label("new_number")
+            )
+            .join(Outline, Chapter.outline_id == Outline.id)
             .where(
+                Chapter.project_id == project_id,
                 Outline.project_id == project_id,
                 Outline.order_index >= current_outline.order_index
             )
-            .order_by(Outline.order_index)
+            .subquery()
         )
-        subsequent_outlines = subsequent_outlines_result.scalars().all()
-        
-        # 3. 计算每个大纲的起始章节号
-        current_chapter_number = 1
-        
-        # 先计算前面大纲的章节总数
-        prev_outlines_result = await db.execute(
-            select(Outline)
+        result = await db.execute(
+            update(Chapter)
             .where(
-                Outline.project_id == project_id,
-                Outline.order_index < current_outline.order_index
+                Chapter.id == numbered.c.chapter_id,
+                Chapter.chapter_number != numbered.c.new_number
             )
-            .order_by(Outline.order_index)
+            .values(chapter_number=numbered.c.new_number)
+            .execution_options(synchronize_session="fetch")
         )
-        prev_outlines = prev_outlines_result.scalars().all()
-        
-        for prev_outline in prev_outlines:
-            count_result = await db.execute(
-                select(func.count(Chapter.id))
-                .where(
-                    Chapter.project_id == project_id,
-                    Chapter.outline_id == prev_outline.id
-                )
-            )
-            current_chapter_number += count_result.scalar() or 0
-        
-        # 4. 逐个大纲更新章节序号
-        updated_count = 0
-        for outline in subsequent_outlines:
-            # 获取该大纲的所有章节（按sub_index排序）
-            chapters_result = await db.execute(
-                select(Chapter)
-                .where(
-                    Chapter.project_id == project_id,
-                    Chapter.outline_id == outline.id
-                )
-                .order_by(Chapter.sub_index)
-            )
-            chapters = chapters_result.scalars().all()
-            
-            # 更新每个章节的chapter_number
-            for chapter in chapters:
-                if chapter.chapter_number != current_chapter_number:
-                    logger.debug(f"更新章节 {chapter.id}: {chapter.chapter_number} -> {current_chapter_number}")
-                    chapter.chapter_number = current_chapter_number
-                    updated_count += 1
-                current_chapter_number += 1
-        
-        # 5. 提交更新
+        
+        # 4. 提交更新
         await db.commit()
-        logger.info(f"重新排序完成，共更新 {updated_count} 个章节的序号")
+        logger.info(f"重新排序完成，共更新 {result.rowcount} 个章节的序号")
 
 
 # 工厂函数
@@ -1,5 +1,5 @@
 """提示词管理服务"""
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import json
 
 
@@ -2582,16 +2582,13 @@ class PromptService:
         Returns:
             包含user和system提示词的字典
         """
-        # 获取用户自定义或系统默认的user提示词
+        # 获取用户自定义或系统默认的user/system提示词
         if user_id and db:
-            user_template = await cls.get_template("MCP_TOOL_TEST", user_id, db)
+            templates = await cls.get_templates(["MCP_TOOL_TEST", "MCP_TOOL_TEST_SYSTEM"], user_id, db)
+            user_template = templates["MCP_TOOL_TEST"]
+            system_template = templates["MCP_TOOL_TEST_SYSTEM"]
         else:
             user_template = cls.MCP_TOOL_TEST
-        
-        # 获取用户自定义或系统默认的system提示词
-        if user_id and db:
-            system_template = await cls.get_template("MCP_TOOL_TEST_SYSTEM", user_id, db)
-        else:
             system_template = cls.MCP_TOOL_TEST_SYSTEM
         
         return {
@@ -2640,36 +2637,57 @@ class PromptService:
         Returns:
             提示词模板内容
         """
-        from sqlalchemy import select
-        from app.models.prompt_template import PromptTemplate
-        from app.logger import get_logger
-        
-        logger = get_logger(__name__)
+        templates = await cls.get_templates([template_key], user_id, db)
+        return templates[template_key]
+    
+    @classmethod
+    async def get_templates(cls,
+                           template_keys: List[str],
+                           user_id: str,
+                           db) -> Dict[str, Optional[str]]:
+        """
+        批量获取提示词模板（优先用户自定义）
         
-        # 1. 尝试从数据库获取用户自定义模板
-        result = await db.execute(
-            select(PromptTemplate).where(
-                PromptTemplate.user_id == user_id,
-                PromptTemplate.template_key == template_key,
-                PromptTemplate.is_active == True
-            )
-        )
-        custom_template = result.scalar_one_or_none()
+        用户的自定义模板按用户缓存，一次查询即可解析任意多个模板键，
+        缓存命中时不访问数据库。
         
-        if custom_template:
-            logger.info(f"✅ 使用用户自定义提示词: user_id={user_id}, template_key={template_key}, template_name={custom_template.template_name}")
-            return custom_template.template_content
+        Args:
+            template_keys: 模板键名列表
+            user_id: 用户ID
+            db: 数据库会话
+            
+        Returns:
+            模板键名 -> 提示词模板内容（系统默认模板也不存在时为None）
+        """
+        from app.services.prompt_template_cache import prompt_template_cache
+        from app.logger import get_logger
         
-        # 2. 降级到系统默认模板
-        logger.info(f"⚪ 使用系统默认提示词: user_id={user_id}, template_key={template_key} (未找到自定义模板)")
+        logger = get_logger(__name__)
         
-        # 直接从类属性获取系统默认模板
-        template_content = getattr(cls, template_key, None)
+        # 1. 用户自定义模板（带缓存）
+        custom_templates = await prompt_template_cache.get_user_templates(user_id, db) if user_id else {}
         
-        if template_content is None:
-            logger.warning(f"⚠️ 未找到系统默认模板: {template_key}")
+        resolved = {}
+        for template_key in template_keys:
+            custom_template = custom_templates.get(template_key)
+            if custom_template:
+                template_name, template_content = custom_template
+                logger.info(f"✅ 使用用户自定义提示词: user_id={user_id}, template_key={template_key}, template_name={template_name}")
+                resolved[template_key] = template_content
+                continue
+            
+            # 2. 降级到系统默认模板
+            logger.info(f"⚪ 使用系统默认提示词: user_id={user_id}, template_key={template_key} (未找到自定义模板)")
+            
+            # 直接从类属性获取系统默认模板
+            template_content = getattr(cls, template_key, None)
+            
+            if template_content is None:
+                logger.warning(f"⚠️ 未找到系统默认模板: {template_key}")
+            
+            resolved[template_key] = template_content
         
-        return template_content
+        return resolved
     
     @classmethod
     def get_all_system_templates(cls) -> list:
@@ -0,0 +1,151 @@
+"""提示词模板缓存 - 按用户缓存自定义提示词模板
+
+组装提示词时需要按模板键解析“用户自定义模板优先，否则系统默认”。
+每个用户启用中的自定义模板一次查询全部读出并缓存，之后任意模板键的解析都不再访问数据库。
+
+失效：
+- SQLAlchemy Session 事件：after_flush 收集本次事务写入的模板所属用户，after_commit 提交成功后失效，
+  提示词模板接口（创建/更新/删除/重置/导入）无需逐个调用
+- ORM 批量 UPDATE/DELETE 无法确定用户时清空全部缓存
+- 多进程部署时其他进程的修改最多延迟 prompt_template_cache_ttl_seconds 生效
+"""
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.logger import get_logger
+from app.models.prompt_template import PromptTemplate
+
+logger = get_logger(__name__)
+
+_PENDING_KEY = "prompt_template_cache_pending"
+# 批量语句无法确定用户时的标记
+_ALL_USERS = object()
+
+# 模板键 -> (模板名称, 模板内容)
+UserTemplates = Dict[str, Tuple[str, str]]
+
+
+class PromptTemplateCache:
+    """用户自定义提示词模板缓存"""
+
+    def __init__(self, ttl: float = 300.0, max_users: int = 512):
+        self.ttl = ttl
+        self.max_users = max_users
+        # 用户ID -> (过期时间, 模板)
+        self._entries: "OrderedDict[str, Tuple[float, UserTemplates]]" = OrderedDict()
+        # 失效计数：查询期间发生失效时不回填缓存
+        self._invalidations = 0
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    async def get_user_templates(self, user_id: str, db: AsyncSession) -> UserTemplates:
+        """获取用户启用中的全部自定义模板（未命中时一次查询读出）"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            expires_at, templates = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return templates
+            self._entries.pop(user_id, None)
+
+        self._stats["misses"] += 1
+        generation = self._invalidations
+        result = await db.execute(
+            select(
+                PromptTemplate.template_key,
+                PromptTemplate.template_name,
+                PromptTemplate.template_content,
+            ).where(
+                PromptTemplate.user_id == user_id,
+                PromptTemplate.is_active == True
+            )
+        )
+        templates: UserTemplates = {
+            row.template_key: (row.template_name, row.template_content) for row in result
+        }
+        # 当前会话中有未提交的模板修改时，读到的内容可能被回滚，不写入缓存
+        if generation == self._invalidations and _PENDING_KEY not in db.sync_session.info and self.ttl > 0:
+            self._entries[user_id] = (time.monotonic() + self.ttl, templates)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return templates
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """失效用户的模板缓存；user_id 为空时清空全部"""
+        self._invalidations += 1
+        self._stats["invalidations"] += 1
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        total = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "users": len(self._entries),
+            "hit_rate": round(self._stats["hits"] / total, 4) if total else 0.0,
+        }
+
+
+# 全局实例
+prompt_template_cache = PromptTemplateCache(
+    ttl=settings.prompt_template_cache_ttl_seconds,
+    max_users=settings.prompt_template_cache_max_users,
+)
+
+
+# ==================== Session事件：模板写入后自动失效 ====================
+
+def _pending(session: Session) -> Set[Any]:
+    return session.info.setdefault(_PENDING_KEY, set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_template_changes(session: Session, flush_context):
+    """收集本次flush写入的模板所属用户"""
+    pending = None
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, PromptTemplate):
+            continue
+        if pending is None:
+            pending = _pending(session)
+        pending.add(obj.user_id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_template_changes(orm_execute_state):
+    """ORM批量UPDATE/DELETE无法逐行确定用户，提交后清空全部缓存"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is PromptTemplate:
+        _pending(orm_execute_state.session).add(_ALL_USERS)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_changes(session: Session):
+    """事务提交后失效对应用户的缓存"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    if _ALL_USERS in pending:
+        prompt_template_cache.invalidate()
+        return
+    for user_id in pending:
+        prompt_template_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_changes(session: Session):
+    """事务回滚时丢弃未提交的变更"""
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,272 @@
+"""任务事件总线 - 长任务进度推送与即时取消
+
+批量生成任务、章节分析任务的状态变化以事件形式按项目广播：
+- 事件来源是 SQLAlchemy Session 事件：after_flush 收集写入的任务行快照，
+  after_commit 提交成功后发布，任何代码路径更新任务表都会自动产生事件
+- 客户端通过每个项目一条 SSE 订阅接收事件，无需轮询状态接口
+- 每个任务保留最近一次状态快照，新订阅者先收到项目内进行中任务的当前状态
+- 批量任务状态变为 cancelled 时立即通知执行方，正在进行的章节生成会被中断
+
+后端：
+- memory：进程内发布/订阅（默认）
+- postgres：额外通过 LISTEN/NOTIFY 在进程间转发（API进程与独立worker进程）
+"""
+import asyncio
+import itertools
+import json
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.logger import get_logger
+from app.models.analysis_task import AnalysisTask
+from app.models.batch_generation_task import BatchGenerationTask
+
+logger = get_logger(__name__)
+
+NOTIFY_CHANNEL = "task_events"
+# NOTIFY 载荷上限为 8000 字节，超出的事件只在本进程内分发
+_MAX_NOTIFY_BYTES = 7900
+_PENDING_KEY = "task_events_pending"
+_FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class TaskCancelled(Exception):
+    """任务已被用户取消"""
+
+
+class TaskEventBus:
+    """按项目分发的任务事件总线"""
+
+    def __init__(self, max_snapshots: int = 1024, queue_size: int = 256):
+        self.instance_id = uuid.uuid4().hex[:12]
+        self.queue_size = queue_size
+        self.max_snapshots = max_snapshots
+        # 项目ID -> 订阅队列
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # 任务ID -> 最近一次事件
+        self._snapshots: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # 任务ID -> 取消信号
+        self._cancel_events: Dict[str, asyncio.Event] = {}
+        # 已取消的任务ID（与快照同样按数量淘汰最旧的）
+        self._cancelled: "OrderedDict[str, None]" = OrderedDict()
+        self._listener = None
+        self._notify_lock: Optional[asyncio.Lock] = None
+        self._stats = {"published": 0, "delivered": 0, "dropped": 0, "remote": 0}
+
+    @property
+    def cross_process(self) -> bool:
+        """事件是否在进程间转发"""
+        return self._listener is not None
+
+    # ==================== 生命周期 ====================
+
+    async def start(self):
+        """按配置启动跨进程后端"""
+        if settings.task_event_backend != "postgres" or self._listener is not None:
+            return
+        url = make_url(settings.database_url)
+        if not url.drivername.startswith("postgresql"):
+            logger.warning("⚠️ 任务事件总线 postgres 后端需要 PostgreSQL，已回退为进程内模式")
+            return
+        try:
+            import asyncpg
+            dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+            self._listener = await asyncpg.connect(dsn)
+            self._notify_lock = asyncio.Lock()
+            await self._listener.add_listener(NOTIFY_CHANNEL, self._on_notify)
+            logger.info(f"✅ 任务事件总线已启用 LISTEN/NOTIFY: {self.instance_id}")
+        except Exception as e:
+            self._listener = None
+            logger.error(f"❌ 任务事件总线连接失败，回退为进程内模式: {str(e)}")
+
+    async def stop(self):
+        if self._listener is None:
+            return
+        listener, self._listener = self._listener, None
+        try:
+            await listener.close()
+        except Exception as e:
+            logger.warning(f"⚠️ 关闭任务事件监听连接失败: {str(e)}")
+
+    # ==================== 发布 ====================
+
+    def publish(self, events: List[Dict[str, Any]]):
+        """发布事件（本进程立即分发，跨进程后端异步转发）"""
+        for evt in events:
+            self._stats["published"] += 1
+            self._dispatch(evt)
+        if self._listener is not None and events:
+            asyncio.get_running_loop().create_task(self._notify(events))
+
+    async def _notify(self, events: List[Dict[str, Any]]):
+        for evt in events:
+            payload = json.dumps({"origin": self.instance_id, "event": evt}, ensure_ascii=False, default=str)
+            if len(payload.encode("utf-8")) > _MAX_NOTIFY_BYTES:
+                continue
+            try:
+                async with self._notify_lock:
+                    await self._listener.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, payload)
+            except Exception as e:
+                logger.warning(f"⚠️ 转发任务事件失败: {str(e)}")
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("origin") == self.instance_id:
+            return
+        self._stats["remote"] += 1
+        self._dispatch(message["event"])
+
+    def _dispatch(self, evt: Dict[str, Any]):
+        task_id = evt.get("task_id")
+        if task_id:
+            if task_id in self._cancelled and evt.get("status") != "cancelled":
+                # 取消是终态：执行方基于内存中旧对象产生的事件不能覆盖已取消状态
+                evt = {**evt, "status": "cancelled"}
+            self._snapshots[task_id] = evt
+            self._snapshots.move_to_end(task_id)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+            if evt.get("status") == "cancelled":
+                self._mark_cancelled(task_id)
+            elif evt.get("status") in _FINISHED_STATUSES:
+                self._cancel_events.pop(task_id, None)
+
+        for queue in self._subscribers.get(evt.get("project_id"), ()):
+            if queue.full():
+                # 慢订阅者丢弃最旧的事件（快照仍保证最终状态正确）
+                queue.get_nowait()
+                self._stats["dropped"] += 1
+            queue.put_nowait(evt)
+            self._stats["delivered"] += 1
+
+    # ==================== 订阅 ====================
+
+    def snapshots(self, project_id: str) -> List[Dict[str, Any]]:
+        """项目内各任务的最近状态"""
+        return [evt for evt in self._snapshots.values() if evt.get("project_id") == project_id]
+
+    @asynccontextmanager
+    async def subscribe(self, project_id: str) -> AsyncIterator[asyncio.Queue]:
+        """订阅项目的任务事件"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(project_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(project_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[project_id]
+
+    # ==================== 取消 ====================
+
+    def _mark_cancelled(self, task_id: str):
+        self._cancelled[task_id] = None
+        self._cancelled.move_to_end(task_id)
+        while len(self._cancelled) > self.max_snapshots:
+            self._cancelled.popitem(last=False)
+        cancel_event = self._cancel_events.pop(task_id, None)
+        if cancel_event is not None:
+            cancel_event.set()
+
+    def is_cancelled(self, task_id: str) -> bool:
+        return task_id in self._cancelled
+
+    async def run_cancellable(self, task_id: str, awaitable: Awaitable[Any]) -> Any:
+        """执行协程，任务被取消时立即中断并抛出 TaskCancelled"""
+        if self.is_cancelled(task_id):
+            raise TaskCancelled(task_id)
+        cancel_event = self._cancel_events.setdefault(task_id, asyncio.Event())
+        work = asyncio.ensure_future(awaitable)
+        waiter = asyncio.ensure_future(cancel_event.wait())
+        try:
+            await asyncio.wait({work, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+            if not work.done():
+                work.cancel()
+                await asyncio.gather(work, return_exceptions=True)
+        if work.cancelled() and cancel_event.is_set():
+            raise TaskCancelled(task_id)
+        return work.result()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取总线统计"""
+        return {
+            **self._stats,
+            "backend": "postgres" if self.cross_process else "memory",
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "tracked_tasks": len(self._snapshots),
+        }
+
+
+# 全局实例
+task_event_bus = TaskEventBus()
+
+
+# ==================== Session事件：任务行变化自动发布 ====================
+
+def task_snapshot(obj: Any) -> Optional[Dict[str, Any]]:
+    """把任务行转换为事件（非任务模型返回None）"""
+    if isinstance(obj, BatchGenerationTask):
+        return {
+            "type": "batch_generation",
+            "task_id": obj.id,
+            "project_id": obj.project_id,
+            "status": obj.status,
+            "total": obj.total_chapters,
+            "completed": obj.completed_chapters,
+            "current_chapter_id": obj.current_chapter_id,
+            "current_chapter_number": obj.current_chapter_number,
+            "current_retry_count": obj.current_retry_count,
+            "error_message": obj.error_message,
+        }
+    if isinstance(obj, AnalysisTask):
+        return {
+            "type": "analysis",
+            "task_id": obj.id,
+            "project_id": obj.project_id,
+            "chapter_id": obj.chapter_id,
+            "status": obj.status,
+            "progress": obj.progress,
+            "error_message": obj.error_message,
+        }
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_task_changes(session: Session, flush_context):
+    """收集本次flush写入的任务行快照（同一任务只保留最后一次）"""
+    pending = None
+    for obj in itertools.chain(session.new, session.dirty):
+        evt = task_snapshot(obj)
+        if evt is None:
+            continue
+        if pending is None:
+            pending = session.info.setdefault(_PENDING_KEY, {})
+        pending[evt["task_id"]] = evt
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_changes(session: Session):
+    """事务提交后发布任务事件"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        task_event_bus.publish(list(pending.values()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_changes(session: Session):
+    """事务回滚时丢弃未提交的事件"""
+    session.info.pop(_PENDING_KEY, None)
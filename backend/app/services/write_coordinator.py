@@ -0,0 +1,149 @@
+"""数据库写入协调 - 按数据库类型选择写入并发策略
+
+后台任务（章节分析、批量生成）在独立会话中与交互式编辑并发写入数据库：
+- SQLite：整个数据库文件同一时刻只允许一个写事务，进程内所有写入经由同一个
+  FIFO 写入闸门串行提交，避免并发事务互相等待 busy_timeout。
+  多进程部署时进程之间仍依赖 SQLite 自身的锁等待（WAL + busy_timeout）。
+- PostgreSQL：不做进程内串行化，不同用户、不同章节的写入完全并发；
+  需要互斥的写入按业务范围（如同一章节的分析结果）取事务级 advisory lock，
+  事务提交或回滚时自动释放，对多进程/多副本部署同样有效。
+
+用法：
+    write_lock = write_coordinator.guard(db_session, scope=f"chapter:{chapter_id}")
+    async with write_lock:
+        ...
+        await db_session.commit()
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _WriterGate:
+    """FIFO写入闸门（同一协程任务可重入）"""
+
+    def __init__(self):
+        self._owner: Optional[asyncio.Task] = None
+        self._depth = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> float:
+        """获取闸门，返回等待秒数"""
+        current = asyncio.current_task()
+        if self._owner is current:
+            self._depth += 1
+            return 0.0
+        started = time.monotonic()
+        if self._owner is not None or self._waiters:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # 闸门已经移交给自己但调用方被取消，继续移交给下一个等待者
+                    self._owner = current
+                    self._depth = 1
+                    self.release()
+                elif future in self._waiters:
+                    self._waiters.remove(future)
+                raise
+        self._owner = current
+        self._depth = 1
+        return time.monotonic() - started
+
+    def release(self):
+        self._depth -= 1
+        if self._depth > 0:
+            return
+        self._owner = None
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                # 提前占位，防止移交期间被新来的协程插队
+                self._owner = _HANDOFF
+                return
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+
+# 闸门移交中的占位标记
+_HANDOFF: Any = object()
+
+
+class WriteGuard:
+    """一段写入操作的保护（可多次 async with）"""
+
+    def __init__(self, coordinator: "WriteCoordinator", db: Optional[AsyncSession], scope: Optional[str]):
+        self._coordinator = coordinator
+        self._db = db
+        self.scope = scope
+
+    async def __aenter__(self):
+        await self._coordinator._enter(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._coordinator._exit(self)
+        return False
+
+
+class WriteCoordinator:
+    """数据库写入协调器"""
+
+    def __init__(self, database_url: str):
+        self.is_sqlite = "sqlite" in database_url.lower()
+        self._gate = _WriterGate()
+        self._stats = {"writes": 0, "wait_seconds": 0.0, "advisory_locks": 0}
+
+    def guard(self, db: Optional[AsyncSession] = None, scope: Optional[str] = None) -> WriteGuard:
+        """
+        创建写入保护
+
+        Args:
+            db: 执行写入的会话（PostgreSQL advisory lock 在该会话的事务中获取）
+            scope: 互斥范围，相同范围的写入在 PostgreSQL 上互斥；为空时 PostgreSQL 不加锁
+        """
+        return WriteGuard(self, db, scope)
+
+    async def _enter(self, guard: WriteGuard):
+        self._stats["writes"] += 1
+        if self.is_sqlite:
+            self._stats["wait_seconds"] += await self._gate.acquire()
+        elif guard.scope and guard._db is not None:
+            started = time.monotonic()
+            await guard._db.execute(
+                text("SELECT pg_advisory_xact_lock(hashtext(:scope))"),
+                {"scope": guard.scope}
+            )
+            self._stats["advisory_locks"] += 1
+            self._stats["wait_seconds"] += time.monotonic() - started
+
+    def _exit(self, guard: WriteGuard):
+        if self.is_sqlite:
+            self._gate.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写入协调统计"""
+        return {
+            **self._stats,
+            "wait_seconds": round(self._stats["wait_seconds"], 3),
+            "mode": "sqlite_single_writer" if self.is_sqlite else "postgres_advisory",
+            "waiting": self._gate.waiting,
+        }
+
+
+# 全局实例
+write_coordinator = WriteCoordinator(settings.database_url)
@@ -1,11 +1,18 @@
 """
 用户管理模块 - 使用数据库存储
+
+认证中间件每个请求都要解析用户身份，用户信息在进程内按 TTL + LRU 缓存：
+- 用户管理器自身的写操作（登录更新、设置管理员、删除）直接刷新/失效缓存
+- 管理接口直接修改用户表后需调用 invalidate_user 失效对应缓存
+- 多进程部署时其他进程的修改最多延迟 user_cache_ttl_seconds 生效
 """
 import asyncio
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, Tuple
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from pydantic import BaseModel
 from app.config import settings
 
@@ -26,22 +33,22 @@ class User(BaseModel):
 class UserManager:
     """用户管理器 - 使用数据库存储（PostgreSQL共享库）"""
     
-    def __init__(self):
+    def __init__(self, cache_ttl: float = 30.0, cache_max_entries: int = 10000):
         """初始化用户管理器"""
-        pass
+        self.cache_ttl = cache_ttl
+        self.cache_max_entries = cache_max_entries
+        # 用户ID -> (过期时间, 用户信息)；用户不存在时缓存 None，避免无效Cookie反复查库
+        self._cache: "OrderedDict[str, Tuple[float, Optional[User]]]" = OrderedDict()
+        # 失效计数：查询期间发生失效时不回填缓存，避免把失效前读到的旧数据写回
+        self._invalidations = 0
+        self._cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
     
     async def _get_session(self) -> AsyncSession:
         """获取数据库会话 - 使用共享的PostgreSQL引擎"""
-        from app.database import get_engine
+        from app.database import get_session_factory
         
         # 使用共享的PostgreSQL引擎（user_id使用特殊标识）
-        engine = await get_engine("_global_users_")
-        
-        session_maker = async_sessionmaker(
-            engine,
-            class_=AsyncSession,
-            expire_on_commit=False
-        )
+        session_maker = await get_session_factory("_global_users_")
         
         return session_maker()
     
@@ -116,10 +123,65 @@ class UserManager:
             await session.commit()
             await session.refresh(user)
             
-            return User(**user.to_dict())
+            result_user = User(**user.to_dict())
+            self.invalidate_user(user_id)
+            self._remember(user_id, result_user)
+            return result_user.model_copy()
     
+    # ==================== 身份缓存 ====================
+
+    def _remember(self, user_id: str, user: Optional[User]):
+        """写入缓存（LRU淘汰最久未使用的条目）"""
+        if self.cache_ttl <= 0:
+            return
+        self._cache[user_id] = (time.monotonic() + self.cache_ttl, user)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+
+    def invalidate_user(self, user_id: Optional[str] = None):
+        """失效用户缓存；user_id 为空时清空全部"""
+        self._invalidations += 1
+        self._cache_stats["invalidations"] += 1
+        if user_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(user_id, None)
+
+    async def get_user_cached(self, user_id: str) -> Optional[User]:
+        """
+        获取用户（优先读取缓存，供认证中间件使用）
+
+        返回缓存对象的副本，调用方修改不会影响缓存。
+        """
+        entry = self._cache.get(user_id)
+        if entry is not None:
+            expires_at, user = entry
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(user_id)
+                self._cache_stats["hits"] += 1
+                return user.model_copy() if user else None
+            self._cache.pop(user_id, None)
+
+        self._cache_stats["misses"] += 1
+        generation = self._invalidations
+        user = await self.get_user(user_id)
+        if generation == self._invalidations:
+            self._remember(user_id, user)
+        return user.model_copy() if user else None
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取身份缓存统计"""
+        lookups = self._cache_stats["hits"] + self._cache_stats["misses"]
+        return {
+            **self._cache_stats,
+            "entries": len(self._cache),
+            "ttl_seconds": self.cache_ttl,
+            "hit_rate": round(self._cache_stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
     async def get_user(self, user_id: str) -> Optional[User]:
-        """获取用户"""
+        """获取用户（直接查询数据库）"""
         from app.models.user import User as UserModel
         
         async with await self._get_session() as session:
@@ -176,6 +238,7 @@ class UserManager:
             
             user.is_admin = is_admin
             await session.commit()
+            self.invalidate_user(user_id)
             
             return True
     
@@ -206,6 +269,7 @@ class UserManager:
             
             await session.delete(user)
             await session.commit()
+            self.invalidate_user(user_id)
             
             return True
     
@@ -223,4 +287,7 @@ class UserManager:
 
 
 # 全局用户管理器实例
-user_manager = UserManager()
\ No newline at end of file
+user_manager = UserManager(
+    cache_ttl=settings.user_cache_ttl_seconds,
+    cache_max_entries=settings.user_cache_max_entries,
+)
\ No newline at end of file
@@ -6,7 +6,7 @@ import hashlib
 from typing import Optional
 from datetime import datetime
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from app.config import settings
 
 
@@ -19,16 +19,10 @@ class UserPasswordManager:
     
     async def _get_session(self) -> AsyncSession:
         """获取数据库会话 - 使用共享的PostgreSQL引擎"""
-        from app.database import get_engine
+        from app.database import get_session_factory
         
         # 使用共享的PostgreSQL引擎（user_id使用特殊标识）
-        engine = await get_engine("_global_users_")
-        
-        session_maker = async_sessionmaker(
-            engine,
-            class_=AsyncSession,
-            expire_on_commit=False
-        )
+        session_maker = await get_session_factory("_global_users_")
         
         return session_maker()
     
@@ -1,10 +1,12 @@
 """Server-Sent Events (SSE) 响应工具类"""
 import json
 import asyncio
+import time
 from enum import Enum
 from typing import AsyncGenerator, Dict, Any, Optional, Callable
 from dataclasses import dataclass
 from fastapi.responses import StreamingResponse
+from app.config import settings
 from app.logger import get_logger
 
 logger = get_logger(__name__)
@@ -48,6 +50,55 @@ STAGE_CONFIGS: Dict[ProgressStage, StageConfig] = {
 }
 
 
+class ChunkCoalescer:
+    """
+    内容块合并器 - 把上游逐Token到达的内容块按时间/长度合并为一个SSE消息
+    
+    缓冲内容超过 max_chars，或最早的缓冲内容已等待超过 max_delay_ms 时输出一条 chunk 消息；
+    未达到条件时返回空字符串（调用方直接 yield 即可，空字符串不会写入连接）。
+    
+    合并器本身没有定时器，等待时间只在 add / flush_if_due 被调用时检查：
+    上游停顿期间缓冲的内容由调用方的心跳路径（flush_if_due）或下一条其他消息带出。
+    """
+    
+    def __init__(self, max_delay_ms: Optional[float] = None, max_chars: Optional[int] = None):
+        self.max_delay = (settings.sse_coalesce_ms if max_delay_ms is None else max_delay_ms) / 1000
+        self.max_chars = settings.sse_coalesce_chars if max_chars is None else max_chars
+        self._parts: list = []
+        self._size = 0
+        self._first_at = 0.0
+    
+    def add(self, chunk: str) -> str:
+        """加入一个内容块，满足条件时返回合并后的消息"""
+        if not chunk:
+            return ""
+        if not self._parts:
+            self._first_at = time.monotonic()
+        self._parts.append(chunk)
+        self._size += len(chunk)
+        if self._size >= self.max_chars or time.monotonic() - self._first_at >= self.max_delay:
+            return self.flush()
+        return ""
+    
+    def flush_if_due(self) -> str:
+        """最早的缓冲内容已等待超过 max_delay_ms 时输出缓冲内容"""
+        if self._parts and time.monotonic() - self._first_at >= self.max_delay:
+            return self.flush()
+        return ""
+    
+    def flush(self) -> str:
+        """输出缓冲中的全部内容"""
+        if not self._parts:
+            return ""
+        content = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        return SSEResponse.format_sse({
+            "type": "chunk",
+            "content": content
+        })
+
+
 class WizardProgressTracker:
     """
     向导进度追踪器 - 标准化管理SSE进度推送
@@ -58,23 +109,44 @@ class WizardProgressTracker:
         yield await tracker.loading("加载项目信息")
         yield await tracker.preparing()
         async for chunk in ai_stream:
-            yield await tracker.generating_chunk(chunk, len(accumulated))
+            yield await tracker.generating_chunk(chunk)
         yield await tracker.parsing()
         yield await tracker.saving("保存世界观数据")
         yield await tracker.complete()
+    
+    合并模式（默认开启，见 settings.sse_coalesce_enabled）：
+    - generating_chunk 按时间/长度合并内容块，未到输出时机时返回空字符串
+    - 其他任何消息发出前都会先输出缓冲中的内容，保证顺序不变
+    - generating 进度消息在进度值未变化时最多每 sse_progress_interval_ms 发送一次
+    - heartbeat 会先输出已超过合并等待时间的缓冲内容；心跳消息本身仅在连接空闲超过
+      sse_heartbeat_idle_seconds 时发送
     """
     
-    def __init__(self, task_name: str = "任务"):
+    def __init__(self, task_name: str = "任务", coalesce: Optional[bool] = None):
         """
         初始化进度追踪器
         
         Args:
             task_name: 任务名称，用于消息前缀
+            coalesce: 是否启用内容块合并模式（默认读取配置）
         """
         self.task_name = task_name
         self.current_stage = ProgressStage.INIT
         self.current_progress = 0
         self._last_generating_progress = 20  # 生成阶段的最后进度值
+        if coalesce is None:
+            coalesce = settings.sse_coalesce_enabled
+        self._coalescer: Optional[ChunkCoalescer] = ChunkCoalescer() if coalesce else None
+        self._last_emit_at = time.monotonic()
+        self._last_progress_at = 0.0
+        self._last_progress_value = -1
+    
+    def _emit(self, frame: str) -> str:
+        """输出消息前先带上缓冲中的内容块"""
+        self._last_emit_at = time.monotonic()
+        if self._coalescer:
+            return self._coalescer.flush() + frame
+        return frame
     
     def _get_stage_progress(
         self,
@@ -103,7 +175,7 @@ class WizardProgressTracker:
         self.current_stage = ProgressStage.INIT
         self.current_progress = 0
         msg = message or f"开始生成{self.task_name}..."
-        return await SSEResponse.send_progress(msg, 0, "processing")
+        return self._emit(await SSEResponse.send_progress(msg, 0, "processing"))
     
     async def loading(self, message: str = None, sub_progress: float = 0.5) -> str:
         """加载数据阶段"""
@@ -111,7 +183,7 @@ class WizardProgressTracker:
         progress = self._get_stage_progress(ProgressStage.LOADING, sub_progress)
         self.current_progress = progress
         msg = message or STAGE_CONFIGS[ProgressStage.LOADING].default_message
-        return await SSEResponse.send_progress(msg, progress, "processing")
+        return self._emit(await SSEResponse.send_progress(msg, progress, "processing"))
     
     async def preparing(self, message: str = None) -> str:
         """准备提示词阶段"""
@@ -119,7 +191,7 @@ class WizardProgressTracker:
         progress = self._get_stage_progress(ProgressStage.PREPARING, 0.5)
         self.current_progress = progress
         msg = message or STAGE_CONFIGS[ProgressStage.PREPARING].default_message
-        return await SSEResponse.send_progress(msg, progress, "processing")
+        return self._emit(await SSEResponse.send_progress(msg, progress, "processing"))
     
     async def generating(
         self,
@@ -154,16 +226,29 @@ class WizardProgressTracker:
         self.current_progress = progress
         
         # 构建消息
+        # 合并模式下进度值未变化的消息限频
+        if self._coalescer and current_chars > 0 and progress == self._last_progress_value:
+            interval = settings.sse_progress_interval_ms / 1000
+            if time.monotonic() - self._last_progress_at < interval:
+                return ""
+        self._last_progress_value = progress
+        self._last_progress_at = time.monotonic()
+        
         retry_suffix = f" (重试 {retry_count}/{max_retries})" if retry_count > 0 else ""
         if message:
             msg = f"{message}{retry_suffix}"
         else:
             msg = f"生成{self.task_name}中... ({current_chars}字符){retry_suffix}"
         
-        return await SSEResponse.send_progress(msg, progress, "processing")
+        return self._emit(await SSEResponse.send_progress(msg, progress, "processing"))
     
     async def generating_chunk(self, chunk: str) -> str:
-        """发送生成的内容块"""
+        """发送生成的内容块（合并模式下可能返回空字符串）"""
+        if self._coalescer:
+            frame = self._coalescer.add(chunk)
+            if frame:
+                self._last_emit_at = time.monotonic()
+            return frame
         return await SSEResponse.send_chunk(chunk)
     
     async def parsing(self, message: str = None, sub_progress: float = 0.5) -> str:
@@ -172,7 +257,7 @@ class WizardProgressTracker:
         progress = self._get_stage_progress(ProgressStage.PARSING, sub_progress)
         self.current_progress = progress
         msg = message or f"解析{self.task_name}数据..."
-        return await SSEResponse.send_progress(msg, progress, "processing")
+        return self._emit(await SSEResponse.send_progress(msg, progress, "processing"))
     
     async def saving(self, message: str = None, sub_progress: float = 0.5) -> str:
         """保存数据阶段"""
@@ -180,50 +265,58 @@ class WizardProgressTracker:
         progress = self._get_stage_progress(ProgressStage.SAVING, sub_progress)
         self.current_progress = progress
         msg = message or f"保存{self.task_name}到数据库..."
-        return await SSEResponse.send_progress(msg, progress, "processing")
+        return self._emit(await SSEResponse.send_progress(msg, progress, "processing"))
     
     async def complete(self, message: str = None) -> str:
         """完成阶段"""
         self.current_stage = ProgressStage.COMPLETE
         self.current_progress = 100
         msg = message or f"{self.task_name}生成完成!"
-        return await SSEResponse.send_progress(msg, 100, "success")
+        return self._emit(await SSEResponse.send_progress(msg, 100, "success"))
     
     async def warning(self, message: str) -> str:
         """发送警告消息（保持当前进度）"""
-        return await SSEResponse.send_progress(
+        return self._emit(await SSEResponse.send_progress(
             f"⚠️ {message}",
             self.current_progress,
             "warning"
-        )
+        ))
     
     async def retry(self, retry_count: int, max_retries: int, reason: str = "准备重试") -> str:
         """发送重试消息"""
-        return await SSEResponse.send_progress(
+        return self._emit(await SSEResponse.send_progress(
             f"⚠️ {reason}... ({retry_count}/{max_retries})",
             self.current_progress,
             "warning"
-        )
+        ))
     
     async def error(self, error_message: str, code: int = 500) -> str:
         """发送错误消息"""
-        return await SSEResponse.send_error(error_message, code)
+        return self._emit(await SSEResponse.send_error(error_message, code))
     
     async def result(self, data: Dict[str, Any]) -> str:
         """发送结果数据"""
-        return await SSEResponse.send_result(data)
+        return self._emit(await SSEResponse.send_result(data))
     
     async def done(self) -> str:
         """发送完成信号"""
-        return await SSEResponse.send_done()
+        return self._emit(await SSEResponse.send_done())
     
     async def heartbeat(self) -> str:
-        """发送心跳"""
+        """发送心跳（合并模式下先输出到期的缓冲内容，心跳仅在连接空闲时发送）"""
+        if self._coalescer:
+            if time.monotonic() - self._last_emit_at < settings.sse_heartbeat_idle_seconds:
+                frame = self._coalescer.flush_if_due()
+                if frame:
+                    self._last_emit_at = time.monotonic()
+                return frame
+            return self._emit(await SSEResponse.send_heartbeat())
         return await SSEResponse.send_heartbeat()
     
     def reset_generating_progress(self):
         """重置生成阶段进度（用于重试时）"""
         self._last_generating_progress = 20
+        self._last_progress_value = -1
 
 
 class SSEResponse:
@@ -362,20 +455,15 @@ async def create_sse_generator(
         if show_progress:
             yield await SSEResponse.send_progress("开始生成...", 0)
         
-        # 累积内容用于进度计算
-        accumulated_content = ""
-        chunk_count = 0
+        # 内容块按时间/长度合并后发送
+        coalescer = ChunkCoalescer()
         
         async for chunk in async_gen:
-            chunk_count += 1
-            accumulated_content += chunk
-            
-            # 发送内容块
-            yield await SSEResponse.send_chunk(chunk)
-            
-            # 每10个块发送一次心跳
-            if chunk_count % 10 == 0:
-                yield await SSEResponse.send_heartbeat()
+            frame = coalescer.add(chunk)
+            if frame:
+                yield frame
+        
+        yield coalescer.flush()
         
         if show_progress:
             yield await SSEResponse.send_progress("生成完成", 100, "success")
@@ -407,7 +495,8 @@ def create_sse_response(generator: AsyncGenerator[str, None]) -> StreamingRespon
         """包装生成器以捕获StreamingResponse初始化时的GeneratorExit"""
         try:
             async for chunk in generator:
-                yield chunk
+                if chunk:
+                    yield chunk
         except GeneratorExit:
             # StreamingResponse在初始化时会进行类型检查，导致GeneratorExit
             # 这是正常行为，不需要记录警告
@@ -0,0 +1,47 @@
+"""独立作业worker进程
+
+用法：
+    python -m app.worker
+
+与API进程共享同一数据库，通过租约认领 jobs 表中的作业（批量生成、章节分析）。
+部署独立worker时可在API进程中设置 JOB_RUNNER_ENABLED=false，只负责提交作业。
+"""
+import asyncio
+
+from app.config import settings as config_settings
+from app.logger import setup_logging, get_logger
+
+setup_logging(
+    level=config_settings.log_level,
+    log_to_file=config_settings.log_to_file,
+    log_file_path=config_settings.log_file_path,
+    max_bytes=config_settings.log_max_bytes,
+    backup_count=config_settings.log_backup_count
+)
+
+import app.api.chapters  # noqa: E402,F401  注册作业处理函数
+from app.database import close_db  # noqa: E402
+from app.services.job_runner import job_runner  # noqa: E402
+
+logger = get_logger(__name__)
+
+
+async def main():
+    logger.info(f"🚀 作业worker启动: {job_runner.worker_id}")
+    from app.services.task_events import task_event_bus
+    await task_event_bus.start()
+    try:
+        await job_runner.run_forever()
+    finally:
+        await task_event_bus.stop()
+        from app.services.ai_service import cleanup_http_clients
+        await cleanup_http_clients()
+        await close_db()
+        logger.info("作业worker已退出")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+中间件开销微基准
+
+对比三种中间件栈处理同一个最小应用的单请求开销：
+- bare：不加中间件（基线）
+- legacy：基于 BaseHTTPMiddleware 的旧实现（每个请求向根日志器添加/移除过滤器）
+- asgi：当前的纯ASGI RequestIDMiddleware + AuthMiddleware
+
+直接以ASGI协议调用应用（不经过网络和HTTP解析），分别测量普通响应与流式响应（SSE场景），
+以及并发请求下旧实现根日志器上堆积的过滤器数量。
+认证使用已登录用户的Cookie，用户信息预先放入身份缓存，不访问数据库。
+
+用法：
+    python scripts/bench_middleware.py [--requests 5000] [--concurrency 50] [--chunks 100]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import HTTPConnection, Request
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from app.middleware.auth_middleware import AuthMiddleware
+from app.middleware.request_id import RequestIDMiddleware
+from app.user_manager import User, user_manager
+
+BENCH_USER_ID = "local_bench_user"
+_peak_root_filters = 0
+
+
+# ==================== 旧实现（BaseHTTPMiddleware） ====================
+
+class _LegacyRequestIDFilter(logging.Filter):
+    def __init__(self, request_id: str):
+        super().__init__()
+        self.request_id = request_id
+
+    def filter(self, record):
+        record.request_id = self.request_id
+        return True
+
+
+class LegacyRequestIDMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        request_id = request.headers.get('X-Request-ID') or str(uuid.uuid4())
+        request.state.request_id = request_id
+        log_filter = _LegacyRequestIDFilter(request_id)
+        root_logger = logging.getLogger()
+        root_logger.addFilter(log_filter)
+        try:
+            response = await call_next(request)
+            response.headers['X-Request-ID'] = request_id
+            return response
+        finally:
+            root_logger.removeFilter(log_filter)
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """身份解析逻辑与当前实现相同，只有中间件框架不同"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._auth = AuthMiddleware(app)
+
+    async def dispatch(self, request: Request, call_next):
+        for key, value in (await self._auth.authenticate(HTTPConnection(request.scope))).items():
+            setattr(request.state, key, value)
+        return await call_next(request)
+
+
+# ==================== 被测应用 ====================
+
+def build_app(chunks: int) -> Starlette:
+    async def ping(request: Request):
+        global _peak_root_filters
+        _peak_root_filters = max(_peak_root_filters, len(logging.getLogger().filters))
+        return PlainTextResponse(getattr(request.state, "user_id", None) or "anonymous")
+
+    async def stream(request: Request):
+        async def body():
+            for i in range(chunks):
+                yield f"data: {i}\n\n"
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    return Starlette(routes=[Route("/ping", ping), Route("/stream", stream)])
+
+
+def wrap(app, stack: str):
+    if stack == "legacy":
+        # 与 main.py 注册顺序一致：RequestID 在最外层
+        return LegacyRequestIDMiddleware(LegacyAuthMiddleware(app))
+    if stack == "asgi":
+        return RequestIDMiddleware(AuthMiddleware(app))
+    return app
+
+
+async def call(app, path: str) -> int:
+    """以ASGI协议发起一次GET请求，返回收到的响应体字节数"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"cookie", f"user_id={BENCH_USER_ID}".encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    received = 0
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        # 第一次返回请求体，之后等到响应结束再报告断开（与真实服务器行为一致）
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                response_done.set()
+
+    await app(scope, receive, send)
+    return received
+
+
+async def measure(app, path: str, requests: int, concurrency: int) -> float:
+    """返回平均每个请求的耗时（微秒）"""
+    for _ in range(min(200, requests)):
+        await call(app, path)
+    started = time.perf_counter()
+    if concurrency <= 1:
+        for _ in range(requests):
+            await call(app, path)
+    else:
+        for offset in range(0, requests, concurrency):
+            await asyncio.gather(*(call(app, path) for _ in range(min(concurrency, requests - offset))))
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main():
+    global _peak_root_filters
+    parser = argparse.ArgumentParser(description="中间件单请求开销微基准")
+    parser.add_argument("--requests", type=int, default=5000, help="每项测量的请求数")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发测量时同时发起的请求数")
+    parser.add_argument("--chunks", type=int, default=100, help="流式响应的消息块数")
+    args = parser.parse_args()
+
+    # 基准运行期间身份缓存不过期
+    user_manager.cache_ttl = 24 * 3600
+    user_manager._remember(BENCH_USER_ID, User(
+        user_id=BENCH_USER_ID, username="bench", display_name="bench",
+        linuxdo_id=BENCH_USER_ID, created_at="", last_login="",
+    ))
+    inner = build_app(args.chunks)
+    stacks = ["bare", "legacy", "asgi"]
+    cases = [
+        ("普通响应 串行", "/ping", 1),
+        (f"普通响应 并发{args.concurrency}", "/ping", args.concurrency),
+        (f"流式响应({args.chunks}块) 串行", "/stream", 1),
+    ]
+
+    print(f"{'场景':<24}" + "".join(f"{s:>12}" for s in stacks) + f"{'legacy开销':>14}{'asgi开销':>12}")
+    for title, path, concurrency in cases:
+        results = {s: await measure(wrap(inner, s), path, args.requests, concurrency) for s in stacks}
+        legacy_cost = results["legacy"] - results["bare"]
+        asgi_cost = results["asgi"] - results["bare"]
+        print(
+            f"{title:<24}" + "".join(f"{results[s]:>10.1f}µs" for s in stacks)
+            + f"{legacy_cost:>12.1f}µs{asgi_cost:>10.1f}µs"
+        )
+
+    for stack in ("legacy", "asgi"):
+        _peak_root_filters = 0
+        await measure(wrap(inner, stack), "/ping", args.requests, args.concurrency)
+        print(f"并发{args.concurrency}时根日志器过滤器峰值 [{stack}]: {_peak_root_filters}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
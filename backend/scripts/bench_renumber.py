@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+章节重新编号基准
+
+在项目靠前的位置（第2个大纲）插入展开章节，对比不同章节总数下两种实现的耗时与SQL条数：
+- legacy：逐个前置大纲统计章节数，插入后逐个大纲加载全部后续章节、逐行修改序号
+- set：一次聚合查询计算起始序号，插入前用一条 UPDATE 将后续章节整体后移
+
+另外对比全量重新编号（批量展开结束后的统一重排）：逐行修改 vs 窗口函数一条 UPDATE ... FROM。
+每次测量都重建数据，结束后校验章节序号为 1..N 连续且按大纲顺序排列。
+
+默认使用临时SQLite文件；可通过 --database-url 指定一个专用的测试数据库（会建表并写入测试数据，结束后删除测试项目）。
+
+用法：
+    python scripts/bench_renumber.py [--sizes 100,500,1000,2000] [--chapters-per-outline 5] [--insert 3] [--repeat 3]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import Base  # noqa: F401  先初始化数据库模块，避免模型循环导入
+import app.models  # noqa: F401  注册全部模型（外键依赖）
+from app.models.chapter import Chapter
+from app.models.outline import Outline
+from app.models.project import Project
+from app.services.plot_expansion_service import PlotExpansionService
+
+_statements = 0
+
+
+# ==================== 旧实现（逐行） ====================
+
+async def legacy_create_chapters(outline: Outline, plans, project_id: str, db):
+    prev_outlines = (await db.execute(
+        select(Outline)
+        .where(Outline.project_id == project_id, Outline.order_index < outline.order_index)
+        .order_by(Outline.order_index)
+    )).scalars().all()
+    start = 1
+    for prev in prev_outlines:
+        start += (await db.execute(
+            select(func.count(Chapter.id))
+            .where(Chapter.project_id == project_id, Chapter.outline_id == prev.id)
+        )).scalar() or 0
+
+    chapters = [
+        Chapter(project_id=project_id, outline_id=outline.id, chapter_number=start + idx,
+                sub_index=idx + 1, title=plan["title"], status="draft")
+        for idx, plan in enumerate(plans)
+    ]
+    db.add_all(chapters)
+    await db.commit()
+    for chapter in chapters:
+        await db.refresh(chapter)
+    await legacy_renumber(outline, project_id, db)
+
+
+async def legacy_renumber(outline: Outline, project_id: str, db):
+    subsequent = (await db.execute(
+        select(Outline)
+        .where(Outline.project_id == project_id, Outline.order_index >= outline.order_index)
+        .order_by(Outline.order_index)
+    )).scalars().all()
+    number = 1
+    prev_outlines = (await db.execute(
+        select(Outline)
+        .where(Outline.project_id == project_id, Outline.order_index < outline.order_index)
+        .order_by(Outline.order_index)
+    )).scalars().all()
+    for prev in prev_outlines:
+        number += (await db.execute(
+            select(func.count(Chapter.id))
+            .where(Chapter.project_id == project_id, Chapter.outline_id == prev.id)
+        )).scalar() or 0
+    for item in subsequent:
+        chapters = (await db.execute(
+            select(Chapter)
+            .where(Chapter.project_id == project_id, Chapter.outline_id == item.id)
+            .order_by(Chapter.sub_index)
+        )).scalars().all()
+        for chapter in chapters:
+            if chapter.chapter_number != number:
+                chapter.chapter_number = number
+            number += 1
+    await db.commit()
+
+
+# ==================== 测试数据 ====================
+
+async def build_project(session_factory, total_chapters: int, per_outline: int, shuffled: bool) -> tuple:
+    """
+    创建测试项目：第2个大纲（order_index=1）没有章节，其余每个大纲 per_outline 章
+    shuffled=True 时第2个大纲之后的章节序号全部错位（用于全量重排测试）
+    """
+    project_id = str(uuid.uuid4())
+    outline_count = total_chapters // per_outline + 1
+    async with session_factory() as db:
+        db.add(Project(id=project_id, user_id="bench", title="bench"))
+        outline_rows = [
+            {"id": str(uuid.uuid4()), "project_id": project_id, "title": f"大纲{i}", "order_index": i}
+            for i in range(outline_count)
+        ]
+        await db.flush()
+        await db.execute(insert(Outline), outline_rows)
+        chapter_rows = []
+        number = 1
+        for row in outline_rows:
+            if row["order_index"] == 1:
+                continue
+            for sub in range(1, per_outline + 1):
+                chapter_rows.append({
+                    "id": str(uuid.uuid4()), "project_id": project_id, "outline_id": row["id"],
+                    "chapter_number": number + (1000000 if shuffled and row["order_index"] > 1 else 0),
+                    "sub_index": sub, "title": f"第{number}章", "status": "draft",
+                })
+                number += 1
+        await db.execute(insert(Chapter), chapter_rows)
+        await db.commit()
+    return project_id, outline_rows[1]["id"], outline_rows[2]["id"]
+
+
+async def verify(session_factory, project_id: str, expected: int):
+    async with session_factory() as db:
+        numbers = (await db.execute(
+            select(Chapter.chapter_number)
+            .join(Outline, Chapter.outline_id == Outline.id)
+            .where(Chapter.project_id == project_id)
+            .order_by(Outline.order_index, Chapter.sub_index)
+        )).scalars().all()
+    if numbers != list(range(1, expected + 1)):
+        raise AssertionError(f"项目 {project_id} 章节序号不连续")
+
+
+async def drop_project(session_factory, project_id: str):
+    async with session_factory() as db:
+        await db.execute(delete(Chapter).where(Chapter.project_id == project_id))
+        await db.execute(delete(Outline).where(Outline.project_id == project_id))
+        await db.execute(delete(Project).where(Project.id == project_id))
+        await db.commit()
+
+
+# ==================== 测量 ====================
+
+async def measure(session_factory, impl: str, case: str, total: int, per_outline: int, inserts: int):
+    """返回 (耗时毫秒, SQL条数)"""
+    global _statements
+    service = PlotExpansionService(ai_service=None)
+    plans = [{"title": f"新章节{i}"} for i in range(inserts)]
+    project_id, target_id, renumber_from_id = await build_project(
+        session_factory, total, per_outline, shuffled=(case == "renumber")
+    )
+    try:
+        async with session_factory() as db:
+            if case == "insert":
+                outline = await db.get(Outline, target_id)
+            else:
+                outline = await db.get(Outline, renumber_from_id)
+            _statements = 0
+            started = time.perf_counter()
+            if case == "insert" and impl == "legacy":
+                await legacy_create_chapters(outline, plans, project_id, db)
+            elif case == "insert":
+                await service.create_chapters_from_plans(
+                    outline_id=target_id, chapter_plans=plans, project_id=project_id, db=db
+                )
+            elif impl == "legacy":
+                await legacy_renumber(outline, project_id, db)
+            else:
+                await service.renumber_chapters_from(project_id=project_id, outline_id=renumber_from_id, db=db)
+            elapsed = (time.perf_counter() - started) * 1000
+            statements = _statements
+        await verify(session_factory, project_id, total + (inserts if case == "insert" else 0))
+    finally:
+        await drop_project(session_factory, project_id)
+    return elapsed, statements
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="章节重新编号：逐行 vs 集合式UPDATE")
+    parser.add_argument("--sizes", default="100,500,1000,2000", help="项目章节总数（逗号分隔）")
+    parser.add_argument("--chapters-per-outline", type=int, default=5, help="每个大纲的章节数")
+    parser.add_argument("--insert", type=int, default=3, help="插入的章节数")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取中位数）")
+    parser.add_argument("--database-url", default=None, help="测试数据库URL（默认临时SQLite文件）")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        tmp_dir = tempfile.mkdtemp(prefix="bench_renumber_")
+        database_url = f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+
+    engine = create_async_engine(database_url)
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        global _statements
+        _statements += 1
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    print(f"数据库: {engine.dialect.name}，每个大纲 {args.chapters_per_outline} 章，插入 {args.insert} 章")
+    print(f"{'场景':<10}{'章节数':>8}{'legacy':>14}{'set':>14}{'加速':>8}{'legacy SQL':>12}{'set SQL':>10}")
+    try:
+        for case, title in (("insert", "插入章节"), ("renumber", "全量重排")):
+            for size in sizes:
+                results = {}
+                for impl in ("legacy", "set"):
+                    runs = sorted([
+                        await measure(session_factory, impl, case, size, args.chapters_per_outline, args.insert)
+                        for _ in range(args.repeat)
+                    ])
+                    results[impl] = runs[len(runs) // 2]
+                (legacy_ms, legacy_sql), (set_ms, set_sql) = results["legacy"], results["set"]
+                print(
+                    f"{title:<10}{size:>8}{legacy_ms:>12.1f}ms{set_ms:>12.1f}ms"
+                    f"{legacy_ms / max(set_ms, 1e-6):>7.1f}x{legacy_sql:>12}{set_sql:>10}"
+                )
+    finally:
+        await engine.dispose()
+        if tmp_dir:
+            for name in os.listdir(tmp_dir):
+                os.remove(os.path.join(tmp_dir, name))
+            os.rmdir(tmp_dir)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
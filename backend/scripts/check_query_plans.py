@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+热点查询执行计划检查脚本
+对章节、记忆、伏笔、大纲的热点查询执行 EXPLAIN，确认使用了对应的复合索引
+
+用法：
+    python scripts/check_query_plans.py [--database-url URL]
+
+- SQLite：EXPLAIN QUERY PLAN，检查计划中出现 "USING [COVERING] INDEX <索引名>"，且没有 "USE TEMP B-TREE" 排序步骤
+- PostgreSQL：EXPLAIN (FORMAT JSON)，关闭顺序扫描和位图扫描（enable_seqscan/enable_bitmapscan=off）后
+  检查计划节点的索引名且没有 Sort 节点，避免空表或小表上优化器选择顺序扫描导致误报
+任一查询未使用预期索引、或仍需额外排序时以非零状态码退出（可用于CI或迁移后的自检）
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.database import Base  # noqa: F401  先初始化数据库模块，避免模型循环导入
+from app.models.chapter import Chapter
+from app.models.foreshadow import Foreshadow
+from app.models.memory import StoryMemory
+from app.models.outline import Outline
+
+PROJECT_ID = "00000000-0000-0000-0000-000000000000"
+CHAPTER_ID = "00000000-0000-0000-0000-000000000001"
+OUTLINE_ID = "00000000-0000-0000-0000-000000000002"
+
+# (说明, 查询, 预期索引)
+HOT_QUERIES = [
+    (
+        "章节列表（按序号排序）",
+        select(Chapter.id, Chapter.title, Chapter.chapter_number)
+        .where(Chapter.project_id == PROJECT_ID)
+        .order_by(Chapter.chapter_number),
+        "idx_chapters_project_number_id",
+    ),
+    (
+        "章节列表游标分页",
+        select(Chapter.id, Chapter.chapter_number)
+        .where(
+            Chapter.project_id == PROJECT_ID,
+            tuple_(Chapter.chapter_number, Chapter.id) > tuple_(100, CHAPTER_ID),
+        )
+        .order_by(Chapter.chapter_number, Chapter.id)
+        .limit(101),
+        "idx_chapters_project_number_id",
+    ),
+    (
+        "前置章节检查",
+        select(Chapter)
+        .where(Chapter.project_id == PROJECT_ID, Chapter.chapter_number < 50)
+        .order_by(Chapter.chapter_number),
+        "idx_chapters_project_number_id",
+    ),
+    (
+        "最近章节上下文",
+        select(Chapter)
+        .where(Chapter.project_id == PROJECT_ID, Chapter.chapter_number < 50)
+        .order_by(Chapter.chapter_number.desc())
+        .limit(3),
+        "idx_chapters_project_number_id",
+    ),
+    (
+        "上一章结尾/章节导航",
+        select(Chapter)
+        .where(Chapter.project_id == PROJECT_ID, Chapter.chapter_number == 49),
+        "idx_chapters_project_number_id",
+    ),
+    (
+        "大纲下的子章节",
+        select(Chapter)
+        .where(Chapter.outline_id == OUTLINE_ID)
+        .order_by(Chapter.sub_index),
+        "idx_chapters_outline_sub",
+    ),
+    (
+        "上一章摘要记忆",
+        select(StoryMemory)
+        .where(
+            StoryMemory.project_id == PROJECT_ID,
+            StoryMemory.chapter_id == CHAPTER_ID,
+            StoryMemory.memory_type == "chapter_summary",
+        ),
+        "idx_memories_project_chapter_type",
+    ),
+    (
+        "最近章节摘要记忆",
+        select(StoryMemory)
+        .where(
+            StoryMemory.project_id == PROJECT_ID,
+            StoryMemory.memory_type == "chapter_summary",
+            StoryMemory.story_timeline < 50,
+        )
+        .order_by(StoryMemory.story_timeline.desc())
+        .limit(5),
+        "idx_memories_project_type_timeline",
+    ),
+    (
+        "待回收伏笔提醒",
+        select(Foreshadow)
+        .where(
+            Foreshadow.project_id == PROJECT_ID,
+            Foreshadow.status == "planted",
+            Foreshadow.target_resolve_chapter_number <= 55,
+        )
+        .order_by(Foreshadow.target_resolve_chapter_number),
+        "idx_foreshadows_project_status_target",
+    ),
+    (
+        "本章必须回收的伏笔",
+        select(Foreshadow)
+        .where(
+            Foreshadow.project_id == PROJECT_ID,
+            Foreshadow.status == "planted",
+            Foreshadow.target_resolve_chapter_number == 50,
+        ),
+        "idx_foreshadows_project_status_target",
+    ),
+    (
+        "按埋入章节查找伏笔",
+        select(Foreshadow)
+        .where(Foreshadow.project_id == PROJECT_ID, Foreshadow.plant_chapter_number == 50),
+        "idx_foreshadows_project_plant",
+    ),
+    (
+        "按序号查找大纲",
+        select(Outline)
+        .where(Outline.project_id == PROJECT_ID, Outline.order_index == 50),
+        "idx_outlines_project_order",
+    ),
+]
+
+
+def _compile(stmt, dialect) -> str:
+    return str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+def _pg_plan_values(plan, key: str) -> set:
+    """递归收集 PostgreSQL 计划节点中指定字段的取值（索引名、节点类型等）"""
+    values = set()
+    if isinstance(plan, dict):
+        if key in plan:
+            values.add(plan[key])
+        for value in plan.values():
+            values |= _pg_plan_values(value, key)
+    elif isinstance(plan, list):
+        for item in plan:
+            values |= _pg_plan_values(item, key)
+    return values
+
+
+async def check(database_url: str) -> bool:
+    engine = create_async_engine(database_url)
+    is_sqlite = engine.dialect.name == "sqlite"
+    all_ok = True
+    try:
+        async with engine.connect() as conn:
+            if not is_sqlite:
+                await conn.exec_driver_sql("SET enable_seqscan = off")
+                await conn.exec_driver_sql("SET enable_bitmapscan = off")
+            for description, stmt, expected in HOT_QUERIES:
+                sql = _compile(stmt, engine.dialect)
+                if is_sqlite:
+                    rows = (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")).all()
+                    plan = " | ".join(str(row[-1]) for row in rows)
+                    uses_index = f"INDEX {expected}" in plan
+                    needs_sort = "TEMP B-TREE" in plan
+                else:
+                    raw = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")).scalar_one()
+                    plan_json = json.loads(raw) if isinstance(raw, str) else raw
+                    used = _pg_plan_values(plan_json, "Index Name")
+                    node_types = _pg_plan_values(plan_json, "Node Type")
+                    plan = ", ".join(sorted(used)) or "顺序扫描"
+                    uses_index = expected in used
+                    needs_sort = bool(node_types & {"Sort", "Incremental Sort"})
+                    if needs_sort:
+                        plan += "（含排序节点）"
+                ok = uses_index and not needs_sort
+                all_ok &= ok
+                note = "，但需要额外排序" if uses_index and needs_sort else ""
+                print(f"{'✅' if ok else '❌'} {description}: 预期 {expected}{note}")
+                if not ok:
+                    print(f"     实际计划: {plan}")
+    finally:
+        await engine.dispose()
+    return all_ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查热点查询是否使用复合索引")
+    parser.add_argument("--database-url", default=settings.database_url, help="数据库连接URL（默认读取配置）")
+    args = parser.parse_args()
+
+    ok = asyncio.run(check(args.database_url))
+    print("\n✅ 所有热点查询均使用了预期索引且无需额外排序" if ok else "\n❌ 部分热点查询未使用预期索引或需要额外排序，请确认已执行迁移")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
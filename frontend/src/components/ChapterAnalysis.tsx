@@ -16,6 +16,7 @@ import {
 import type { AnalysisTask, ChapterAnalysisResponse } from '../types';
 import ChapterRegenerationModal from './ChapterRegenerationModal';
 import ChapterContentComparison from './ChapterContentComparison';
+import { subscribeTaskEvents, toAnalysisTask } from '../utils/taskEvents';
 
 // 判断是否为移动设备
 const isMobileDevice = () => window.innerWidth < 768;
@@ -37,6 +38,9 @@ export default function ChapterAnalysis({ chapterId, visible, onClose }: Chapter
   const [chapterInfo, setChapterInfo] = useState<{ title: string; chapter_number: number; content: string } | null>(null);
   const [newGeneratedContent, setNewGeneratedContent] = useState('');
   const [newContentWordCount, setNewContentWordCount] = useState(0);
+  const [projectId, setProjectId] = useState<string | null>(null);
+  // 进行中的分析任务ID：订阅项目任务事件接收其进度
+  const [watchingTaskId, setWatchingTaskId] = useState<string | null>(null);
 
   useEffect(() => {
     if (visible && chapterId) {
@@ -50,20 +54,42 @@ export default function ChapterAnalysis({ chapterId, visible, onClose }: Chapter
 
     window.addEventListener('resize', handleResize);
 
-    // 清理函数：组件卸载或关闭时清除轮询
+    // 清理函数：组件卸载或关闭时移除监听
     return () => {
       window.removeEventListener('resize', handleResize);
-      // 清除可能存在的轮询
     };
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [visible, chapterId]);
 
+  // 订阅任务事件（替代轮询），关闭或任务结束时取消订阅
+  useEffect(() => {
+    if (!visible || !watchingTaskId || !projectId) return;
+
+    return subscribeTaskEvents(projectId, async (event) => {
+      if (event.type !== 'analysis' || event.task_id !== watchingTaskId) return;
+
+      setTask(toAnalysisTask(event));
+
+      if (event.status === 'completed') {
+        setWatchingTaskId(null);
+        await fetchAnalysisResult();
+        // 🔧 分析完成后刷新章节内容，确保显示最新内容
+        await loadChapterInfo();
+      } else if (event.status === 'failed') {
+        setWatchingTaskId(null);
+        setError(event.error_message || '分析失败');
+      }
+    });
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [visible, watchingTaskId, projectId]);
+
   // 🔧 新增：独立的章节信息加载函数
   const loadChapterInfo = async () => {
     try {
       const chapterResponse = await fetch(`/api/chapters/${chapterId}`);
       if (chapterResponse.ok) {
         const chapterData = await chapterResponse.json();
+        setProjectId(chapterData.project_id);
         setChapterInfo({
           title: chapterData.title,
           chapter_number: chapterData.chapter_number,
@@ -80,6 +106,7 @@ export default function ChapterAnalysis({ chapterId, visible, onClose }: Chapter
     try {
       setLoading(true);
       setError(null);
+      setWatchingTaskId(null);
 
       // 🔧 使用独立的章节加载函数
       await loadChapterInfo();
@@ -110,8 +137,8 @@ export default function ChapterAnalysis({ chapterId, visible, onClose }: Chapter
       if (taskData.status === 'completed') {
         await fetchAnalysisResult();
       } else if (taskData.status === 'running' || taskData.status === 'pending') {
-        // 开始轮询
-        startPolling();
+        // 订阅任务进度
+        setWatchingTaskId(taskData.task_id);
       }
     } catch (err) {
       setError((err as Error).message);
@@ -133,33 +160,6 @@ export default function ChapterAnalysis({ chapterId, visible, onClose }: Chapter
     }
   };
 
-  const startPolling = () => {
-    const pollInterval = setInterval(async () => {
-      try {
-        const response = await fetch(`/api/chapters/${chapterId}/analysis/status`);
-        if (!response.ok) return;
-
-        const taskData: AnalysisTask = await response.json();
-        setTask(taskData);
-
-        if (taskData.status === 'completed') {
-          clearInterval(pollInterval);
-          await fetchAnalysisResult();
-          // 🔧 分析完成后刷新章节内容，确保显示最新内容
-          await loadChapterInfo();
-        } else if (taskData.status === 'failed') {
-          clearInterval(pollInterval);
-          setError(taskData.error_message || '分析失败');
-        }
-      } catch (err) {
-        console.error('轮询错误:', err);
-      }
-    }, 2000);
-
-    // 5分钟超时
-    setTimeout(() => clearInterval(pollInterval), 300000);
-  };
-
   const triggerAnalysis = async () => {
     try {
       setLoading(true);
@@ -13,9 +13,11 @@ import {
 import api from '../services/api';
 import AnnotatedText, { type MemoryAnnotation } from '../components/AnnotatedText';
 import MemorySidebar from '../components/MemorySidebar';
+import { subscribeTaskEvents } from '../utils/taskEvents';
 
 interface ChapterData {
   id: string;
+  project_id: string;
   chapter_number: number;
   title: string;
   content: string;
@@ -164,7 +166,7 @@ const ChapterReader: React.FC = () => {
   };
 
   const handleReanalyze = async () => {
-    if (!chapterId) return;
+    if (!chapterId || !chapter) return;
 
     try {
       setAnalyzing(true);
@@ -172,44 +174,44 @@ const ChapterReader: React.FC = () => {
       message.loading({ content: '开始分析章节...', key: 'analyze', duration: 0 });
 
       // 触发分析
-      await api.post(`/chapters/${chapterId}/analyze`);
-
-      // 轮询分析状态
-      const pollInterval = setInterval(async () => {
-        try {
-          const statusRes = await api.get(`/chapters/${chapterId}/analysis/status`);
-          const { status, progress, error_message } = statusRes.data;
-
-          setAnalysisProgress(progress || 0);
-
-          if (status === 'completed') {
-            clearInterval(pollInterval);
-            setAnalyzing(false);
-            message.success({ content: '分析完成！', key: 'analyze' });
-            
-            // 重新加载标注数据
-            const annotationsRes = await api.get(`/chapters/${chapterId}/annotations`);
-            setAnnotationsData(annotationsRes.data);
-          } else if (status === 'failed') {
-            clearInterval(pollInterval);
-            setAnalyzing(false);
-            message.error({
-              content: `分析失败：${error_message || '未知错误'}`,
-              key: 'analyze'
-            });
+      const { task_id: taskId } = await api.post<unknown, { task_id: string }>(`/chapters/${chapterId}/analyze`);
+
+      // 订阅项目任务事件接收分析进度（替代轮询）
+      let timeoutId: number | undefined;
+      const unsubscribe = subscribeTaskEvents(chapter.project_id, async (event) => {
+        if (event.type !== 'analysis' || event.task_id !== taskId) return;
+
+        setAnalysisProgress(event.progress || 0);
+
+        if (event.status === 'completed') {
+          unsubscribe();
+          window.clearTimeout(timeoutId);
+          setAnalyzing(false);
+          message.success({ content: '分析完成！', key: 'analyze' });
+
+          // 重新加载标注数据
+          try {
+            const annotations = await api.get<unknown, AnnotationsData>(`/chapters/${chapterId}/annotations`);
+            setAnnotationsData(annotations);
+          } catch (err) {
+            console.error('加载标注失败:', err);
           }
-        } catch (err) {
-          console.error('轮询分析状态失败:', err);
+        } else if (event.status === 'failed') {
+          unsubscribe();
+          window.clearTimeout(timeoutId);
+          setAnalyzing(false);
+          message.error({
+            content: `分析失败：${event.error_message || '未知错误'}`,
+            key: 'analyze'
+          });
         }
-      }, 2000); // 每2秒轮询一次
+      });
 
       // 30秒超时
-      setTimeout(() => {
-        clearInterval(pollInterval);
-        if (analyzing) {
-          setAnalyzing(false);
-          message.warning({ content: '分析超时，请稍后刷新查看结果', key: 'analyze' });
-        }
+      timeoutId = window.setTimeout(() => {
+        unsubscribe();
+        setAnalyzing(false);
+        message.warning({ content: '分析超时，请稍后刷新查看结果', key: 'analyze' });
       }, 30000);
 
     } catch (err: unknown) {
@@ -14,6 +14,8 @@ import FloatingIndexPanel from '../components/FloatingIndexPanel';
 import ChapterReader from '../components/ChapterReader';
 import PartialRegenerateToolbar from '../components/PartialRegenerateToolbar';
 import PartialRegenerateModal from '../components/PartialRegenerateModal';
+import { subscribeTaskEvents, toAnalysisTask } from '../utils/taskEvents';
+import type { AnalysisTaskEvent, BatchGenerationTaskEvent, TaskEvent } from '../utils/taskEvents';
 
 const { TextArea } = Input;
 
@@ -69,7 +71,10 @@ export default function Chapters() {
   const [analysisChapterId, setAnalysisChapterId] = useState<string | null>(null);
   // 分析任务状态管理
   const [analysisTasksMap, setAnalysisTasksMap] = useState<Record<string, AnalysisTask>>({});
-  const pollingIntervalsRef = useRef<Record<string, number>>({});
+  // 正在关注的分析任务（所属章节ID），任务结束时提示结果
+  const watchedAnalysesRef = useRef<Set<string>>(new Set());
+  // 各章节最近一次分析任务的ID（忽略同一章节较早任务的事件）
+  const analysisTaskIdsRef = useRef<Record<string, string>>({});
   const [isIndexPanelVisible, setIsIndexPanelVisible] = useState(false);
 
   // 阅读器状态
@@ -105,7 +110,11 @@ export default function Chapters() {
     current_chapter_number: number | null;
     estimated_time_minutes?: number;
   } | null>(null);
-  const batchPollingIntervalRef = useRef<number | null>(null);
+  // 正在关注的批量生成任务及其最近的完成数
+  const watchedBatchIdRef = useRef<string | null>(null);
+  const batchCompletedRef = useRef(0);
+  // 任务事件处理函数（每次渲染更新，订阅回调始终调用最新的处理函数）
+  const taskEventHandlerRef = useRef<(event: TaskEvent) => void>(() => {});
 
   useEffect(() => {
     const handleResize = () => {
@@ -339,19 +348,11 @@ export default function Chapters() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [currentProject?.id]);
 
-  // 清理轮询定时器
+  // 订阅项目任务事件：批量生成、章节分析的进度由服务端推送，不再轮询状态接口
   useEffect(() => {
-    const pollingIntervals = pollingIntervalsRef.current;
-    const batchPollingInterval = batchPollingIntervalRef.current;
-    return () => {
-      Object.values(pollingIntervals).forEach(interval => {
-        clearInterval(interval);
-      });
-      if (batchPollingInterval) {
-        clearInterval(batchPollingInterval);
-      }
-    };
-  }, []);
+    if (!currentProject?.id) return;
+    return subscribeTaskEvents(currentProject.id, event => taskEventHandlerRef.current(event));
+  }, [currentProject?.id]);
 
   // 加载所有章节的分析任务状态
   // 接受可选的 chaptersToLoad 参数，解决 React 状态更新延迟导致的问题
@@ -369,10 +370,13 @@ export default function Chapters() {
           if (response.ok) {
             const task: AnalysisTask = await response.json();
             tasksMap[chapter.id] = task;
+            if (task.task_id) {
+              analysisTaskIdsRef.current[chapter.id] = task.task_id;
+            }
 
-            // 如果任务正在运行，启动轮询
+            // 如果任务正在运行，关注其结果
             if (task.status === 'pending' || task.status === 'running') {
-              startPollingTask(chapter.id);
+              watchAnalysisTask(chapter.id);
             }
           }
         } catch {
@@ -385,50 +389,40 @@ export default function Chapters() {
     setAnalysisTasksMap(tasksMap);
   };
 
-  // 启动单个章节的任务轮询
-  const startPollingTask = (chapterId: string) => {
-    // 如果已经在轮询，先清除
-    if (pollingIntervalsRef.current[chapterId]) {
-      clearInterval(pollingIntervalsRef.current[chapterId]);
+  // 关注单个章节的分析任务（状态由任务事件推送）
+  const watchAnalysisTask = (chapterId: string, taskId?: string | null) => {
+    watchedAnalysesRef.current.add(chapterId);
+    if (taskId) {
+      analysisTaskIdsRef.current[chapterId] = taskId;
     }
+  };
 
-    const interval = window.setInterval(async () => {
-      try {
-        const response = await fetch(`/api/chapters/${chapterId}/analysis/status`);
-        if (!response.ok) return;
-
-        const task: AnalysisTask = await response.json();
-
-        setAnalysisTasksMap(prev => ({
-          ...prev,
-          [chapterId]: task
-        }));
-
-        // 任务完成或失败，停止轮询
-        if (task.status === 'completed' || task.status === 'failed') {
-          clearInterval(pollingIntervalsRef.current[chapterId]);
-          delete pollingIntervalsRef.current[chapterId];
-
-          if (task.status === 'completed') {
-            message.success(`章节分析完成`);
-          } else if (task.status === 'failed') {
-            message.error(`章节分析失败: ${task.error_message || '未知错误'}`);
-          }
-        }
-      } catch (error) {
-        console.error('轮询分析任务失败:', error);
-      }
-    }, 2000);
+  // 处理分析任务事件
+  const handleAnalysisEvent = (event: AnalysisTaskEvent) => {
+    const active = event.status === 'pending' || event.status === 'running';
+    const knownTaskId = analysisTaskIdsRef.current[event.chapter_id];
+    // 连接建立时会推送同一章节较早任务的最终状态，不能覆盖较新的任务
+    if (!active && knownTaskId && knownTaskId !== event.task_id) return;
+    analysisTaskIdsRef.current[event.chapter_id] = event.task_id;
+
+    setAnalysisTasksMap(prev => ({
+      ...prev,
+      [event.chapter_id]: toAnalysisTask(event)
+    }));
+
+    if (active) {
+      watchAnalysisTask(event.chapter_id);
+      return;
+    }
 
-    pollingIntervalsRef.current[chapterId] = interval;
+    // 只提示关注过的任务（连接建立时推送的已结束任务不重复提示）
+    if (!watchedAnalysesRef.current.delete(event.chapter_id)) return;
 
-    // 5分钟超时
-    setTimeout(() => {
-      if (pollingIntervalsRef.current[chapterId]) {
-        clearInterval(pollingIntervalsRef.current[chapterId]);
-        delete pollingIntervalsRef.current[chapterId];
-      }
-    }, 300000);
+    if (event.status === 'completed') {
+      message.success(`章节分析完成`);
+    } else if (event.status === 'failed') {
+      message.error(`章节分析失败: ${event.error_message || '未知错误'}`);
+    }
   };
 
   const loadWritingStyles = async () => {
@@ -506,8 +500,8 @@ export default function Chapters() {
         setBatchGenerating(true);
         setBatchGenerateVisible(true);
 
-        // 启动轮询
-        startBatchPolling(task.batch_id);
+        // 关注任务进度
+        watchBatchTask(task.batch_id, task.completed);
 
         message.info('检测到未完成的批量生成任务，已自动恢复');
       }
@@ -795,8 +789,8 @@ export default function Chapters() {
           }
         }));
 
-        // 启动轮询
-        startPollingTask(editingId);
+        // 关注分析结果
+        watchAnalysisTask(editingId, taskId);
       }
     } catch (error) {
       const apiError = error as ApiError;
@@ -1044,8 +1038,8 @@ export default function Chapters() {
         'info'
       );
 
-      // 开始轮询任务状态
-      startBatchPolling(result.batch_id);
+      // 关注任务进度
+      watchBatchTask(result.batch_id);
 
     } catch (error: unknown) {
       const err = error as Error;
@@ -1055,95 +1049,89 @@ export default function Chapters() {
     }
   };
 
-  // 轮询批量生成任务状态
-  const startBatchPolling = (taskId: string) => {
-    if (batchPollingIntervalRef.current) {
-      clearInterval(batchPollingIntervalRef.current);
+  // 关注批量生成任务（进度由任务事件推送）
+  const watchBatchTask = (taskId: string, completed = 0) => {
+    watchedBatchIdRef.current = taskId;
+    batchCompletedRef.current = completed;
+  };
+
+  // 刷新章节列表和项目信息（实时显示新生成的章节、更新总字数统计）
+  const refreshBatchResults = async () => {
+    await refreshChapters();
+    if (currentProject?.id) {
+      const updatedProject = await projectApi.getProject(currentProject.id);
+      setCurrentProject(updatedProject);
     }
+  };
 
-    const poll = async () => {
-      try {
-        const response = await fetch(`/api/chapters/batch-generate/${taskId}/status`);
-        if (!response.ok) return;
+  // 处理批量生成任务事件
+  const handleBatchEvent = async (status: BatchGenerationTaskEvent) => {
+    if (status.task_id !== watchedBatchIdRef.current) return;
 
-        const status = await response.json();
-        setBatchProgress({
-          status: status.status,
-          total: status.total,
-          completed: status.completed,
-          current_chapter_number: status.current_chapter_number,
-        });
+    setBatchProgress({
+      status: status.status,
+      total: status.total,
+      completed: status.completed,
+      current_chapter_number: status.current_chapter_number,
+    });
 
-        // 每次轮询时刷新章节列表和分析状态，实时显示新生成的章节和分析进度
-        // 使用 await 确保获取最新章节列表后再加载分析任务状态
-        if (status.completed > 0) {
-          const latestChapters = await refreshChapters();
-          await loadAnalysisTasks(latestChapters);
+    const finished = status.status === 'completed' || status.status === 'failed' || status.status === 'cancelled';
 
-          // 刷新项目信息以实时更新总字数统计
-          if (currentProject?.id) {
-            const updatedProject = await projectApi.getProject(currentProject.id);
-            setCurrentProject(updatedProject);
-          }
+    try {
+      if (!finished) {
+        // 完成数变化时刷新章节列表（新章节的分析状态由分析事件推送）
+        if (status.completed !== batchCompletedRef.current) {
+          batchCompletedRef.current = status.completed;
+          await refreshBatchResults();
         }
+        return;
+      }
 
-        // 任务完成或失败，停止轮询
-        if (status.status === 'completed' || status.status === 'failed' || status.status === 'cancelled') {
-          if (batchPollingIntervalRef.current) {
-            clearInterval(batchPollingIntervalRef.current);
-            batchPollingIntervalRef.current = null;
-          }
-
-          setBatchGenerating(false);
-
-          // 立即刷新章节列表和分析任务状态（在显示消息前）
-          // 使用 refreshChapters 返回的最新章节列表传递给 loadAnalysisTasks
-          const finalChapters = await refreshChapters();
-          await loadAnalysisTasks(finalChapters);
+      // 任务结束，停止关注
+      watchedBatchIdRef.current = null;
+      setBatchGenerating(false);
 
-          // 刷新项目信息以更新总字数统计
-          if (currentProject?.id) {
-            const updatedProject = await projectApi.getProject(currentProject.id);
-            setCurrentProject(updatedProject);
-          }
+      // 立即刷新章节列表和项目信息（在显示消息前）
+      await refreshBatchResults();
 
-          if (status.status === 'completed') {
-            message.success(`批量生成完成！成功生成 ${status.completed} 章`);
-            // 🔔 触发浏览器通知
-            showBrowserNotification(
-              '批量生成完成',
-              `《${currentProject?.title || '项目'}》成功生成 ${status.completed} 章节`,
-              'success'
-            );
-          } else if (status.status === 'failed') {
-            message.error(`批量生成失败：${status.error_message || '未知错误'}`);
-            // 🔔 触发浏览器通知
-            showBrowserNotification(
-              '批量生成失败',
-              status.error_message || '未知错误',
-              'error'
-            );
-          } else if (status.status === 'cancelled') {
-            message.warning('批量生成已取消');
-          }
-
-          // 延迟关闭对话框，让用户看到最终状态
-          setTimeout(() => {
-            setBatchGenerateVisible(false);
-            setBatchTaskId(null);
-            setBatchProgress(null);
-          }, 2000);
-        }
-      } catch (error) {
-        console.error('轮询批量生成状态失败:', error);
+      if (status.status === 'completed') {
+        message.success(`批量生成完成！成功生成 ${status.completed} 章`);
+        // 🔔 触发浏览器通知
+        showBrowserNotification(
+          '批量生成完成',
+          `《${currentProject?.title || '项目'}》成功生成 ${status.completed} 章节`,
+          'success'
+        );
+      } else if (status.status === 'failed') {
+        message.error(`批量生成失败：${status.error_message || '未知错误'}`);
+        // 🔔 触发浏览器通知
+        showBrowserNotification(
+          '批量生成失败',
+          status.error_message || '未知错误',
+          'error'
+        );
+      } else if (status.status === 'cancelled') {
+        message.warning('批量生成已取消');
       }
-    };
 
-    // 立即执行一次
-    poll();
+      // 延迟关闭对话框，让用户看到最终状态
+      setTimeout(() => {
+        setBatchGenerateVisible(false);
+        setBatchTaskId(null);
+        setBatchProgress(null);
+      }, 2000);
+    } catch (error) {
+      console.error('刷新批量生成进度失败:', error);
+    }
+  };
 
-    // 每2秒轮询一次
-    batchPollingIntervalRef.current = window.setInterval(poll, 2000);
+  // 处理项目任务事件
+  taskEventHandlerRef.current = (event: TaskEvent) => {
+    if (event.type === 'analysis') {
+      handleAnalysisEvent(event);
+    } else if (event.type === 'batch_generation') {
+      handleBatchEvent(event);
+    }
   };
 
   // 取消批量生成
@@ -2576,9 +2564,9 @@ export default function Chapters() {
                       [chapterIdToRefresh]: task
                     }));
 
-                    // 如果任务正在运行，启动轮询
+                    // 如果任务正在运行，关注其结果
                     if (task.status === 'pending' || task.status === 'running') {
-                      startPollingTask(chapterIdToRefresh);
+                      watchAnalysisTask(chapterIdToRefresh, task.task_id);
                     }
                   })
                   .catch(error => {
@@ -2594,7 +2582,7 @@ export default function Chapters() {
                               [chapterIdToRefresh]: task
                             }));
                             if (task.status === 'pending' || task.status === 'running') {
-                              startPollingTask(chapterIdToRefresh);
+                              watchAnalysisTask(chapterIdToRefresh, task.task_id);
                             }
                           }
                         })
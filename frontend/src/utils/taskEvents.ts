@@ -0,0 +1,113 @@
+/**
+ * 项目任务事件订阅 - 批量生成、章节分析任务的状态推送（替代轮询状态接口）
+ *
+ * 使用方式：
+ * - const unsubscribe = subscribeTaskEvents(projectId, event => { ... })
+ * - 组件卸载时调用 unsubscribe()
+ *
+ * 同一项目的所有订阅者共用一条 SSE 连接（/api/chapters/project/{id}/task-events），
+ * 最后一个订阅者取消时关闭连接。连接断开后 EventSource 会自动重连，
+ * 服务端在连接建立时先推送项目内各任务的当前状态。
+ */
+import type { AnalysisTask } from '../types';
+
+export interface BatchGenerationTaskEvent {
+  type: 'batch_generation';
+  task_id: string;
+  project_id: string;
+  status: 'pending' | 'running' | 'completed' | 'failed' | 'cancelled';
+  total: number;
+  completed: number;
+  current_chapter_id: string | null;
+  current_chapter_number: number | null;
+  current_retry_count: number;
+  error_message: string | null;
+}
+
+export interface AnalysisTaskEvent {
+  type: 'analysis';
+  task_id: string;
+  project_id: string;
+  chapter_id: string;
+  status: 'pending' | 'running' | 'completed' | 'failed';
+  progress: number;
+  error_message: string | null;
+}
+
+export type TaskEvent = BatchGenerationTaskEvent | AnalysisTaskEvent;
+
+type TaskEventListener = (event: TaskEvent) => void;
+
+interface ProjectChannel {
+  source: EventSource;
+  listeners: Set<TaskEventListener>;
+}
+
+const channels = new Map<string, ProjectChannel>();
+
+const openChannel = (projectId: string): ProjectChannel => {
+  const source = new EventSource(
+    `/api/chapters/project/${projectId}/task-events`,
+    { withCredentials: true }
+  );
+  const channel: ProjectChannel = { source, listeners: new Set() };
+
+  source.onmessage = (event) => {
+    let data: TaskEvent;
+    try {
+      data = JSON.parse(event.data);
+    } catch (error) {
+      console.error('解析任务事件失败:', error);
+      return;
+    }
+    channel.listeners.forEach(listener => {
+      try {
+        listener(data);
+      } catch (error) {
+        console.error('任务事件处理器执行失败:', error);
+      }
+    });
+  };
+
+  source.onerror = () => {
+    if (source.readyState === EventSource.CLOSED) {
+      console.error(`任务事件连接已关闭: ${projectId}`);
+    }
+  };
+
+  return channel;
+};
+
+/**
+ * 订阅项目的任务事件，返回取消订阅函数
+ */
+export function subscribeTaskEvents(projectId: string, listener: TaskEventListener): () => void {
+  let channel = channels.get(projectId);
+  if (!channel) {
+    channel = openChannel(projectId);
+    channels.set(projectId, channel);
+  }
+  channel.listeners.add(listener);
+
+  return () => {
+    const current = channels.get(projectId);
+    if (!current) return;
+    current.listeners.delete(listener);
+    if (current.listeners.size === 0) {
+      current.source.close();
+      channels.delete(projectId);
+    }
+  };
+}
+
+/**
+ * 分析任务事件转换为分析状态接口的返回格式
+ */
+export const toAnalysisTask = (event: AnalysisTaskEvent): AnalysisTask => ({
+  has_task: true,
+  task_id: event.task_id,
+  chapter_id: event.chapter_id,
+  status: event.status,
+  progress: event.progress,
+  error_message: event.error_message,
+});